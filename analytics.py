@@ -0,0 +1,200 @@
+"""Fleet, headway and kms analytics over extracted trip tuples.
+
+Every table is a sort followed by array reductions, O(n log n) in trips:
+
+    Fleet               per depot: buses, peak buses in service and when,
+                        from a sweep over running start (+1) and end (-1)
+                        events, and bus hours (first departure to last arrival)
+    Vehicles per Hour   buses in service during each hour, from the hours
+                        each running stretch covers
+    Headways            per depot, route, stop and direction (origin →
+                        destination): departures and min/mean/max gap
+    Duty kms            per depot, route and duty: trips, Sch kms total and
+                        trips without Sch kms
+
+A bus is in service while it runs a trip: its trips, merged where they
+overlap or meet, give its running stretches, so layovers and mid-day returns
+to the depot do not count. Times are service-day minutes (see trip_table.py),
+so a bus whose evening duty runs past midnight is in service until then and
+not from 00:00. Buses come from `bus_ids` (e.g.
+vehicle_blocks.assign_vehicle_blocks, numbered per depot) or, by default,
+from the duty number as map_bus_id takes it (numbered per route).
+
+    tables = schedule_analytics(all_tuples, sch_kms_dict)
+    save_analytics(tables, analytics_path("depot_7.xlsx"))
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+import excel_writer
+from final_schedule_maker import map_bus_id
+from trip_table import TripTable, format_duration, format_hhmm
+
+# -------------------- Fleet --------------------
+
+def _bus_codes(trips, bus_ids, per_route):
+    """(trip indexes with a bus, bus code per such trip, depot per bus code)."""
+    columns = [trips.depot, trips.route] if per_route else [trips.depot]
+    keys = pd.MultiIndex.from_arrays(columns + [np.asarray(bus_ids, dtype=object)])
+    idx = np.flatnonzero(trips.valid & (np.asarray(bus_ids, dtype=object) != ""))
+    codes, uniques = pd.factorize(keys[idx])
+    return idx, codes, np.array([key[0] for key in uniques], dtype=object)
+
+def bus_spans(trips, bus_ids, per_route=False):
+    """(depot, bus start, bus end) arrays, one entry per (depot, bus), or per (depot, route, bus)."""
+    idx, codes, depots = _bus_codes(trips, bus_ids, per_route)
+    start = np.full(len(depots), np.iinfo(np.int32).max, dtype=np.int64)
+    end = np.full(len(depots), np.iinfo(np.int32).min, dtype=np.int64)
+    np.minimum.at(start, codes, trips.dep[idx])
+    np.maximum.at(end, codes, trips.arr[idx])
+    return depots, start, end
+
+def running_stretches(trips, bus_ids, per_route=False):
+    """
+    (depot, bus code, start, end) arrays, one entry per stretch a bus spends
+    running trips; trips of one bus that overlap or meet are merged.
+    """
+    idx, codes, depots = _bus_codes(trips, bus_ids, per_route)
+    dep, arr = trips.dep[idx].astype(np.int64), trips.arr[idx].astype(np.int64)
+    order = np.lexsort((dep, codes))
+    bus, dep, arr = codes[order], dep[order], arr[order]
+    if not len(bus):
+        return depots[bus], bus, dep, arr
+    reach = pd.Series(arr).groupby(bus).cummax().to_numpy()  # latest arrival so far on the bus
+    new = np.concatenate([[True], (bus[1:] != bus[:-1]) | (dep[1:] > reach[:-1])])
+    first = np.flatnonzero(new)
+    bus = bus[first]
+    return depots[bus], bus, dep[first], np.maximum.reduceat(arr, first)
+
+def peak_in_service(start, end):
+    """(peak buses, first minute the peak is reached) by sweeping start/end events."""
+    if not len(start):
+        return 0, None
+    times = np.concatenate([start, end])
+    delta = np.concatenate([np.ones(len(start), dtype=np.int64), -np.ones(len(end), dtype=np.int64)])
+    order = np.lexsort((delta, times))  # a bus ending at t is out before one starting at t
+    in_service = np.cumsum(delta[order])
+    k = int(np.argmax(in_service))
+    return int(in_service[k]), int(times[order][k])
+
+def fleet_table(spans, stretches):
+    """Per depot, from bus_spans (buses, bus hours) and running_stretches (peak in service)."""
+    depots, start, end = spans
+    running_depots, _, running_start, running_end = stretches
+    rows = []
+    for depot in dict.fromkeys(depots.tolist()):
+        mask = depots == depot
+        running = running_depots == depot
+        peak, at = peak_in_service(running_start[running], running_end[running])
+        rows.append({"Depot": depot, "Buses": int(mask.sum()), "Peak In Service": peak,
+                     "Peak At": format_hhmm(at) if at is not None else "",
+                     "Bus Hours": format_duration(int((end[mask] - start[mask]).sum()))})
+    return pd.DataFrame(rows, columns=["Depot", "Buses", "Peak In Service", "Peak At", "Bus Hours"])
+
+def vehicles_per_hour(stretches):
+    """Buses running a trip at any time during each hour from the first departure (past midnight: 24, 25, ...)."""
+    depots, bus, start, end = stretches
+    if not len(start):
+        return pd.DataFrame({"Hour": []})
+    first_hour = start // 60
+    last_hour = np.maximum(end - 1, start) // 60
+    hours = np.arange(int(first_hour.min()), int(end.max()) // 60 + 1)
+
+    # One (bus, hour) pair per hour a stretch touches; a bus counts once per hour
+    width = last_hour - first_hour + 1
+    covered = np.repeat(first_hour, width) + np.arange(width.sum()) - np.repeat(np.cumsum(width) - width, width)
+    pairs = np.unique(np.repeat(bus, width) * len(hours) + (covered - hours[0]))
+    pair_bus, pair_hour = pairs // len(hours), pairs % len(hours)
+    bus_depot = np.empty(int(bus.max()) + 1, dtype=object)
+    bus_depot[bus] = depots
+
+    table = {"Hour": [f"{h % 24:02}:00" + (" (+1)" if h >= 24 else "") for h in hours.tolist()]}
+    for depot in dict.fromkeys(depots.tolist()):
+        table[depot] = np.bincount(pair_hour[bus_depot[pair_bus] == depot], minlength=len(hours))
+    return pd.DataFrame(table)
+
+# -------------------- Headways --------------------
+
+HEADWAY_COLS = ["Depot", "Route Number", "Stop", "Towards", "Departures", "First", "Last",
+                "Min Headway", "Mean Headway", "Max Headway"]
+
+def headway_table(trips):
+    """Departure gaps per depot, route, stop and direction."""
+    idx = np.flatnonzero(trips.valid)
+    if not len(idx):
+        return pd.DataFrame(columns=HEADWAY_COLS)
+    keys = [trips.depot[idx], trips.route[idx], trips.origin[idx], trips.dest[idx]]
+    codes = pd.factorize(pd.MultiIndex.from_arrays(keys), sort=True)[0]
+    sort = np.lexsort((trips.dep[idx], codes))
+    order, group = idx[sort], codes[sort]
+
+    starts = np.flatnonzero(np.concatenate([[True], group[1:] != group[:-1]]))
+    counts = np.diff(np.append(starts, len(order)))
+    dep = trips.dep[order].astype(np.int64)
+    gap = np.diff(dep)
+    same = group[1:] == group[:-1]
+    gap, gap_group = gap[same], group[1:][same]
+
+    n_gaps = np.bincount(gap_group, minlength=len(starts))
+    total = np.bincount(gap_group, weights=gap, minlength=len(starts))
+    lo = np.full(len(starts), np.iinfo(np.int64).max)
+    hi = np.full(len(starts), -1)
+    np.minimum.at(lo, gap_group, gap)
+    np.maximum.at(hi, gap_group, gap)
+
+    first = dep[starts]
+    last = dep[starts + counts - 1]
+    has_gap = n_gaps > 0
+    head = order[starts]
+    return pd.DataFrame({
+        "Depot": trips.depot[head], "Route Number": trips.route[head],
+        "Stop": trips.origin[head], "Towards": trips.dest[head],
+        "Departures": counts,
+        "First": [format_hhmm(m) for m in first.tolist()], "Last": [format_hhmm(m) for m in last.tolist()],
+        "Min Headway": np.where(has_gap, lo, np.nan),
+        "Mean Headway": np.round(np.where(has_gap, total / np.maximum(n_gaps, 1), np.nan), 1),
+        "Max Headway": np.where(has_gap, hi, np.nan),
+    }, columns=HEADWAY_COLS)
+
+# -------------------- Duty kms --------------------
+
+def duty_kms_table(all_tuples, sch_kms_dict):
+    df = pd.DataFrame(all_tuples, columns=["Origin", "Destination", "Start", "End", "Trip No", "Depot",
+                                           "Duty", "Route Number"])
+    kms = pd.Series(sch_kms_dict, dtype=np.float64)
+    if len(kms):
+        pairs = pd.MultiIndex.from_arrays([df["Origin"], df["Destination"]])
+        df["Sch kms"] = kms.reindex(pairs).to_numpy()
+    else:
+        df["Sch kms"] = np.nan
+    df["Duty Name"] = df["Route Number"].astype(str) + "/" + df["Duty"].astype(str)
+    grouped = df.groupby(["Depot", "Route Number", "Duty Name"], sort=False)
+    table = grouped.agg(**{"Trips": ("Trip No", "size"),
+                           "Trips Without kms": ("Sch kms", lambda s: int(s.isna().sum()))})
+    # A duty with no known kms at all stays empty rather than reading as 0 km
+    table.insert(1, "Sch kms", grouped["Sch kms"].sum(min_count=1))
+    return table.reset_index()
+
+# -------------------- All Tables --------------------
+
+def schedule_analytics(all_tuples, sch_kms_dict=None, bus_ids=None):
+    """{sheet title: DataFrame} for the summary workbook."""
+    trips = TripTable.from_tuples(all_tuples)
+    per_route = bus_ids is None
+    if per_route:
+        bus_ids = [map_bus_id(t[6]) for t in all_tuples]
+    stretches = running_stretches(trips, bus_ids, per_route)
+    return {
+        "Fleet": fleet_table(bus_spans(trips, bus_ids, per_route), stretches),
+        "Vehicles per Hour": vehicles_per_hour(stretches),
+        "Headways": headway_table(trips),
+        "Duty kms": duty_kms_table(all_tuples, sch_kms_dict or {}),
+    }
+
+def analytics_path(file_path):
+    return os.path.splitext(file_path)[0] + "_analytics.xlsx"
+
+def save_analytics(tables, output_file):
+    return excel_writer.write_tables(tables, output_file)
@@ -0,0 +1,341 @@
+"""Headless batch runner for both pipeline stages.
+
+    python batch.py schedule depots/ "revision_7/*.xlsx" extra.xlsx -j 8
+    python batch.py timetable depots/
+    python batch.py all depots/ --skip-kms --write duty_grid --output-dir out/
+    python batch.py schedule revision_8/ --cache
+    python batch.py all depots/ --report-dir reports/ --profile-dir profiles/
+    python batch.py all depots/ --min-layover 5 --write final_schedule vehicle_blocks
+    python batch.py all depots/ --crew-duties --max-spread 600 --max-continuous 240
+    python batch.py schedule depots/ --trip-format parquet
+    python batch.py all depots/ --write final_schedule analytics
+    python batch.py timetable "depots/*_final_schedule.parquet"
+    python batch.py all depots/ --strict
+
+Inputs may be files, glob patterns or directories. Workbooks are processed in
+parallel on a process pool; tkinter is never imported. The "all" stage passes
+the flat schedule to stage 2 in memory (see pipeline.py). A workbook that
+fails on its input is listed as FAILED and the exit status is 1 (with
+--strict, the batch stops there); any other error is a bug and stops it.
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from zipfile import BadZipFile
+
+from openpyxl.utils.exceptions import InvalidFileException
+
+import final_schedule_maker
+import pipeline
+from distance_store import DEFAULT_DB, DistanceStore, MissingDistancesError
+from extract_cache import DEFAULT_CACHE_DIR, ExtractCache
+from instrumentation import RunReport
+import time_table
+import trip_files
+import validation
+import vehicle_blocks
+from crew_duties import CrewRules
+
+EXCEL_EXTENSIONS = (".xlsx", ".xls")
+STAGE1_SUFFIX = "_final_schedule.xlsx"
+STAGE2_SUFFIX = "_schedule.xlsx"
+BLOCKS_SUFFIX = "_vehicle_blocks.xlsx"
+VIOLATIONS_SUFFIX = "_violations.xlsx"
+ANALYTICS_SUFFIX = "_analytics.xlsx"
+
+# -------------------- Input Expansion --------------------
+
+def _wanted(path, stage):
+    name = os.path.basename(path)
+    if name.startswith("~$"):
+        return False
+    if stage == "timetable":
+        # Flat schedules, as workbooks or typed trip files
+        return name.endswith(STAGE1_SUFFIX) or (trip_files.trip_format(name) is not None
+                                                and os.path.splitext(name)[0].endswith("_final_schedule"))
+    if not name.lower().endswith(EXCEL_EXTENSIONS):
+        return False
+    # Skip outputs of earlier runs sitting next to the source workbooks
+    return not name.endswith((STAGE1_SUFFIX, STAGE2_SUFFIX, BLOCKS_SUFFIX, VIOLATIONS_SUFFIX, ANALYTICS_SUFFIX))
+
+def expand_inputs(paths, stage):
+    """Resolve files, globs and directories into an ordered, de-duplicated file list."""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            found = sorted(os.path.join(path, name) for name in os.listdir(path))
+            files.extend(f for f in found if os.path.isfile(f) and _wanted(f, stage))
+        elif glob.has_magic(path):
+            files.extend(f for f in sorted(glob.glob(path, recursive=True)) if os.path.isfile(f) and _wanted(f, stage))
+        else:
+            files.append(path)
+
+    seen = set()
+    unique = []
+    for f in files:
+        key = os.path.abspath(f)
+        if key not in seen:
+            seen.add(key)
+            unique.append(f)
+    return unique
+
+# -------------------- Workers --------------------
+
+# Workers return their RunReport (or None) alongside the result; see write_reports.
+# Only bad or unreadable inputs fail a workbook (a missing header raises
+# KeyError or ValueError); any other exception is a bug and stops the batch.
+INPUT_ERRORS = (InvalidFileException, BadZipFile, OSError, ValueError, KeyError)
+
+def _new_report(file_path, report_opts):
+    return RunReport(file_path, **report_opts) if report_opts is not None else None
+
+def _failed(report, e):
+    if report is not None:
+        report.error = f"{type(e).__name__}: {e}"
+    return f"{type(e).__name__}: {e}"
+
+def _extract(file_path, streaming=False, sheet_workers=None, cache=None, report_opts=None, strict=False):
+    report = _new_report(file_path, report_opts)
+    try:
+        all_tuples = final_schedule_maker.extract_trip_tuples(file_path, progress=False, streaming=streaming,
+                                                              sheet_workers=sheet_workers, cache=cache,
+                                                              report=report)
+        return file_path, all_tuples, None, report
+    except INPUT_ERRORS as e:
+        if strict:
+            raise
+        return file_path, None, _failed(report, e), report
+
+def _finish(job):
+    file_path, all_tuples, sch_kms_dict, write, output_dir, report, finish_opts, strict = job
+    try:
+        result = pipeline.finish_pipeline(file_path, all_tuples, sch_kms_dict, write=write, output_dir=output_dir,
+                                          render_grid=False, report=report, **finish_opts)
+        outputs = ", ".join(result.outputs.values())
+        dropped = result.crew_duties.stats["trips_without_bus"] if result.crew_duties is not None else 0
+        if dropped:
+            # Crew duties only cover trips with a bus; a schedule that lost trips must not pass as done
+            error = f"{dropped} trip(s) without valid times left out of the crew duties (written: {outputs})"
+            if report is not None:
+                report.error = error
+            return file_path, None, error, report
+        return file_path, outputs, None, report
+    except INPUT_ERRORS as e:
+        if strict:
+            raise
+        return file_path, None, _failed(report, e), report
+
+def _time_table(file_path, output_dir=None, report_opts=None, render_workers=None, strict=False):
+    report = _new_report(file_path, report_opts)
+    try:
+        output_excel = time_table.duty_schedule_path(file_path)
+        violations_file = validation.violations_path(file_path)
+        if output_dir:
+            output_excel = os.path.join(output_dir, os.path.basename(output_excel))
+            violations_file = os.path.join(output_dir, os.path.basename(violations_file))
+        output_excel = time_table.make_time_table(file_path, output_excel, report=report,
+                                                  violations_file=violations_file, workers=render_workers)
+        return file_path, output_excel, None, report
+    except INPUT_ERRORS as e:
+        if strict:
+            raise
+        return file_path, None, _failed(report, e), report
+
+def _run(pool, fn, items):
+    if pool is None:
+        return [fn(item) for item in items]
+    return list(pool.map(fn, items))
+
+# -------------------- Stages --------------------
+
+def run_schedule(pool, files, skip_kms=False, streaming=False, sheet_workers=None,
+                 kms_db=DEFAULT_DB, interactive=True, write=("final_schedule",), output_dir=None, cache=None,
+                 report_opts=None, finish_opts=None, infer_kms=False, strict=False):
+    """
+    Stage 1 for every file, and stage 2 in memory when "duty_grid" is in `write`.
+    Sch kms come from the distance store (with `infer_kms`, unknown pairs are
+    first inferred by shortest path over stored segments); pairs still
+    unknown are asked once for the union of all workbooks (or, when not
+    interactive, fail every workbook that needs them). With an ExtractCache, unchanged sheets are
+    not extracted again. With `report_opts` (RunReport keyword arguments),
+    one report per workbook is returned as well. `finish_opts` are passed on
+    to pipeline.finish_pipeline (min_layover, max_wait and crew_rules turn on
+    the vehicle block optimizer and the crew duty builder; render_workers).
+    A workbook that fails on its input is reported and the rest go on; with
+    `strict`, the first such error is raised instead.
+    """
+    extracted = _run(pool, partial(_extract, streaming=streaming, sheet_workers=sheet_workers, cache=cache,
+                                   report_opts=report_opts, strict=strict), files)
+    failures = [(path, err) for path, _, err, _ in extracted if err]
+    reports = {path: report for path, _, _, report in extracted}
+    extracted = [(path, tuples) for path, tuples, err, _ in extracted if not err]
+
+    sch_kms_dict = {}
+    if extracted and not skip_kms:
+        od_pairs = sorted({pair for _, tuples in extracted for pair in final_schedule_maker.unique_od_pairs(tuples)})
+        with DistanceStore(kms_db) as store:
+            try:
+                sch_kms_dict = final_schedule_maker.collect_sch_kms(od_pairs, store, interactive=interactive,
+                                                                    infer=infer_kms)
+            except MissingDistancesError as e:
+                if strict:
+                    raise
+                missing = set(e.pairs)
+                blocked = [path for path, tuples in extracted if missing & set(final_schedule_maker.unique_od_pairs(tuples))]
+                failures += [(path, str(e)) for path in blocked]
+                for path in blocked:
+                    if reports[path] is not None:
+                        reports[path].error = str(e)
+                extracted = [(path, tuples) for path, tuples in extracted if path not in blocked]
+                sch_kms_dict = final_schedule_maker.collect_sch_kms([p for p in od_pairs if p not in missing], store,
+                                                                    interactive=False, infer=infer_kms)
+
+    jobs = [(path, tuples, sch_kms_dict, tuple(write), output_dir, reports[path], finish_opts or {}, strict)
+            for path, tuples in extracted]
+    written = _run(pool, _finish, jobs)
+    failures += [(path, err) for path, _, err, _ in written if err]
+    outputs = [(path, out) for path, out, err, _ in written if not err]
+    reports.update((path, report) for path, _, _, report in written)
+    return outputs, failures, [reports[path] for path in files if reports.get(path) is not None]
+
+def run_time_table(pool, files, output_dir=None, report_opts=None, render_workers=None, strict=False):
+    results = _run(pool, partial(_time_table, output_dir=output_dir, report_opts=report_opts,
+                                 render_workers=render_workers, strict=strict), files)
+    failures = [(path, err) for path, _, err, _ in results if err]
+    outputs = [(path, out) for path, out, err, _ in results if not err]
+    return outputs, failures, [report for *_, report in results if report is not None]
+
+def write_reports(reports, report_dir):
+    """One <workbook>.report.json per workbook plus batch_report.json with all of them."""
+    os.makedirs(report_dir, exist_ok=True)
+    for report in reports:
+        name = os.path.splitext(os.path.basename(report.label))[0]
+        report.write_json(os.path.join(report_dir, f"{name}.report.json"))
+    summary_path = os.path.join(report_dir, "batch_report.json")
+    with open(summary_path, "w", encoding="utf-8") as f:
+        json.dump([report.to_dict() for report in reports], f, indent=2)
+    return summary_path
+
+# -------------------- Entry Point --------------------
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Process timetable workbooks without the GUI.")
+    parser.add_argument("stage", choices=["schedule", "timetable", "all"],
+                        help="schedule: final_schedule_maker, timetable: time_table, all: both in sequence")
+    parser.add_argument("paths", nargs="+", help="workbook files, glob patterns or directories")
+    parser.add_argument("-j", "--workers", type=int, default=os.cpu_count() or 1,
+                        help="number of worker processes (default: CPU count)")
+    parser.add_argument("--skip-kms", action="store_true",
+                        help="leave Sch kms empty instead of using the distance store")
+    parser.add_argument("--kms-db", default=DEFAULT_DB,
+                        help=f"Sch kms distance store (default: {DEFAULT_DB})")
+    parser.add_argument("--infer-kms", action="store_true",
+                        help="fill in unknown OD pairs by shortest path over the stored segments before prompting")
+    parser.add_argument("--non-interactive", action="store_true",
+                        help="fail workbooks with OD pairs missing from the distance store instead of prompting")
+    parser.add_argument("--streaming", action="store_true",
+                        help="read workbooks in read-only mode, one table at a time (bounded memory)")
+    parser.add_argument("--sheet-workers", type=int, default=None,
+                        help="also shard the sheets of each workbook across this many processes")
+    parser.add_argument("--render-workers", type=int, default=None,
+                        help="also render the depot/route duty grids of each workbook on this many processes")
+    parser.add_argument("--cache", action="store_true",
+                        help="reuse per-sheet extraction results from earlier runs for unchanged sheets")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR,
+                        help=f"extraction cache directory (default: {DEFAULT_CACHE_DIR})")
+    parser.add_argument("--cache-max-mb", type=int, default=256,
+                        help="evict least recently used cache entries beyond this size (default: 256)")
+    parser.add_argument("--report-dir", default=None,
+                        help="write a JSON report of stage times and data-quality counts per workbook here")
+    parser.add_argument("--trace-memory", action="store_true",
+                        help="record exact peak memory per stage in the reports (slower)")
+    parser.add_argument("--profile-dir", default=None,
+                        help="dump a cProfile file per workbook and stage here")
+    parser.add_argument("--min-layover", type=int, default=None,
+                        help="assign Bus Id with the vehicle block optimizer, keeping buses this many minutes "
+                             "at a terminal between trips (default: Bus Id from the duty number)")
+    parser.add_argument("--max-wait", type=int, default=vehicle_blocks.DEFAULT_MAX_WAIT,
+                        help=f"longest idle gap the optimizer keeps a bus for (default: {vehicle_blocks.DEFAULT_MAX_WAIT})")
+    rules = CrewRules()
+    parser.add_argument("--crew-duties", action="store_true",
+                        help="rebuild the duties from the optimized buses at relief points (implies --min-layover)")
+    parser.add_argument("--max-spread", type=int, default=rules.max_spread,
+                        help=f"longest duty, sign-in to sign-out, in minutes (default: {rules.max_spread})")
+    parser.add_argument("--max-driving", type=int, default=rules.max_driving,
+                        help=f"most minutes on the bus per duty (default: {rules.max_driving})")
+    parser.add_argument("--max-continuous", type=int, default=rules.max_continuous,
+                        help=f"most minutes on the bus without a break (default: {rules.max_continuous})")
+    parser.add_argument("--min-break", type=int, default=rules.min_break,
+                        help=f"shortest gap that counts as a break, in minutes (default: {rules.min_break})")
+    parser.add_argument("--write", nargs="+", choices=pipeline.OUTPUTS + pipeline.OPTIONAL_OUTPUTS,
+                        default=list(pipeline.OUTPUTS),
+                        help="outputs saved by the 'all' stage (default: final_schedule duty_grid); "
+                             "vehicle_blocks and analytics also write <name>_vehicle_blocks.xlsx and "
+                             "<name>_analytics.xlsx")
+    parser.add_argument("--trip-format", choices=list(trip_files.TRIP_FORMATS), default=None,
+                        help="also save the flat schedule as a typed trip file that the timetable stage can read")
+    parser.add_argument("--output-dir", default=None,
+                        help="save outputs here instead of next to each input workbook")
+    parser.add_argument("--strict", action="store_true",
+                        help="stop at the first workbook that fails on its input instead of reporting it "
+                             "and going on")
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    files = expand_inputs(args.paths, "timetable" if args.stage == "timetable" else "schedule")
+    if not files:
+        print("No input workbooks found. Exiting.")
+        return 1
+
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+
+    cache = ExtractCache(args.cache_dir, args.cache_max_mb * 1024 * 1024) if args.cache else None
+    report_opts = None
+    if args.report_dir or args.profile_dir or args.trace_memory:
+        report_opts = {"trace_memory": args.trace_memory, "profile_dir": args.profile_dir}
+
+    workers = max(1, min(args.workers, len(files)))
+    print(f"\n Processing {len(files)} workbook(s) with {workers} worker(s)...")
+
+    pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    try:
+        if args.stage == "timetable":
+            outputs, failures, reports = run_time_table(pool, files, output_dir=args.output_dir,
+                                                        report_opts=report_opts, render_workers=args.render_workers,
+                                                        strict=args.strict)
+        else:
+            # "all" hands the flat schedule to stage 2 in memory instead of re-reading the xlsx
+            write = args.write if args.stage == "all" else ["final_schedule"]
+            finish_opts = {"render_workers": args.render_workers, "trip_format": args.trip_format}
+            if args.min_layover is not None or args.crew_duties:
+                finish_opts.update(min_layover=args.min_layover, max_wait=args.max_wait)
+            if args.crew_duties:
+                finish_opts["crew_rules"] = CrewRules(max_spread=args.max_spread, max_driving=args.max_driving,
+                                                   max_continuous=args.max_continuous, min_break=args.min_break)
+            outputs, failures, reports = run_schedule(pool, files, skip_kms=args.skip_kms,
+                                                      streaming=args.streaming, sheet_workers=args.sheet_workers,
+                                                      kms_db=args.kms_db, interactive=not args.non_interactive,
+                                                      write=write, output_dir=args.output_dir, cache=cache,
+                                                      report_opts=report_opts, finish_opts=finish_opts,
+                                                      infer_kms=args.infer_kms, strict=args.strict)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    for path, out in outputs:
+        print(f"  {path} -> {out}")
+    for path, err in failures:
+        print(f"  FAILED {path}: {err}")
+    if args.report_dir:
+        print(f"\n Reports written to {write_reports(reports, args.report_dir)}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
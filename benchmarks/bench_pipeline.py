@@ -0,0 +1,179 @@
+"""Time and memory benchmarks for both stages on synthetic workbooks.
+
+For each input size a workbook is generated (see timetable_generator.py) and
+every stage is run in turn:
+
+    extract      Step 1: duty tables from the workbook
+    tuples       Step 2: trip tuples
+    schedule     Step 4: flat schedule frame
+    write        Step 5: <name>_final_schedule.xlsx
+    load         time_table: trip tuples read back from the flat schedule
+    render       time_table: duty grids, one per depot and route
+    grid_write   time_table: <name>_final_schedule_schedule.xlsx, one sheet per grid
+
+Wall time is the best of --repeat runs; peak memory (tracemalloc) comes from a
+separate run, since tracing slows the code down. Results can be saved as JSON
+and compared with an earlier run to spot scaling regressions.
+
+    python benchmarks/bench_pipeline.py
+    python benchmarks/bench_pipeline.py --sizes small medium --json base.json
+    python benchmarks/bench_pipeline.py --sizes small medium --baseline base.json
+    python benchmarks/bench_pipeline.py --custom 10,50,8,6
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import final_schedule_maker  # noqa: E402
+import time_table  # noqa: E402
+from timetable_generator import generate  # noqa: E402
+
+# name -> (sheets, duties per table, stops, trips per duty)
+SIZES = {
+    "small": (4, 20, 6, 6),
+    "medium": (12, 60, 10, 8),
+    "large": (40, 120, 12, 10),
+}
+STAGES = ["extract", "tuples", "schedule", "write", "load", "render", "grid_write"]
+
+
+def run_stages(workbook, workdir):
+    """Run every stage once; yields (stage, result) after each one."""
+    tables = final_schedule_maker.extract_tables(workbook, progress=False)
+    yield "extract", tables
+    all_tuples = final_schedule_maker.build_trip_tuples_vectorized(tables, progress=False)
+    yield "tuples", all_tuples
+    sch_kms_dict = {pair: 10.0 for pair in final_schedule_maker.unique_od_pairs(all_tuples)}
+    df_final = final_schedule_maker.build_final_schedule(all_tuples, sch_kms_dict, progress=False)
+    yield "schedule", df_final
+    final_path = final_schedule_maker.save_final_schedule(df_final, os.path.join(workdir, "bench_final_schedule.xlsx"))
+    yield "write", final_path
+    loaded = time_table.load_trip_tuples(final_path)
+    yield "load", loaded
+    grids = time_table.build_duty_schedules(loaded)
+    yield "render", grids
+    yield "grid_write", time_table.save_duty_schedules(grids, time_table.duty_schedule_path(final_path))
+
+def time_stages(workbook, workdir, repeat):
+    best = {}
+    counts = {}
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for stage, result in run_stages(workbook, workdir):
+            now = time.perf_counter()
+            best[stage] = min(best.get(stage, float("inf")), now - start)
+            if stage in ("extract", "tuples"):
+                counts[stage] = len(result)
+            start = time.perf_counter()
+    return best, counts
+
+def memory_stages(workbook, workdir):
+    """Peak traced memory per stage, in MiB."""
+    peaks = {}
+    tracemalloc.start()
+    try:
+        for stage, _ in run_stages(workbook, workdir):
+            peaks[stage] = tracemalloc.get_traced_memory()[1] / 2**20
+            tracemalloc.reset_peak()
+    finally:
+        tracemalloc.stop()
+    return peaks
+
+def bench_size(name, params, repeat=3, memory=True):
+    sheets, duties, stops, trips = params
+    with tempfile.TemporaryDirectory() as workdir:
+        workbook = generate(os.path.join(workdir, "bench.xlsx"), sheets, duties, stops, trips)
+        seconds, counts = time_stages(workbook, workdir, repeat)
+        peaks = memory_stages(workbook, workdir) if memory else {}
+        size_kb = os.path.getsize(workbook) / 1024
+    return {
+        "size": name,
+        "params": {"sheets": sheets, "duties": duties, "stops": stops, "trips": trips},
+        "workbook_kb": round(size_kb, 1),
+        "tables": counts["extract"],
+        "trips": counts["tuples"],
+        "seconds": {stage: round(seconds[stage], 4) for stage in STAGES},
+        "peak_mib": {stage: round(peaks[stage], 2) for stage in peaks},
+    }
+
+# -------------------- Report --------------------
+
+def print_result(result, baseline=None, tolerance=0.25):
+    """Print one size; returns the stages slower than the baseline by more than `tolerance`."""
+    p = result["params"]
+    print(f"\n {result['size']}: {p['sheets']} sheets x {p['duties']} duties x {p['stops']} stops x "
+          f"{p['trips']} trips -> {result['tables']} tables, {result['trips']} trips, {result['workbook_kb']} KB")
+    print(f"  {'stage':<12}{'seconds':>10}{'us/trip':>10}{'peak MiB':>10}{'vs base':>10}")
+    regressions = []
+    for stage in STAGES:
+        seconds = result["seconds"][stage]
+        per_trip = seconds / max(result["trips"], 1) * 1e6
+        peak = result["peak_mib"].get(stage)
+        line = f"  {stage:<12}{seconds:>10.3f}{per_trip:>10.1f}{'' if peak is None else f'{peak:.1f}':>10}"
+        if baseline:
+            ratio = seconds / max(baseline["seconds"][stage], 1e-9)
+            line += f"{ratio:>9.2f}x"
+            if ratio > 1 + tolerance:
+                regressions.append(stage)
+                line += "  <-- slower"
+        print(line)
+    total = sum(result["seconds"].values())
+    print(f"  {'total':<12}{total:>10.3f}{total / max(result['trips'], 1) * 1e6:>10.1f}")
+    return regressions
+
+# -------------------- Entry Point --------------------
+
+def _custom_size(text):
+    values = tuple(int(v) for v in text.split(","))
+    if len(values) != 4:
+        raise argparse.ArgumentTypeError("expected SHEETS,DUTIES,STOPS,TRIPS")
+    return values
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark both stages on synthetic workbooks.")
+    parser.add_argument("--sizes", nargs="+", choices=SIZES, default=["small", "medium"],
+                        help="preset input sizes (default: small medium)")
+    parser.add_argument("--custom", type=_custom_size, action="append", default=[], metavar="S,D,ST,T",
+                        help="extra size as sheets,duties,stops,trips (repeatable)")
+    parser.add_argument("--repeat", type=int, default=3, help="timing runs per size, best is kept (default: 3)")
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc run")
+    parser.add_argument("--json", default=None, help="save the results to this file")
+    parser.add_argument("--baseline", default=None, help="compare with results saved by --json")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="flag stages slower than the baseline by more than this fraction (default: 0.25)")
+    args = parser.parse_args(argv)
+
+    sizes = [(name, SIZES[name]) for name in args.sizes]
+    sizes += [(",".join(map(str, params)), params) for params in args.custom]
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = {r["size"]: r for r in json.load(f)["results"]}
+
+    results = []
+    regressions = []
+    for name, params in sizes:
+        result = bench_size(name, params, repeat=args.repeat, memory=not args.no_memory)
+        results.append(result)
+        slower = print_result(result, baseline.get(name), args.tolerance)
+        regressions += [f"{name}/{stage}" for stage in slower]
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"python": sys.version.split()[0], "results": results}, f, indent=2)
+        print(f"\n Results saved to {args.json}")
+    if regressions:
+        print(f"\n Slower than baseline: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
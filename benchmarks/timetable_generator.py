@@ -0,0 +1,143 @@
+"""Synthetic timetable workbooks in the layout final_schedule_maker.py reads.
+
+Each sheet holds one or more route tables:
+
+    route number                     (duty column)
+    depot, stop names above each Arrival column
+    Duty Number | Duty Hours | Crew Sign In/Out Time | Out/in Shedding | Arrival | Departure | ...
+    duty rows: shed out, trips, then a Duty Hours / Sign Out / Shed In row
+    "Evening Duties" marker before the evening half
+    blank rows between tables
+
+Outbound trips put the departure before the arrival on the row, return trips
+the arrival before the departure, as in the real workbooks; stops, duties and
+trips per duty are parameters, so input size can be scaled independently.
+
+    python benchmarks/timetable_generator.py synthetic.xlsx --sheets 8 --duties 40 --stops 8 --trips 6
+"""
+import argparse
+import random
+import sys
+
+import openpyxl
+
+HEADER = ["Duty Number", "Duty Hours", "Crew Sign In/Out Time", "Out/in Shedding"]
+TABLE_GAP = 5        # blank rows between tables (four close a table)
+DUTY_COLUMN = 2      # the duty column does not have to be column A
+
+
+def _hhmm(minutes):
+    minutes %= 24 * 60
+    return f"{minutes // 60:02}:{minutes % 60:02}"
+
+def _write_duty(ws, row, rnd, name, start, stops, trips):
+    """
+    Write one duty block starting at `row`; returns the next free row.
+
+    Time cells are read row by row, left to right, in departure/arrival
+    pairs: shed out from the depot, one revenue trip per row between the
+    route ends (sometimes turning short), and a last departure that pairs
+    with the shed-in time on the closing row.
+    """
+    col = DUTY_COLUMN
+    arrival = lambda stop: col + 4 + 2 * stop
+    departure = lambda stop: col + 5 + 2 * stop
+
+    ws.cell(row, col, name)
+    ws.cell(row, col + 2, _hhmm(start - 15))       # sign in
+    ws.cell(row, col + 3, _hhmm(start))            # shed out
+    t = start + rnd.randint(5, 20)
+    ws.cell(row, arrival(0), _hhmm(t))
+
+    here = 0
+    for trip in range(trips):
+        if here == 0:
+            there = rnd.randrange(1, stops - 1) if stops > 2 and rnd.random() < 0.2 else stops - 1
+        else:
+            there = 0
+        t += rnd.randint(3, 15)
+        dep, arr = t, t + (abs(there - here) + 1) * rnd.randint(4, 10)
+        if trip:
+            row += 1
+            if rnd.random() < 0.1:
+                row += 1  # stray blank row inside the block
+        if there > here:
+            # Outbound: departure left of arrival
+            ws.cell(row, departure(here), _hhmm(dep))
+            ws.cell(row, arrival(there), _hhmm(arr))
+        else:
+            # Return: arrival (left) before departure (right)
+            ws.cell(row, arrival(there), _hhmm(arr))
+            ws.cell(row, departure(here), _hhmm(dep))
+        t = arr
+        here = there
+
+    # Pull in: departure from the last stop on its own row, paired with shed in
+    t += rnd.randint(3, 10)
+    row += 1
+    ws.cell(row, departure(here), _hhmm(t))
+    row += 1
+    ws.cell(row, col + 1, _hhmm(t + 25 - start))    # duty hours
+    ws.cell(row, col + 2, _hhmm(t + 25))            # sign out
+    ws.cell(row, col + 3, _hhmm(t + 15))            # shed in
+    return row + 1
+
+def write_table(ws, row, rnd, route, depot, stop_names, duties, trips):
+    """Write one route table starting at `row`; returns the next free row."""
+    col = DUTY_COLUMN
+    ws.cell(row, col, route)
+    ws.cell(row + 1, col, depot)
+    for k, stop in enumerate(stop_names):
+        ws.cell(row + 1, col + 4 + 2 * k, stop)
+    for c, label in enumerate(HEADER + ["Arrival", "Departure"] * len(stop_names)):
+        ws.cell(row + 2, col + c, label)
+    row += 3
+
+    evening_from = duties // 2
+    for d in range(duties):
+        if d == evening_from:
+            ws.cell(row, col, "Evening Duties")
+            row += 1
+        number = d + 1
+        # A few explicit "A" duties in the morning half; evening ones get it from the marker
+        name = f"{number}A" if d < evening_from and number % 7 == 0 else str(number)
+        start = 4 * 60 + d * 12 + rnd.randint(0, 10) + (9 * 60 if d >= evening_from else 0)
+        row = _write_duty(ws, row, rnd, name, start, len(stop_names), trips)
+    return row + TABLE_GAP
+
+def generate(path, sheets=4, duties=20, stops=6, trips=6, tables_per_sheet=2, seed=0):
+    """Write a synthetic timetable workbook to `path` and return the path."""
+    rnd = random.Random(seed)
+    wb = openpyxl.Workbook()
+    wb.remove(wb.active)
+    for s in range(sheets):
+        ws = wb.create_sheet(f"Route {s + 1}")
+        depot = f"DEPOT {s % 3 + 1}"
+        row = 2
+        for t in range(tables_per_sheet):
+            stop_names = [f"STOP {s}-{t}-{k}" for k in range(stops)]
+            number = s * tables_per_sheet + t
+            route = f"{100 + number}{'CDKM'[number % 4]}"  # a bare number would be read as a duty
+            row = write_table(ws, row, rnd, route, depot, stop_names, duties, trips)
+    wb.save(path)
+    return path
+
+# -------------------- Entry Point --------------------
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write a synthetic timetable workbook.")
+    parser.add_argument("output")
+    parser.add_argument("--sheets", type=int, default=4)
+    parser.add_argument("--duties", type=int, default=20, help="duties per table")
+    parser.add_argument("--stops", type=int, default=6, help="stops per route")
+    parser.add_argument("--trips", type=int, default=6, help="trips per duty")
+    parser.add_argument("--tables-per-sheet", type=int, default=2)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    generate(args.output, args.sheets, args.duties, args.stops, args.trips, args.tables_per_sheet, args.seed)
+    print(f"Wrote {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
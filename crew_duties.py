@@ -0,0 +1,257 @@
+"""Crew duties: cut vehicle blocks at relief points and chain the pieces into duties.
+
+Stage 2 computes Duty Hours after the fact from whatever the sheet says; this
+builds the duties instead, from the buses assigned by vehicle_blocks.py:
+
+1. Each bus is cut into pieces of work. A piece ends where the bus moves to
+   another route, where it runs empty to another stop (a deadhead link), or
+   where it reaches a relief point (a stop in the stop set, as time_table.py
+   takes it) and the piece could not take the next trip without going over
+   the longest stretch allowed without a break.
+2. Per route, pieces are taken in order of start time and given to an open duty that
+   ends at the same stop, early enough for the changeover, and still within
+   the spread, driving and break limits; among those the duty that has been
+   waiting the shortest is taken (best fit). Otherwise a new duty starts.
+
+Duties stay within one route even where buses interline: the flat schedule
+names a duty "<route>/<duty>", and the duty grid and validation take it per
+depot and route. Both steps are a sort plus one pass, with a bisect per
+piece, so a network day stays well under a second per depot. Spread
+includes the sign-in and sign-out offsets of time_table.py.
+
+    blocks = assign_vehicle_blocks(all_tuples)
+    duties = build_crew_duties(all_tuples, blocks, CrewRules(max_spread=600))
+    tuples, order = crew_duty_tuples(all_tuples, duties)
+"""
+import bisect
+from dataclasses import dataclass, field
+
+import numpy as np
+
+from trip_table import CREW_OFFSET, TripTable
+from validation import DEFAULT_MAX_SPREAD
+
+
+@dataclass
+class CrewRules:
+    max_spread: int = DEFAULT_MAX_SPREAD  # sign-in to sign-out, minutes
+    max_driving: int = 480          # time on the bus per duty
+    max_continuous: int = 240       # time on the bus without a break
+    min_break: int = 30             # a gap at least this long counts as a break
+    min_changeover: int = 5         # walking from one bus to another at a relief point
+    sign_on: int = CREW_OFFSET      # minutes before the first departure
+    sign_off: int = CREW_OFFSET     # minutes after the last arrival
+    evening_from: int = 12 * 60     # duties signing in from here on are named "<n>A"
+
+
+@dataclass
+class CrewDuties:
+    duty_names: list               # crew duty per trip ("" for trips without a bus)
+    stats: dict = field(default_factory=dict)
+
+# -------------------- Relief Points --------------------
+
+def relief_points(all_tuples):
+    """Stop set per depot: trip origins that are not the depot itself (as in time_table.py)."""
+    points = {}
+    for origin, _, _, _, _, depot, _, _ in all_tuples:
+        if depot not in origin:
+            points.setdefault(depot, set()).add(origin)
+    return points
+
+# -------------------- Pieces of Work --------------------
+
+def _bus_order(trips, blocks):
+    """Trip indexes with a bus, ordered by depot, bus and position on the bus."""
+    has_bus = np.array([bus != "" for bus in blocks.bus_ids], dtype=bool)
+    idx = np.flatnonzero(has_bus)
+    bus = np.array([int(blocks.bus_ids[i]) for i in idx.tolist()], dtype=np.int64)
+    position = np.array([blocks.block_trip_no[i] for i in idx.tolist()], dtype=np.int64)
+    depot_code = np.unique(trips.depot[idx].astype(str), return_inverse=True)[1]
+    return idx[np.lexsort((position, bus, depot_code))]
+
+def cut_pieces(trips, bus_ids, order, relief, max_piece):
+    """
+    Split the buses of `order` into pieces: lists of trip indexes.
+
+    A piece ends where the bus moves to another route or deadheads (the next
+    trip starts at another stop than the last one ended), so a duty's trips
+    always meet stop to stop. It is also cut after the last trip that ends
+    at a relief point before it would exceed `max_piece` minutes on the bus.
+    A bus with no relief point in reach stays in one piece, which is then
+    over the limit.
+    """
+    pieces = []
+    piece, cut_after = [], None
+    previous = None
+    for t in order.tolist():
+        working = (trips.depot[t], bus_ids[t], trips.route[t])
+        if working != previous or (piece and trips.origin[t] != trips.dest[piece[-1]]):
+            if piece:
+                pieces.append(piece)
+            piece, cut_after, previous = [], None, working
+        stops = relief.get(trips.depot[t], ())
+        while piece and trips.arr[t] - trips.dep[piece[0]] > max_piece and cut_after is not None:
+            pieces.append(piece[:cut_after + 1])
+            piece = piece[cut_after + 1:]
+            cut_after = None
+            for k, u in enumerate(piece):
+                if trips.dest[u] in stops:
+                    cut_after = k
+        piece.append(t)
+        if trips.dest[t] in stops:
+            cut_after = len(piece) - 1
+    if piece:
+        pieces.append(piece)
+    return pieces
+
+# -------------------- Duty Chaining --------------------
+
+class _Duty:
+    __slots__ = ("pieces", "start", "end", "end_stop", "bus", "driving", "continuous", "breaks")
+
+    def __init__(self, piece, start, end, end_stop, bus):
+        self.pieces = [piece]
+        self.start, self.end, self.end_stop, self.bus = start, end, end_stop, bus
+        self.driving = self.continuous = end - start
+        self.breaks = 0
+
+    def extend(self, piece, start, end, end_stop, bus, rules):
+        """Add the piece if every limit still holds; returns whether it was added."""
+        gap = start - self.end
+        length = end - start
+        if gap < (0 if bus == self.bus else rules.min_changeover):
+            return False
+        if end - self.start + rules.sign_on + rules.sign_off > rules.max_spread:
+            return False
+        if self.driving + length > rules.max_driving:
+            return False
+        on_break = gap >= rules.min_break
+        continuous = length if on_break else self.continuous + gap + length
+        if continuous > rules.max_continuous:
+            return False
+        self.pieces.append(piece)
+        self.end, self.end_stop, self.bus = end, end_stop, bus
+        self.driving += length
+        self.continuous = continuous
+        self.breaks += on_break
+        return True
+
+def chain_pieces(trips, bus_ids, pieces, rules, max_candidates=64):
+    """
+    Greedy best-fit assignment of pieces (sorted by start) to duties.
+
+    Open duties are kept per end stop in a list sorted by end time; for each
+    piece the latest-ending ones that finished in time are tried first, at
+    most `max_candidates` of them.
+    """
+    starts = np.array([trips.dep[p[0]] for p in pieces], dtype=np.int64)
+    duties = []
+    waiting = {}        # end stop -> sorted [(end, duty index)]
+    for k in np.argsort(starts, kind="stable").tolist():
+        piece = pieces[k]
+        start, end = int(trips.dep[piece[0]]), int(trips.arr[piece[-1]])
+        start_stop, end_stop = trips.origin[piece[0]], trips.dest[piece[-1]]
+        bus = bus_ids[piece[0]]
+
+        chosen = None
+        queue = waiting.get(start_stop, [])
+        top = bisect.bisect_right(queue, (start, len(duties)))
+        for pos in range(top - 1, max(top - 1 - max_candidates, -1), -1):
+            d = queue[pos][1]
+            if duties[d].extend(piece, start, end, end_stop, bus, rules):
+                chosen = d
+                del queue[pos]
+                break
+        if chosen is None:
+            chosen = len(duties)
+            duties.append(_Duty(piece, start, end, end_stop, bus))
+        bisect.insort(waiting.setdefault(end_stop, []), (end, chosen))
+    return duties
+
+# -------------------- Crew Duties --------------------
+
+def build_crew_duties(all_tuples, blocks, rules=None, relief=None):
+    """
+    Crew duty per trip for trips chained into `blocks` (a VehicleBlocks).
+
+    `relief` maps depot -> relief stops (default: relief_points). Duties are
+    numbered per depot and route in order of sign-in, those signing in from
+    rules.evening_from on as "1A", "2A", ...
+    """
+    rules = rules or CrewRules()
+    relief = relief_points(all_tuples) if relief is None else relief
+    trips = TripTable.from_tuples(all_tuples)
+    order = _bus_order(trips, blocks)
+
+    duty_names = [""] * len(trips)
+    stats = {"duties": 0, "evening_duties": 0, "pieces": 0, "pieces_over_limit": 0, "duties_with_break": 0,
+             "trips_without_bus": len(trips) - len(order), "max_spread_minutes": 0}
+    max_piece = min(rules.max_continuous, rules.max_driving)
+
+    for depot in dict.fromkeys(trips.depot[order].tolist()):
+        depot_order = order[trips.depot[order] == depot]
+        pieces = cut_pieces(trips, blocks.bus_ids, depot_order, relief, max_piece)
+        stats["pieces"] += len(pieces)
+        stats["pieces_over_limit"] += sum(int(trips.arr[p[-1]] - trips.dep[p[0]]) > max_piece for p in pieces)
+
+        by_route = {}
+        for piece in pieces:
+            by_route.setdefault(trips.route[piece[0]], []).append(piece)
+        for route_pieces in by_route.values():
+            duties = chain_pieces(trips, blocks.bus_ids, route_pieces, rules)
+            _name_duties(duties, rules, duty_names, stats)
+
+    return CrewDuties(duty_names, stats)
+
+def _name_duties(duties, rules, duty_names, stats):
+    """Number the duties of one depot and route in order of sign-in, and count them."""
+    duties.sort(key=lambda duty: duty.start)
+    morning = evening = 0
+    for duty in duties:
+        if duty.start - rules.sign_on >= rules.evening_from:
+            evening += 1
+            name = f"{evening}A"
+        else:
+            morning += 1
+            name = str(morning)
+        for piece in duty.pieces:
+            for t in piece:
+                duty_names[t] = name
+        stats["duties_with_break"] += duty.breaks > 0
+        spread = duty.end - duty.start + rules.sign_on + rules.sign_off
+        stats["max_spread_minutes"] = max(stats["max_spread_minutes"], spread)
+    stats["duties"] += morning
+    stats["evening_duties"] += evening
+
+# -------------------- Output --------------------
+
+def crew_duty_tuples(all_tuples, duties):
+    """
+    Trip tuples with the crew duty as duty name and Trip No counted within it.
+
+    Returns (tuples, order): trips are grouped by depot, route and duty
+    (morning duties first) in order of departure; `order` indexes all_tuples, so
+    per-trip lists such as Bus Id can be put in the same order. Trips
+    without a bus (no valid times) are left out; their number is
+    stats["trips_without_bus"], and batch.py fails the workbook over it.
+    """
+    trips = TripTable.from_tuples(all_tuples)
+    names = duties.duty_names
+    keep = [i for i, name in enumerate(names) if name]
+
+    def sort_key(i):
+        name = names[i]
+        evening = name.endswith("A")
+        return (trips.depot[i], str(trips.route[i]), evening, int(name.rstrip("A")), int(trips.dep[i]))
+
+    order = sorted(keep, key=sort_key)
+    tuples = []
+    previous, trip_num = None, 0
+    for i in order:
+        origin, dest, dep, arr, _, depot, _, route = all_tuples[i]
+        key = (depot, route, names[i])
+        trip_num = trip_num + 1 if key == previous else 1
+        previous = key
+        tuples.append((origin, dest, dep, arr, trip_num, depot, names[i], route))
+    return tuples, order
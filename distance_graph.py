@@ -0,0 +1,64 @@
+"""Sch kms for unknown OD pairs from a graph of known stop-to-stop distances.
+
+Every stored (origin, destination) distance is an edge; where only one
+direction is stored it is used for the other one as well. An unknown pair is
+filled in with its shortest path, so a short-turn (A → C, with A → B and
+B → C known) or an extended route needs no manual entry. Pairs with no path
+are left for Step 3 to prompt for or report.
+
+Shortest paths are found with Dijkstra from each origin that is asked
+about, once: the whole distance map from that origin is memoized, so all
+pairs starting there (typically the stops of one route) cost one search.
+
+    graph = DistanceGraph(store.items())
+    inferred = graph.lookup([("Depot", "Bus Stand"), ("Market", "College")])
+"""
+import heapq
+
+
+class DistanceGraph:
+    def __init__(self, known=None):
+        self.edges = {}
+        self._memo = {}
+        for (origin, dest), kms in (known or {}).items():
+            self.add(origin, dest, kms)
+
+    @classmethod
+    def from_store(cls, store):
+        return cls(store.items())
+
+    def add(self, origin, dest, kms, both_ways=True):
+        """Add a known segment; the reverse is added too unless already known."""
+        kms = float(kms)
+        self.edges.setdefault(origin, {})[dest] = kms
+        if both_ways and origin not in self.edges.get(dest, {}):
+            self.edges.setdefault(dest, {})[origin] = kms
+        self._memo.clear()
+
+    def distances_from(self, origin):
+        """Shortest distance to every reachable stop (memoized per origin)."""
+        if origin not in self._memo:
+            dist = {origin: 0.0}
+            heap = [(0.0, origin)]
+            while heap:
+                d, stop = heapq.heappop(heap)
+                if d > dist[stop]:
+                    continue
+                for nbr, kms in self.edges.get(stop, {}).items():
+                    nd = d + kms
+                    if nd < dist.get(nbr, float("inf")):
+                        dist[nbr] = nd
+                        heapq.heappush(heap, (nd, nbr))
+            self._memo[origin] = dist
+        return self._memo[origin]
+
+    def lookup(self, od_pairs):
+        """{(origin, dest): kms} for the pairs that have a path; the rest are left out."""
+        found = {}
+        for origin, dest in od_pairs:
+            if origin == dest:
+                continue
+            kms = self.distances_from(origin).get(dest)
+            if kms is not None:
+                found[(origin, dest)] = round(kms, 3)
+        return found
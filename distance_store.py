@@ -0,0 +1,136 @@
+"""Persistent Origin → Destination Sch kms store.
+
+Distances entered once are kept in a small SQLite file so that Step 3 of
+final_schedule_maker.py only has to ask for pairs it has never seen.
+
+    python distance_store.py import distances.csv
+    python distance_store.py export distances.csv
+    python distance_store.py list --db depot_kms.db
+"""
+import argparse
+import csv
+import os
+import sqlite3
+import sys
+
+DEFAULT_DB = os.environ.get("SCH_KMS_DB", "sch_kms.db")
+CSV_HEADER = ["Origin", "Destination", "Sch kms"]
+
+
+class MissingDistancesError(ValueError):
+    """Raised when Sch kms are needed for pairs the store does not know."""
+
+    def __init__(self, pairs):
+        self.pairs = list(pairs)
+        listed = ", ".join(f"{o} → {d}" for o, d in self.pairs[:10])
+        more = f" (+{len(self.pairs) - 10} more)" if len(self.pairs) > 10 else ""
+        super().__init__(f"No Sch kms stored for {len(self.pairs)} OD pair(s): {listed}{more}")
+
+
+class DistanceStore:
+    def __init__(self, path=DEFAULT_DB):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS sch_kms ("
+            " origin TEXT NOT NULL,"
+            " destination TEXT NOT NULL,"
+            " kms REAL NOT NULL,"
+            " PRIMARY KEY (origin, destination))"
+        )
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self.conn.execute("SELECT COUNT(*) FROM sch_kms").fetchone()[0]
+
+    def get(self, origin, dest):
+        row = self.conn.execute(
+            "SELECT kms FROM sch_kms WHERE origin = ? AND destination = ?", (origin, dest)
+        ).fetchone()
+        return row[0] if row else None
+
+    def lookup(self, od_pairs):
+        """Return {(origin, dest): kms} for the pairs that are stored."""
+        found = {}
+        for origin, dest in od_pairs:
+            kms = self.get(origin, dest)
+            if kms is not None:
+                found[(origin, dest)] = kms
+        return found
+
+    def set(self, origin, dest, kms):
+        self.update({(origin, dest): kms})
+
+    def update(self, sch_kms_dict):
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO sch_kms (origin, destination, kms) VALUES (?, ?, ?)",
+                [(origin, dest, float(kms)) for (origin, dest), kms in sch_kms_dict.items()],
+            )
+
+    def items(self):
+        rows = self.conn.execute("SELECT origin, destination, kms FROM sch_kms ORDER BY origin, destination")
+        return {(origin, dest): kms for origin, dest, kms in rows}
+
+    # -------------------- CSV --------------------
+
+    def import_csv(self, csv_path):
+        """Upsert Origin, Destination, Sch kms rows; returns the number of pairs read."""
+        entries = {}
+        with open(csv_path, newline="", encoding="utf-8-sig") as f:
+            for line_no, row in enumerate(csv.reader(f), start=1):
+                if not row or all(not val.strip() for val in row):
+                    continue
+                if line_no == 1 and [val.strip() for val in row[:3]] == CSV_HEADER:
+                    continue
+                if len(row) < 3:
+                    raise ValueError(f"{csv_path}:{line_no}: expected Origin, Destination, Sch kms")
+                try:
+                    entries[(row[0].strip(), row[1].strip())] = float(row[2])
+                except ValueError:
+                    raise ValueError(f"{csv_path}:{line_no}: Sch kms is not a number: {row[2]!r}") from None
+        self.update(entries)
+        return len(entries)
+
+    def export_csv(self, csv_path):
+        items = self.items()
+        with open(csv_path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(CSV_HEADER)
+            for (origin, dest), kms in items.items():
+                writer.writerow([origin, dest, kms])
+        return len(items)
+
+# -------------------- Entry Point --------------------
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Manage the stored Sch kms distances.")
+    parser.add_argument("--db", default=DEFAULT_DB, help=f"distance store file (default: {DEFAULT_DB})")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("import", help="load distances from a CSV file").add_argument("csv")
+    sub.add_parser("export", help="write all distances to a CSV file").add_argument("csv")
+    sub.add_parser("list", help="print all stored distances")
+    args = parser.parse_args(argv)
+
+    with DistanceStore(args.db) as store:
+        if args.command == "import":
+            print(f"Imported {store.import_csv(args.csv)} OD pair(s) into {args.db}")
+        elif args.command == "export":
+            print(f"Exported {store.export_csv(args.csv)} OD pair(s) to {args.csv}")
+        else:
+            for (origin, dest), kms in store.items().items():
+                print(f"  {origin} → {dest}: {kms}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
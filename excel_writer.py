@@ -0,0 +1,160 @@
+"""Write-only Excel output for both stages.
+
+Rows are streamed into a write-only workbook. Column widths are computed from
+the source frame before the first row is written, and merge ranges are worked
+out while the rows go past, so the sheet is never read back.
+"""
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment
+from openpyxl.utils import get_column_letter
+
+CENTER = Alignment(horizontal="center", vertical="center")
+
+
+def frame_rows(df):
+    """Rows of `df` as lists of Python values; missing values become "" like to_excel's na_rep."""
+    values = df.astype(object).where(df.notna(), "")
+    return values.itertuples(index=False, name=None)
+
+def frame_widths(df, header=True, padding=2):
+    """Auto-width per column: longest rendered value (and header) plus padding."""
+    widths = []
+    for pos, col in enumerate(df.columns):
+        lengths = df.iloc[:, pos].astype(object).where(df.iloc[:, pos].notna(), "").astype(str).str.len()
+        longest = int(lengths.max()) if len(lengths) else 0
+        if header:
+            longest = max(longest, len(str(col)))
+        widths.append(longest + padding)
+    return widths
+
+
+class SheetEmitter:
+    """Append rows to a write-only worksheet and collect merge ranges as they are found."""
+
+    def __init__(self, wb, title="Sheet1", widths=None, freeze_panes=None):
+        self.ws = wb.create_sheet(title)
+        # Column layout and panes are written ahead of the first row
+        for idx, width in enumerate(widths or [], start=1):
+            self.ws.column_dimensions[get_column_letter(idx)].width = width
+        if freeze_panes:
+            self.ws.freeze_panes = freeze_panes
+        self.row = 0
+
+    def append(self, values, alignment=None, aligned_columns=None):
+        """Write one row; `alignment` applies to `aligned_columns` (1-based), or all cells."""
+        if alignment is None:
+            self.ws.append(values)
+        else:
+            cells = []
+            for col, value in enumerate(values, start=1):
+                cell = WriteOnlyCell(self.ws, value=value)
+                if aligned_columns is None or col in aligned_columns:
+                    cell.alignment = alignment
+                cells.append(cell)
+            self.ws.append(cells)
+        self.row += 1
+
+    def merge(self, start_row, start_column, end_row, end_column):
+        self.ws.merged_cells.add(f"{get_column_letter(start_column)}{start_row}:"
+                                 f"{get_column_letter(end_column)}{end_row}")
+
+
+class RunMerger:
+    """
+    Merge runs of equal consecutive values in one column.
+
+    feed() returns the value to write: the first cell of a run keeps it, the
+    following ones are left empty since only the top-left cell of a merge shows.
+    """
+
+    def __init__(self, emitter, column):
+        self.emitter = emitter
+        self.column = column
+        self.value = None
+        self.start = None
+        self.end = None
+
+    def feed(self, row, value):
+        if self.start is not None and value == self.value:
+            self.end = row
+            return None
+        self.close()
+        self.value, self.start, self.end = value, row, row
+        return value
+
+    def close(self):
+        if self.start is not None and self.end > self.start:
+            self.emitter.merge(self.start, self.column, self.end, self.column)
+        self.start = None
+
+# -------------------- Stage 1: Flat Schedule --------------------
+
+def write_final_schedule(df_final, output_file, merge_column="Duty Name"):
+    """Header row, frozen below; auto-width columns; consecutive equal Duty Names merged."""
+    wb = Workbook(write_only=True)
+    sheet = SheetEmitter(wb, "Sheet1", widths=frame_widths(df_final), freeze_panes="A2")
+    sheet.append([str(col) for col in df_final.columns])
+
+    merge_idx = df_final.columns.get_loc(merge_column)
+    merger = RunMerger(sheet, merge_idx + 1)
+    for values in frame_rows(df_final):
+        values = list(values)
+        values[merge_idx] = merger.feed(sheet.row + 1, values[merge_idx])
+        sheet.append(values)
+    merger.close()
+
+    wb.save(output_file)
+    return output_file
+
+def write_tables(tables, output_file):
+    """One plain sheet per {title: DataFrame}: header row frozen, auto-width columns."""
+    wb = Workbook(write_only=True)
+    for title, df in tables.items():
+        sheet = SheetEmitter(wb, title, widths=frame_widths(df), freeze_panes="A2")
+        sheet.append([str(col) for col in df.columns])
+        for values in frame_rows(df):
+            sheet.append(list(values))
+    wb.save(output_file)
+    return output_file
+
+# -------------------- Stage 2: Duty Grid --------------------
+
+def _label_runs(labels):
+    """1-based (start, end) column spans where a non-empty label repeats."""
+    runs = []
+    start = 1
+    for col in range(2, len(labels) + 2):
+        if col > len(labels) or labels[col - 1] != labels[start - 1]:
+            if labels[start - 1] != "" and col - 1 > start:
+                runs.append((start, col - 1))
+            start = col
+    return runs
+
+def write_duty_grids(grids, output_file):
+    """
+    One duty grid sheet per {title: (df_final_schedule, first_row)} entry,
+    below an empty first row. Each stop name in the stop-name header row
+    (`first_row`) is merged across its Arrival/Departure pair.
+    """
+    wb = Workbook(write_only=True)
+    for title, (df_final_schedule, first_row) in grids.items():
+        _emit_duty_grid(SheetEmitter(wb, title), df_final_schedule, first_row)
+    wb.save(output_file)
+    return output_file
+
+def _emit_duty_grid(sheet, df_final_schedule, first_row):
+    sheet.append([])
+
+    runs = _label_runs(first_row)
+    starts = {start for start, _ in runs}
+    covered = {col for start, end in runs for col in range(start + 1, end + 1)}
+
+    rows = frame_rows(df_final_schedule)
+    header = [None if col in covered else value for col, value in enumerate(next(rows), start=1)]
+    sheet.append(header, alignment=CENTER, aligned_columns=starts)
+    for start, end in runs:
+        sheet.merge(sheet.row, start, sheet.row, end)
+
+    for values in rows:
+        sheet.append(list(values))
@@ -0,0 +1,79 @@
+"""On-disk cache of per-sheet extraction results.
+
+Entries are keyed by a hash of a sheet's cell values plus the extractor
+version, so a revised workbook only re-extracts the sheets that changed.
+The cache directory is kept under a size limit by evicting the least recently
+used entries.
+"""
+import hashlib
+import os
+import pickle
+import tempfile
+
+DEFAULT_CACHE_DIR = os.environ.get("EXTRACT_CACHE_DIR", ".extract_cache")
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+
+def hash_rows(rows, version):
+    """Return (key, rows) for an iterable of cell-value tuples; rows are kept for a cache miss."""
+    digest = hashlib.blake2b(f"extractor-v{version}".encode(), digest_size=20)
+    kept = []
+    for row in rows:
+        digest.update(repr(row).encode())
+        digest.update(b"\n")
+        kept.append(row)
+    return digest.hexdigest(), kept
+
+
+class ExtractCache:
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.pkl")
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                value = pickle.load(f)
+            os.utime(path)  # mark as recently used
+        except (OSError, EOFError, pickle.UnpicklingError):
+            # Missing, partial or evicted by another worker mid-read: a miss
+            return None
+        return value
+
+    def put(self, key, value):
+        # Write then rename, so concurrent workers never see a partial entry
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self._path(key))
+        self.evict()
+
+    def evict(self):
+        """Drop least recently used entries until the cache fits in max_bytes."""
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".pkl"):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def clear(self):
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith((".pkl", ".tmp")):
+                os.remove(entry.path)
@@ -1,20 +1,29 @@
 import os
 import re
 import sys
+import itertools
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
 import pandas as pd
 import openpyxl
-import tkinter as tk
-from tkinter import filedialog
-from datetime import datetime, timedelta
 from tqdm import tqdm
+import excel_writer
+import trip_files
+from distance_graph import DistanceGraph
+from distance_store import DistanceStore, MissingDistancesError
+from extract_cache import hash_rows
+from instrumentation import counts_of, stage
+from trip_table import INVALID, TripTable
+from validation import report_violations, violations_path
 
 # -------------------- Utility Functions --------------------
 
-def is_hhmm(val):
-    return isinstance(val, str) and re.fullmatch(r"\d{1,2}:\d{2}", val.strip())
+HHMM_RE = re.compile(r"\d{1,2}:\d{2}")
+DUTY_RE = re.compile(r"\d+[A]?")
 
-def is_empty(val):
-    return pd.isna(val) or str(val).strip() == ""
+def is_hhmm(val):
+    return isinstance(val, str) and HHMM_RE.fullmatch(val.strip())
 
 def get_stop_name(stop_row, col_idx):
     while col_idx >= 0:
@@ -46,255 +55,570 @@ def map_bus_id(duty_name_val):
     else:
         return ""
 
-def compute_run_time(start, end):
-    try:
-        fmt = "%H:%M"
-        t1 = datetime.strptime(start, fmt)
-        t2 = datetime.strptime(end, fmt)
-        if t2 < t1:
-            t2 += timedelta(days=1)
-        return int((t2 - t1).total_seconds() // 60)
-    except:
-        return None
-
-# -------------------- File Picker --------------------
-
-root = tk.Tk()
-root.withdraw()
-file_path = filedialog.askopenfilename(title="Select Excel File", filetypes=[("Excel files", "*.xlsx *.xls")])
-if not file_path:
-    print("No file selected. Exiting.")
-    sys.exit(1)
-
-excel_name = os.path.splitext(os.path.basename(file_path))[0]
-
 # -------------------- Step 1: Extract Tables --------------------
 
-print(f"\n Reading file: {file_path}")
-wb = openpyxl.load_workbook(file_path, data_only=True)
-dataframes = []
-df_counter = 1
-
-for sheetname in tqdm(wb.sheetnames, desc="Scanning sheets"):
-    ws = wb[sheetname]
-    rows = list(ws.iter_rows())
-    i = 0
-
-    while i < len(rows):
-        found_header = False
-        while i < len(rows):
-            row_values = [str(cell.value).strip() if cell.value is not None else "" for cell in rows[i]]
-            if "Duty Number" in row_values:
-                header_row_idx = i
-                duty_idx = row_values.index("Duty Number")
-                arrival_count = sum("Arrival" in val for val in row_values)
-                total_columns = 4 + 2 * arrival_count
-                found_header = True
-                break
-            i += 1
-
-        if not found_header:
-            break
-
-        start_row = max(0, header_row_idx - 2)
-        i = header_row_idx + 1
-        table_data = []
-
-        for k in range(start_row, header_row_idx + 1):
-            row = rows[k][duty_idx: duty_idx + total_columns]
-            clean_row = [cell.value.strftime("%H:%M") if hasattr(cell.value, "strftime") else cell.value for cell in row]
-            table_data.append(clean_row)
-
-        empty_rows = 0
-        while i < len(rows):
-            row = rows[i][duty_idx: duty_idx + total_columns]
-            clean_row = [cell.value.strftime("%H:%M") if hasattr(cell.value, "strftime") else cell.value for cell in row]
+def _clean_value(val):
+    return val.strftime("%H:%M") if hasattr(val, "strftime") else val
+
+def _table_row(values, duty_idx, total_columns):
+    row = [_clean_value(val) for val in values[duty_idx: duty_idx + total_columns]]
+    row.extend([None] * (total_columns - len(row)))
+    return row
+
+def _find_header(values):
+    for idx, val in enumerate(values):
+        if isinstance(val, str) and val.strip() == "Duty Number":
+            return idx
+    return None
+
+def _table_frame(table_data, total_columns):
+    col_headers = [f"Col_{j+1}" for j in range(total_columns)]
+    return pd.DataFrame(table_data, columns=col_headers)
+
+def iter_sheet_tables(rows, counts=None):
+    """
+    Yield the tables of one sheet as Col_1..Col_n DataFrames.
+
+    `rows` is any iterable of cell-value tuples. A table starts two rows above a
+    "Duty Number" header and is closed off by four consecutive empty rows, so only
+    the table being built and the last two rows are held at any time. Blank rows
+    skipped inside a table are added to `counts` (a Counter) if given.
+    """
+    previous = deque(maxlen=2)
+    table_data = None
+    duty_idx = total_columns = None     # set when a header opens a table
+    empty_rows = 0
+    rows_scanned = blank_rows_dropped = 0
+
+    for values in rows:
+        rows_scanned += 1
+        if table_data is not None:
+            clean_row = _table_row(values, duty_idx, total_columns)
             if all(val is None or str(val).strip() == "" for val in clean_row):
                 empty_rows += 1
                 if empty_rows > 3:
-                    break
+                    yield _table_frame(table_data, total_columns)
+                    table_data = None
             else:
+                blank_rows_dropped += empty_rows
                 empty_rows = 0
                 table_data.append(clean_row)
-            i += 1
 
-        if table_data:
-            col_headers = [f"Col_{j+1}" for j in range(total_columns)]
-            df = pd.DataFrame(table_data, columns=col_headers)
-            dataframes.append(df)
-            df_counter += 1
+        # The row that closes a table is scanned for the next header as well
+        if table_data is None:
+            duty_idx = _find_header(values)
+            if duty_idx is not None:
+                arrival_count = sum(isinstance(val, str) and "Arrival" in val for val in values)
+                total_columns = 4 + 2 * arrival_count
+                table_data = [_table_row(prev, duty_idx, total_columns) for prev in previous]
+                table_data.append(_table_row(values, duty_idx, total_columns))
+                empty_rows = 0
+
+        previous.append(values)
 
-if not dataframes:
-    print(" No valid tables found. Exiting.")
-    sys.exit(1)
+    if table_data is not None:
+        yield _table_frame(table_data, total_columns)
 
-# -------------------- Step 2: Convert to Trip Tuples --------------------
+    if counts is not None:
+        counts["rows_scanned"] += rows_scanned
+        counts["blank_rows_dropped"] += blank_rows_dropped
 
-print(f"\n Extracting trip tuples from {len(dataframes)} tables...")
-all_tuples = []
-for df in tqdm(dataframes, desc="Building tuples"):
-    if df.shape[0] < 4:
-        continue
-
-    stop_name_row = df.iloc[1]
-    head_row = df.iloc[2]
-    depot = str(df.iloc[1].get("Col_1", "")).strip()
-    route = str(df.iloc[0].get("Col_1", "")).strip()
-    num_cols = df.shape[1]
-    evening_seen = False
+def iter_tables(file_path, progress=True, report=None):
+    """Stream tables sheet by sheet from a read-only workbook."""
+    wb = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        for sheetname in tqdm(wb.sheetnames, desc="Scanning sheets", disable=not progress):
+            tables = 0
+            for df in iter_sheet_tables(wb[sheetname].iter_rows(values_only=True), counts_of(report)):
+                tables += 1
+                yield df
+            if report is not None:
+                report.add_sheet(sheetname, tables)
+    finally:
+        wb.close()
+
+def extract_tables(file_path, progress=True, report=None):
+    """Load the whole workbook (trusting actual cells over declared sheet dimensions)."""
+    wb = openpyxl.load_workbook(file_path, data_only=True)
+    dataframes = []
+
+    for sheetname in tqdm(wb.sheetnames, desc="Scanning sheets", disable=not progress):
+        tables = list(iter_sheet_tables(wb[sheetname].iter_rows(values_only=True), counts_of(report)))
+        if report is not None:
+            report.add_sheet(sheetname, len(tables))
+        dataframes.extend(tables)
+
+    return dataframes
+
+# -------------------- Duty Block Segmentation --------------------
+
+def _hhmm_mask(values):
+    flat = values.ravel()
+    mask = np.fromiter((isinstance(v, str) and HHMM_RE.fullmatch(v.strip()) is not None for v in flat),
+                       dtype=bool, count=flat.size)
+    return mask.reshape(values.shape)
+
+def _empty_mask(values):
+    flat = values.ravel()
+    blank = np.fromiter((isinstance(v, str) and not v.strip() for v in flat), dtype=bool, count=flat.size)
+    return pd.isna(values) | blank.reshape(values.shape)
+
+def duty_block_flags(values, hhmm=None):
+    """
+    Per-row flags of a table's object array: (duty_start, terminator, evening).
+
+    duty_start: Col_1 is a duty number such as "12" or "12A".
+    terminator: Col_2..Col_4 are HH:MM and every later column is empty.
+    evening:    some cell mentions "Evening Duties".
+    """
+    if hhmm is None:
+        hhmm = _hhmm_mask(values)
+    duty_start = np.array([DUTY_RE.fullmatch(str(val).strip()) is not None for val in values[:, 0]], dtype=bool)
+    terminator = hhmm[:, 1:4].all(axis=1) & _empty_mask(values[:, 4:]).all(axis=1)
+    evening = np.array([any(isinstance(val, str) and "evening duties" in val.lower() for val in row)
+                        for row in values], dtype=bool)
+    return duty_start, terminator, evening
+
+def iter_duty_blocks(duty_start, terminator, evening):
+    """
+    Yield (block_start, block_end, evening_seen) from per-row flags in O(rows).
+
+    A block runs from a duty-start row to the next terminator row (or the last
+    row). Rows inside a block are not checked for further duty starts or for
+    the "Evening Duties" marker.
+    """
+    n_rows = len(duty_start)
+    if not n_rows:
+        return
+
+    # next_end[i]: first terminator after row i, else the last row
+    candidates = np.where(terminator, np.arange(n_rows), n_rows - 1)
+    next_end = np.empty(n_rows, dtype=np.int64)
+    next_end[:-1] = np.minimum.accumulate(candidates[::-1])[::-1][1:]
+    next_end[-1] = n_rows - 1
+    evening_count = np.cumsum(evening)
 
+    evening_seen = False
     i = 0
-    while i < len(df):
-        row = df.iloc[i]
-        if row.astype(str).str.contains("Evening Duties", case=False, na=False).any():
+    for block_start in np.flatnonzero(duty_start).tolist():
+        if block_start < i:
+            continue
+        if evening_count[block_start] - (evening_count[i - 1] if i else 0):
             evening_seen = True
+        block_end = int(next_end[block_start])
+        yield block_start, block_end, evening_seen
+        i = block_end + 1
 
-        col_1 = str(row.get("Col_1", "")).strip()
-        block_start = None
-        if re.fullmatch(r"\d+[A]?", col_1):
-            block_start = i
-        if block_start is None:
-            i += 1
-            continue
+def segment_duty_blocks(df):
+    """Duty block boundaries of one extracted table (Col_1..Col_n DataFrame)."""
+    return iter_duty_blocks(*duty_block_flags(df.to_numpy(dtype=object)))
 
-        block_end = block_start
-        for j in range(block_start + 1, len(df)):
-            check_row = df.iloc[j]
-            if (
-                all(is_hhmm(check_row.get(f"Col_{c}", "")) for c in range(2, 5)) and
-                all(is_empty(check_row.get(f"Col_{c}", "")) for c in range(5, num_cols + 1))
-            ):
-                block_end = j
-                break
-        else:
-            block_end = len(df) - 1
+# -------------------- Step 2: Convert to Trip Tuples --------------------
+
+def build_trip_tuples(dataframes, progress=True):
+    all_tuples = []
+    for df in tqdm(dataframes, desc="Building tuples", disable=not progress):
+        if df.shape[0] < 4:
+            continue
 
-        duty_name = str(df.iloc[block_start].get("Col_1", "")).strip()
+        stop_name_row = df.iloc[1]
+        head_row = df.iloc[2]
+        depot = str(df.iloc[1].get("Col_1", "")).strip()
+        route = str(df.iloc[0].get("Col_1", "")).strip()
+        num_cols = df.shape[1]
+
+        for block_start, block_end, evening_seen in segment_duty_blocks(df):
+            duty_name = str(df.iloc[block_start].get("Col_1", "")).strip()
+            if evening_seen and duty_name.isdigit():
+                duty_name += 'A'
+
+            cell_tuples = []
+            for r in range(block_start, block_end + 1):
+                row = df.iloc[r]
+                for c in range(3, num_cols):
+                    col_key = f"Col_{c + 1}"
+                    time_val = row.get(col_key, "")
+                    if is_hhmm(time_val):
+                        stop = get_stop_name(stop_name_row, c)
+                        arr_dep = "a" if "Arrival" in str(head_row.get(col_key, "")).strip() else "d"
+                        cell_tuples.append((time_val.strip(), stop, arr_dep))
+
+            if cell_tuples:
+                last_time, last_stop, last_arr_dep = cell_tuples[-1]
+                if last_arr_dep == 'd':
+                    cell_tuples[-1] = (last_time, last_stop, 'a')
+
+            trip_num = 1
+            for j in range(0, len(cell_tuples) - 1, 2):
+                first = cell_tuples[j]
+                second = cell_tuples[j + 1]
+                if first[2] == 'd' and second[2] == 'a':
+                    dep_time, start_stop = first[0], first[1]
+                    arr_time, end_stop = second[0], second[1]
+                elif first[2] == 'a' and second[2] == 'd':
+                    dep_time, start_stop = second[0], second[1]
+                    arr_time, end_stop = first[0], first[1]
+                else:
+                    continue
+
+                if start_stop == "UNKNOWN_STOP" or end_stop == "UNKNOWN_STOP":
+                    continue
+
+                all_tuples.append((start_stop, end_stop, dep_time, arr_time, trip_num, depot, duty_name, route))
+                trip_num += 1
+
+    return all_tuples
+
+# -------------------- Step 2 (vectorized) --------------------
+
+def _stop_names(stop_row):
+    """Forward-fill the stop-name row once; same lookup as get_stop_name for every column."""
+    stop_row = pd.Series(stop_row, dtype=object)
+    text = stop_row.astype(str).str.strip()
+    valid = stop_row.notna() & (text.str.lower() != "nan")
+    return text.where(valid).ffill().fillna("UNKNOWN_STOP").to_numpy(dtype=object)
+
+def _table_tuples(df, counts=None):
+    values = df.to_numpy(dtype=object)
+
+    depot = str(values[1, 0]).strip()
+    route = str(values[0, 0]).strip()
+    stop_names = _stop_names(values[1])
+    is_arrival = np.array(["Arrival" in str(val).strip() for val in values[2]], dtype=bool)
+
+    hhmm = _hhmm_mask(values)
+
+    tuples = []
+    blocks = cells = bad_order = unknown_stop = 0
+    for block_start, block_end, evening_seen in iter_duty_blocks(*duty_block_flags(values, hhmm)):
+        blocks += 1
+        duty_name = str(values[block_start, 0]).strip()
         if evening_seen and duty_name.isdigit():
             duty_name += 'A'
 
-        cell_tuples = []
-        for r in range(block_start, block_end + 1):
-            row = df.iloc[r]
-            for c in range(3, num_cols):
-                col_key = f"Col_{c + 1}"
-                time_val = row.get(col_key, "")
-                if is_hhmm(time_val):
-                    stop = get_stop_name(stop_name_row, c)
-                    arr_dep = "a" if "Arrival" in str(head_row.get(col_key, "")).strip() else "d"
-                    cell_tuples.append((time_val.strip(), stop, arr_dep))
-
-        if cell_tuples:
-            last_time, last_stop, last_arr_dep = cell_tuples[-1]
-            if last_arr_dep == 'd':
-                cell_tuples[-1] = (last_time, last_stop, 'a')
-
-        trip_num = 1
-        for j in range(0, len(cell_tuples) - 1, 2):
-            first = cell_tuples[j]
-            second = cell_tuples[j + 1]
-            if first[2] == 'd' and second[2] == 'a':
-                dep_time, start_stop = first[0], first[1]
-                arr_time, end_stop = second[0], second[1]
-            elif first[2] == 'a' and second[2] == 'd':
-                dep_time, start_stop = second[0], second[1]
-                arr_time, end_stop = first[0], first[1]
-            else:
-                continue
-
-            if start_stop == "UNKNOWN_STOP" or end_stop == "UNKNOWN_STOP":
-                continue
-
-            all_tuples.append((start_stop, end_stop, dep_time, arr_time, trip_num, depot, duty_name, route))
-            trip_num += 1
-        i = block_end + 1
-
-if not all_tuples:
-    print(" No trip tuples could be formed. Exiting.")
-    sys.exit(1)
+        # Time cells of the block in row-major order, from Col_4 onwards
+        rows_idx, cols_idx = np.nonzero(hhmm[block_start:block_end + 1, 3:])
+        rows_idx += block_start
+        cols_idx += 3
+        count = len(cols_idx) // 2 * 2
+        cells += len(cols_idx)
+        if count:
+            arrival = is_arrival[cols_idx]
+            arrival[-1] = True  # trailing departure is read as the arrival back in
+            first_a = arrival[0:count:2]
+            second_a = arrival[1:count:2]
+            dep_first = ~first_a & second_a
+            keep = dep_first | (first_a & ~second_a)
+
+            even = np.arange(0, count, 2)
+            dep_idx = np.where(dep_first, even, even + 1)
+            arr_idx = np.where(dep_first, even + 1, even)
+            stops = stop_names[cols_idx]
+            known = (stops[dep_idx] != "UNKNOWN_STOP") & (stops[arr_idx] != "UNKNOWN_STOP")
+            bad_order += int(np.count_nonzero(~keep))
+            unknown_stop += int(np.count_nonzero(keep & ~known))
+            keep &= known
+            dep_idx = dep_idx[keep]
+            arr_idx = arr_idx[keep]
+
+            for trip_num, (d, a) in enumerate(zip(dep_idx.tolist(), arr_idx.tolist()), start=1):
+                dep_time = values[rows_idx[d], cols_idx[d]].strip()
+                arr_time = values[rows_idx[a], cols_idx[a]].strip()
+                tuples.append((stops[d], stops[a], dep_time, arr_time, trip_num, depot, duty_name, route))
+
+    if counts is not None:
+        counts["duty_blocks"] += blocks
+        counts["time_cells"] += cells
+        counts["pairs_skipped_bad_order"] += bad_order
+        counts["pairs_skipped_unknown_stop"] += unknown_stop
+        # A block with an odd number of time cells leaves its last one unpaired
+        counts["time_cells_unpaired"] += cells - 2 * (bad_order + unknown_stop) - 2 * len(tuples)
+    return tuples
+
+def build_trip_tuples_vectorized(dataframes, progress=True, counts=None):
+    """
+    Same output as build_trip_tuples, computed from whole-table masks.
+
+    Each table is converted to one object array; the HH:MM mask, the stop-name
+    forward-fill and the arrival/departure mask are computed once and trip
+    pairs are formed with array operations instead of per-cell lookups.
+    Tables, blocks, trips and skipped pairs are added to `counts` if given.
+    """
+    all_tuples = []
+    for df in tqdm(dataframes, desc="Building tuples", disable=not progress):
+        if counts is not None:
+            counts["tables"] += 1
+        if df.shape[0] < 4:
+            if counts is not None:
+                counts["tables_too_short"] += 1
+            continue
+        all_tuples.extend(_table_tuples(df, counts))
+    if counts is not None:
+        counts["trips"] += len(all_tuples)
+    return all_tuples
 
 # -------------------- Step 3: Sch kms Input --------------------
 
-print("\n Enter Scheduled Kilometers (Sch kms) for each Origin → Destination pair:")
-unique_od_pairs = sorted({(start, end) for start, end, *_ in all_tuples})
-sch_kms_dict = {}
+def unique_od_pairs(all_tuples):
+    return sorted({(start, end) for start, end, *_ in all_tuples})
+
+def prompt_sch_kms(od_pairs, store=None):
+    print("\n Enter Scheduled Kilometers (Sch kms) for each Origin → Destination pair:")
+    sch_kms_dict = {}
 
-for origin, dest in unique_od_pairs:
-    while True:
-        try:
-            val = input(f"  {origin} → {dest}: ").strip()
-            sch_kms_dict[(origin, dest)] = float(val)
-            break
-        except ValueError:
-            print("     Invalid input. Please enter a numeric value.")
+    for origin, dest in od_pairs:
+        while True:
+            try:
+                val = input(f"  {origin} → {dest}: ").strip()
+                sch_kms_dict[(origin, dest)] = float(val)
+                break
+            except ValueError:
+                print("     Invalid input. Please enter a numeric value.")
+        if store is not None:
+            store.set(origin, dest, sch_kms_dict[(origin, dest)])
+
+    return sch_kms_dict
+
+def collect_sch_kms(od_pairs, store, interactive=True, infer=False, counts=None):
+    """
+    Step 3: look every OD pair up in the distance store first.
+
+    With `infer`, pairs the store has never seen are filled in by shortest
+    path over the stored segments (see distance_graph.py); inferred values are
+    not saved. Pairs still missing are prompted for (and saved as they are
+    entered); with interactive=False they raise MissingDistancesError instead.
+    """
+    sch_kms_dict = store.lookup(od_pairs)
+    missing = [pair for pair in od_pairs if pair not in sch_kms_dict]
+    if missing and infer:
+        inferred = DistanceGraph.from_store(store).lookup(missing)
+        sch_kms_dict.update(inferred)
+        missing = [pair for pair in missing if pair not in inferred]
+        if counts is not None:
+            counts["sch_kms_inferred"] += len(inferred)
+    if missing:
+        if not interactive:
+            raise MissingDistancesError(missing)
+        sch_kms_dict.update(prompt_sch_kms(missing, store=store))
+    return sch_kms_dict
 
 # -------------------- Step 4: Build Final Output --------------------
 
-required_cols = [
+REQUIRED_COLS = [
     "S.No", "Depot", "Trip No", "Duty Name", "Duty Working Day Type",
     "Route Number", "Route Direction", "Origin", "Destination",
     "Start Time", "End Time", "Trip Type", "Sch kms",
     "Run Time", "Shift", "Bus Id"
 ]
 
-rows = []
-for i, (start_stop, end_stop, dep_time, arr_time, trip_num, depot, duty_name, route) in enumerate(tqdm(all_tuples, desc="Creating final rows"), start=1):
-    run_time = compute_run_time(dep_time, arr_time)
-    row = {
-        "S.No": i,
-        "Depot": depot,
-        "Trip No": trip_num,
-        "Duty Name": f"{route}/{duty_name}",
-        "Duty Working Day Type": "Monday to Sunday",
-        "Route Number": route,
-        "Route Direction": "",  # Can be customized
-        "Origin": start_stop,
-        "Destination": end_stop,
-        "Start Time": f"{dep_time}:00",
-        "End Time": f"{arr_time}:00",
-        "Trip Type": "Regular Trip",
-        "Sch kms": sch_kms_dict.get((start_stop, end_stop), ""),
-        "Run Time": run_time,
-        "Shift": map_shift(duty_name),
-        "Bus Id": map_bus_id(duty_name)
-    }
-    rows.append(row)
-
-df_final = pd.DataFrame(rows, columns=required_cols)
+def build_final_schedule(all_tuples, sch_kms_dict, progress=True, counts=None, bus_ids=None):
+    """
+    One row per trip. Bus Id is derived from the duty number unless `bus_ids`
+    (one per trip, e.g. from vehicle_blocks.assign_vehicle_blocks) is given.
+    """
+    # Run times for all trips at once from the minute-of-day model
+    run_times = [None if m == INVALID else m for m in TripTable.from_tuples(all_tuples).run_time().tolist()]
+    if counts is not None:
+        counts["trips_invalid_time"] += run_times.count(None)
+        counts["trips_missing_kms"] += sum((start, end) not in sch_kms_dict for start, end, *_ in all_tuples)
+
+    rows = []
+    for i, (start_stop, end_stop, dep_time, arr_time, trip_num, depot, duty_name, route) in enumerate(tqdm(all_tuples, desc="Creating final rows", disable=not progress), start=1):
+        run_time = run_times[i - 1]
+        row = {
+            "S.No": i,
+            "Depot": depot,
+            "Trip No": trip_num,
+            "Duty Name": f"{route}/{duty_name}",
+            "Duty Working Day Type": "Monday to Sunday",
+            "Route Number": route,
+            "Route Direction": "",  # Can be customized
+            "Origin": start_stop,
+            "Destination": end_stop,
+            "Start Time": f"{dep_time}:00",
+            "End Time": f"{arr_time}:00",
+            "Trip Type": "Regular Trip",
+            "Sch kms": sch_kms_dict.get((start_stop, end_stop), ""),
+            "Run Time": run_time,
+            "Shift": map_shift(duty_name),
+            "Bus Id": map_bus_id(duty_name) if bus_ids is None else bus_ids[i - 1]
+        }
+        rows.append(row)
+
+    return pd.DataFrame(rows, columns=REQUIRED_COLS)
 
 # -------------------- Step 5: Save Excel --------------------
 
-from openpyxl.utils import get_column_letter
+def final_schedule_path(file_path):
+    return os.path.splitext(file_path)[0] + "_final_schedule.xlsx"
+
+def save_final_schedule(df_final, output_file):
+    # Widths and Duty Name merges are computed from df_final while streaming rows
+    return excel_writer.write_final_schedule(df_final, output_file)
+
+# -------------------- Pipeline --------------------
+
+# Bump whenever Steps 1-2 change what they produce, so cached sheets are re-extracted
+EXTRACTOR_VERSION = 2
+
+def extract_sheet(rows, cache=None):
+    """
+    Steps 1-2 for one sheet's rows; returns (table_count, tuples, counts).
+
+    `counts` is a Counter of the data-quality counts for the sheet. With an
+    ExtractCache, the result is looked up by a hash of the sheet's cell values
+    and only computed on a miss.
+    """
+    if cache is None:
+        counts = Counter()
+        tables = list(iter_sheet_tables(rows, counts))
+        return len(tables), build_trip_tuples_vectorized(tables, progress=False, counts=counts), counts
+
+    key, rows = hash_rows(rows, EXTRACTOR_VERSION)
+    cached = cache.get(key)
+    if cached is not None:
+        return cached
+    result = extract_sheet(rows)
+    cache.put(key, result)
+    return result
+
+def _extract_sheet_shard(file_path, sheetnames, cache=None):
+    """Worker: open the workbook read-only and run Steps 1-2 on the given sheets."""
+    wb = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        return [(sheetname, *extract_sheet(wb[sheetname].iter_rows(values_only=True), cache=cache))
+                for sheetname in sheetnames]
+    finally:
+        wb.close()
+
+def extract_sheets_parallel(file_path, workers=None, progress=True, cache=None, report=None):
+    """
+    Steps 1-2 with sheets sharded round-robin across worker processes.
+
+    Returns (table_count, all_tuples); tuples are merged back in workbook sheet
+    order, so the result is identical to a serial run. Workers share `cache`.
+    """
+    wb = openpyxl.load_workbook(file_path, read_only=True)
+    sheetnames = wb.sheetnames
+    wb.close()
+
+    workers = max(1, min(workers or os.cpu_count() or 1, len(sheetnames)))
+    shards = [sheetnames[k::workers] for k in range(workers)]
+    by_sheet = {}
+
+    if workers == 1:
+        by_sheet.update((name, result) for name, *result in _extract_sheet_shard(file_path, sheetnames, cache))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(_extract_sheet_shard, file_path, shard, cache) for shard in shards]
+            for future in tqdm(as_completed(futures), total=len(futures), desc="Scanning sheet shards", disable=not progress):
+                by_sheet.update((name, result) for name, *result in future.result())
+
+    if report is not None:
+        for name in sheetnames:
+            report.add_sheet(name, by_sheet[name][0])
+            report.merge(by_sheet[name][2])
+    table_count = sum(by_sheet[name][0] for name in sheetnames)
+    all_tuples = [t for name in sheetnames for t in by_sheet[name][1]]
+    return table_count, all_tuples
+
+def extract_trip_tuples(file_path, progress=True, streaming=False, sheet_workers=None, cache=None, report=None):
+    """
+    Steps 1-2: read a timetable workbook and return its trip tuples.
+
+    With `streaming`, tables are read from a read-only workbook and turned into
+    tuples one at a time, so peak memory follows the largest table rather than
+    the whole workbook. With `sheet_workers`, sheets are processed in parallel
+    (see extract_sheets_parallel). With an ExtractCache, sheets are read one at
+    a time and only those whose contents changed since a previous run are
+    extracted again. Stage times and counts go to `report` (a RunReport).
+    """
+    if sheet_workers or cache is not None:
+        with stage(report, "extract"):
+            table_count, all_tuples = extract_sheets_parallel(file_path, workers=sheet_workers or 1,
+                                                              progress=progress, cache=cache, report=report)
+        if not table_count:
+            raise ValueError("No valid tables found.")
+        if not all_tuples:
+            raise ValueError("No trip tuples could be formed.")
+        return all_tuples
+
+    if streaming:
+        with stage(report, "extract"):
+            tables = iter_tables(file_path, progress=progress, report=report)
+            first = next(tables, None)
+            if first is None:
+                raise ValueError("No valid tables found.")
+            tables = itertools.chain([first], tables)
+            if progress:
+                print("\n Extracting trip tuples while streaming tables...")
+            all_tuples = build_trip_tuples_vectorized(tables, progress=progress, counts=counts_of(report))
+    else:
+        with stage(report, "extract_tables"):
+            tables = extract_tables(file_path, progress=progress, report=report)
+        if not tables:
+            raise ValueError("No valid tables found.")
+        if progress:
+            print(f"\n Extracting trip tuples from {len(tables)} tables...")
+        with stage(report, "build_tuples"):
+            all_tuples = build_trip_tuples_vectorized(tables, progress=progress, counts=counts_of(report))
+
+    if not all_tuples:
+        raise ValueError("No trip tuples could be formed.")
+    return all_tuples
+
+def write_final_schedule(file_path, all_tuples, sch_kms_dict, output_file=None, progress=True, report=None,
+                         trip_format=None):
+    """
+    Steps 4-5: build the flat schedule for a workbook and save it next to the
+    input. With `trip_format` ("parquet", "feather" or "csv"), a typed trip
+    file is written next to it as well (see trip_files.py).
+    """
+    with stage(report, "build_schedule"):
+        df_final = build_final_schedule(all_tuples, sch_kms_dict, progress=progress, counts=counts_of(report))
+    if trip_format:
+        with stage(report, "write_trip_file"):
+            trip_files.save_trip_file(df_final, trip_files.trip_file_path(file_path, trip_format))
+    with stage(report, "write_final_schedule"):
+        return save_final_schedule(df_final, output_file or final_schedule_path(file_path))
 
-output_file = os.path.splitext(file_path)[0] + "_final_schedule.xlsx"
-with pd.ExcelWriter(output_file, engine="openpyxl") as writer:
-    df_final.to_excel(writer, index=False, sheet_name="Sheet1")
+# -------------------- File Picker --------------------
+
+def pick_file():
+    import tkinter as tk
+    from tkinter import filedialog
+
+    root = tk.Tk()
+    root.withdraw()
+    return filedialog.askopenfilename(title="Select Excel File", filetypes=[("Excel files", "*.xlsx *.xls")])
 
-    ws = writer.sheets["Sheet1"]
-    ws.freeze_panes = ws["A2"]
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv:
+        import batch
+        return batch.main(["schedule"] + list(argv))
 
-    # Auto-width
-    for col in ws.columns:
-        max_len = max(len(str(cell.value)) for cell in col)
-        ws.column_dimensions[col[0].column_letter].width = max_len + 2
+    file_path = pick_file()
+    if not file_path:
+        print("No file selected. Exiting.")
+        sys.exit(1)
+
+    print(f"\n Reading file: {file_path}")
+    try:
+        all_tuples = extract_trip_tuples(file_path)
+    except ValueError as e:
+        print(f" {e} Exiting.")
+        sys.exit(1)
 
-    # Merge Duty Name cells if consecutive rows have same value
-    duty_col_idx = df_final.columns.get_loc("Duty Name") + 1  # 1-based index for Excel
-    prev_value = None
-    merge_start = 2  # Start from row 2 (row 1 is header)
+    violations, violations_file = report_violations(all_tuples, violations_path(file_path))
+    if violations_file:
+        print(f"\n {len(violations)} schedule violation(s) saved at: {violations_file}")
 
-    for i in range(2, len(df_final) + 2):  # Excel row numbers
-        curr_value = ws.cell(i, duty_col_idx).value
-        if curr_value != prev_value:
-            if i - merge_start > 1:
-                ws.merge_cells(start_row=merge_start, start_column=duty_col_idx,
-                               end_row=i - 1, end_column=duty_col_idx)
-            merge_start = i
-        prev_value = curr_value
+    with DistanceStore() as store:
+        sch_kms_dict = collect_sch_kms(unique_od_pairs(all_tuples), store, infer=True)
+    output_file = write_final_schedule(file_path, all_tuples, sch_kms_dict)
+    print(f"\nExcel file saved at: {output_file}")
 
-    # Check and merge the last group if needed
-    if len(df_final) + 2 - merge_start > 1:
-        ws.merge_cells(start_row=merge_start, start_column=duty_col_idx,
-                       end_row=len(df_final) + 1, end_column=duty_col_idx)
 
-print(f"\nExcel file saved at: {output_file}")
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,113 @@
+"""Per-stage timing, memory and data-quality counts for one run.
+
+    report = RunReport("depot_7.xlsx", trace_memory=True, profile_dir="profiles")
+    with report.stage("extract_tables"):
+        ...
+    report.counts["trips"] += len(all_tuples)
+    report.write_json("depot_7.report.json")
+
+Counts are plain collections.Counter entries, so lower-level functions take a
+`counts` Counter and worker processes can send theirs back to be merged.
+Process peak RSS is read after every stage (not available on Windows); exact
+per-stage peaks need trace_memory, which slows the run down.
+"""
+import cProfile
+import json
+import os
+import re
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def _max_rss_mib():
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return round(rss / (2**20 if os.uname().sysname == "Darwin" else 2**10), 1)
+
+
+class RunReport:
+    def __init__(self, label="", trace_memory=False, profile_dir=None):
+        self.label = label
+        self.trace_memory = trace_memory
+        self.profile_dir = profile_dir
+        self.started = datetime.now().isoformat(timespec="seconds")
+        self.stages = []
+        self.counts = Counter()
+        self.sheets = {}
+        self.error = None
+
+    @contextmanager
+    def stage(self, name):
+        """Time the enclosed block; optionally trace its peak memory and dump a cProfile file."""
+        started_tracing = self.trace_memory and not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+        elif self.trace_memory:
+            tracemalloc.reset_peak()
+        profiler = cProfile.Profile() if self.profile_dir else None
+
+        start = time.perf_counter()
+        if profiler:
+            profiler.enable()
+        try:
+            yield self
+        finally:
+            if profiler:
+                profiler.disable()
+            entry = {"stage": name, "seconds": round(time.perf_counter() - start, 4),
+                     "max_rss_mib": _max_rss_mib()}
+            if self.trace_memory:
+                entry["peak_traced_mib"] = round(tracemalloc.get_traced_memory()[1] / 2**20, 2)
+                if started_tracing:
+                    tracemalloc.stop()
+            if profiler:
+                entry["profile"] = self._dump_profile(profiler, name)
+            self.stages.append(entry)
+
+    def _dump_profile(self, profiler, name):
+        os.makedirs(self.profile_dir, exist_ok=True)
+        base = re.sub(r"[^\w.-]+", "_", os.path.basename(self.label) or "run")
+        path = os.path.join(self.profile_dir, f"{base}.{name}.prof")
+        profiler.dump_stats(path)
+        return path
+
+    def add_sheet(self, sheetname, tables):
+        self.sheets[sheetname] = tables
+
+    def merge(self, counts):
+        self.counts.update(counts)
+
+    def to_dict(self):
+        return {
+            "label": self.label,
+            "started": self.started,
+            "total_seconds": round(sum(s["seconds"] for s in self.stages), 4),
+            "stages": self.stages,
+            "counts": dict(sorted(self.counts.items())),
+            "tables_per_sheet": self.sheets,
+            "error": self.error,
+        }
+
+    def write_json(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, indent=2)
+        return path
+
+# -------------------- Optional Report Helpers --------------------
+
+def stage(report, name):
+    """report.stage(name), or a no-op when there is no report."""
+    return report.stage(name) if report is not None else nullcontext()
+
+def counts_of(report):
+    return report.counts if report is not None else None
@@ -0,0 +1,198 @@
+"""In-memory API over both stages.
+
+    extract_trips  → attach_kms → [assign_buses → build_duties] → build_flat_schedule → render_duty_grid
+
+run_pipeline() chains them for one workbook without writing the flat
+schedule to Excel and parsing it back; only the outputs listed in `write`
+are saved; a typed trip file (Parquet, Feather or CSV) can be written
+too, and load_trips() reads one back. With a min_layover, buses are
+assigned by the vehicle block optimizer instead of being derived from the
+duty number; with crew_rules,
+the duties themselves are rebuilt from those buses (see crew_duties.py).
+
+    from pipeline import run_pipeline
+    result = run_pipeline("depot_7.xlsx", sch_kms=DistanceStore("kms.db"), write=["duty_grid"])
+"""
+import os
+from dataclasses import dataclass, field
+
+import analytics
+import crew_duties
+import final_schedule_maker
+import time_table
+import trip_files
+import validation
+import vehicle_blocks
+from distance_store import DistanceStore
+from instrumentation import counts_of, stage
+
+OUTPUTS = ("final_schedule", "duty_grid")
+OPTIONAL_OUTPUTS = ("vehicle_blocks", "analytics")   # only written when asked for
+
+
+@dataclass
+class PipelineResult:
+    file_path: str
+    trips: list
+    final_schedule: object = None   # flat schedule DataFrame (stage 1)
+    duty_grid: object = None        # {sheet title: duty grid DataFrame} per depot and route (stage 2)
+    vehicle_blocks: object = None   # VehicleBlocks, when buses were optimized
+    crew_duties: object = None      # CrewDuties, when duties were rebuilt
+    violations: object = None       # validation report DataFrame
+    outputs: dict = field(default_factory=dict)  # output name -> path written
+
+# -------------------- Stages --------------------
+
+def extract_trips(file_path, streaming=False, sheet_workers=None, cache=None, progress=False, report=None):
+    """Steps 1-2 of stage 1: duty tables → trip tuples (unchanged sheets come from `cache`)."""
+    return final_schedule_maker.extract_trip_tuples(file_path, progress=progress, streaming=streaming,
+                                                    sheet_workers=sheet_workers, cache=cache, report=report)
+
+def attach_kms(all_tuples, sch_kms=None, interactive=False, infer=False, counts=None):
+    """
+    Step 3: Sch kms per OD pair.
+
+    `sch_kms` is a DistanceStore (unknown pairs are inferred from stored
+    segments with `infer`, and otherwise raise MissingDistancesError unless
+    interactive), a ready {(origin, dest): kms} mapping, or None to leave
+    Sch kms empty.
+    """
+    if sch_kms is None:
+        return {}
+    if isinstance(sch_kms, DistanceStore):
+        return final_schedule_maker.collect_sch_kms(final_schedule_maker.unique_od_pairs(all_tuples), sch_kms,
+                                                    interactive=interactive, infer=infer, counts=counts)
+    return dict(sch_kms)
+
+def assign_buses(all_tuples, min_layover=vehicle_blocks.DEFAULT_MIN_LAYOVER, max_wait=vehicle_blocks.DEFAULT_MAX_WAIT,
+                 counts=None):
+    """Chain trips into vehicle blocks with the fewest buses; block stats are added to `counts`."""
+    blocks = vehicle_blocks.assign_vehicle_blocks(all_tuples, min_layover=min_layover, max_wait=max_wait)
+    if counts is not None:
+        counts.update({f"vehicle_{key}": value for key, value in blocks.stats.items()})
+    return blocks
+
+def load_trips(file_path, counts=None):
+    """Trip tuples from a `_final_schedule` workbook or trip file, e.g. to resume at render_duty_grid."""
+    return time_table.load_trip_tuples(file_path, counts)
+
+def build_duties(all_tuples, blocks, rules=None, counts=None):
+    """
+    Crew duties from vehicle blocks; returns (duties, tuples, bus_ids) with the
+    trips renamed and regrouped by crew duty, and their buses in that order.
+    """
+    duties = crew_duties.build_crew_duties(all_tuples, blocks, rules)
+    if counts is not None:
+        counts.update({f"crew_{key}": value for key, value in duties.stats.items() if key != "max_spread_minutes"})
+        counts["crew_max_spread_minutes"] = max(counts["crew_max_spread_minutes"], duties.stats["max_spread_minutes"])
+    tuples, order = crew_duties.crew_duty_tuples(all_tuples, duties)
+    return duties, tuples, [blocks.bus_ids[i] for i in order]
+
+def build_flat_schedule(all_tuples, sch_kms_dict, progress=False, counts=None, bus_ids=None):
+    """Step 4 of stage 1: the flat `_final_schedule` frame."""
+    return final_schedule_maker.build_final_schedule(all_tuples, sch_kms_dict, progress=progress, counts=counts,
+                                                     bus_ids=bus_ids)
+
+def render_duty_grid(df_final, counts=None, workers=None):
+    """Stage 2 straight from the flat schedule frame; returns {sheet title: (grid, first_row, second_row)}."""
+    return time_table.build_duty_schedules(time_table.trip_tuples_from_frame(df_final, counts), counts, workers)
+
+# -------------------- Output Paths --------------------
+
+def output_paths(file_path, output_dir=None, trip_format=None):
+    """Same names the two scripts produce when run one after the other."""
+    final_path = final_schedule_maker.final_schedule_path(file_path)
+    paths = {"final_schedule": final_path, "duty_grid": time_table.duty_schedule_path(final_path),
+             "vehicle_blocks": vehicle_blocks.vehicle_blocks_path(file_path),
+             "violations": validation.violations_path(file_path),
+             "analytics": analytics.analytics_path(file_path)}
+    if trip_format:
+        paths["trip_file"] = trip_files.trip_file_path(file_path, trip_format)
+    if output_dir:
+        paths = {name: os.path.join(output_dir, os.path.basename(path)) for name, path in paths.items()}
+    return paths
+
+# -------------------- Whole Pipeline --------------------
+
+def finish_pipeline(file_path, all_tuples, sch_kms_dict, write=OUTPUTS, output_dir=None, render_grid=True,
+                    progress=False, report=None, min_layover=None, max_wait=vehicle_blocks.DEFAULT_MAX_WAIT,
+                    crew_rules=None, render_workers=None, trip_format=None):
+    """
+    Steps 4 onward for extracted trips. The duty grid is rendered when asked
+    for (render_grid) or written, one grid per depot and route on
+    `render_workers` processes; only the `write` outputs are saved, plus a
+    typed trip file when `trip_format` is given. With a
+    `min_layover` (or when "vehicle_blocks" is written), Bus Id comes from
+    the vehicle block optimizer; with `crew_rules` (a CrewRules), the duties
+    are rebuilt from those buses as well. The trips are validated before the
+    schedule is built, and any violations are saved. Stage times and counts
+    go to `report` (a RunReport).
+    """
+    unknown = set(write) - set(OUTPUTS + OPTIONAL_OUTPUTS)
+    if unknown:
+        raise ValueError(f"Unknown outputs: {sorted(unknown)} (expected some of {list(OUTPUTS + OPTIONAL_OUTPUTS)})")
+
+    result = PipelineResult(file_path, all_tuples)
+    bus_ids = None
+    if min_layover is not None or crew_rules is not None or "vehicle_blocks" in write:
+        if min_layover is None:
+            min_layover = vehicle_blocks.DEFAULT_MIN_LAYOVER
+        with stage(report, "vehicle_blocks"):
+            result.vehicle_blocks = assign_buses(all_tuples, min_layover, max_wait, counts_of(report))
+        bus_ids = result.vehicle_blocks.bus_ids
+    schedule_tuples = all_tuples
+    if crew_rules is not None:
+        with stage(report, "crew_duties"):
+            result.crew_duties, schedule_tuples, bus_ids = build_duties(all_tuples, result.vehicle_blocks, crew_rules,
+                                                                       counts_of(report))
+        result.trips = schedule_tuples
+    paths = output_paths(file_path, output_dir, trip_format)
+    max_spread = crew_rules.max_spread if crew_rules is not None else validation.DEFAULT_MAX_SPREAD
+    with stage(report, "validate"):
+        result.violations, saved = validation.report_violations(schedule_tuples, paths["violations"],
+                                                                counts_of(report), max_spread=max_spread)
+    if saved:
+        result.outputs["violations"] = saved
+    with stage(report, "build_schedule"):
+        result.final_schedule = build_flat_schedule(schedule_tuples, sch_kms_dict, progress=progress,
+                                                    counts=counts_of(report), bus_ids=bus_ids)
+    if render_grid or "duty_grid" in write:
+        with stage(report, "render"):
+            grids = render_duty_grid(result.final_schedule, counts_of(report), render_workers)
+        result.duty_grid = {title: df_grid for title, (df_grid, _, _) in grids.items()}
+
+    if "final_schedule" in write:
+        with stage(report, "write_final_schedule"):
+            result.outputs["final_schedule"] = final_schedule_maker.save_final_schedule(result.final_schedule,
+                                                                                        paths["final_schedule"])
+    if trip_format:
+        with stage(report, "write_trip_file"):
+            result.outputs["trip_file"] = trip_files.save_trip_file(result.final_schedule, paths["trip_file"])
+    if "duty_grid" in write:
+        with stage(report, "write_duty_grid"):
+            result.outputs["duty_grid"] = time_table.save_duty_schedules(grids, paths["duty_grid"])
+    if "analytics" in write:
+        with stage(report, "analytics"):
+            tables = analytics.schedule_analytics(schedule_tuples, sch_kms_dict, bus_ids)
+        with stage(report, "write_analytics"):
+            result.outputs["analytics"] = analytics.save_analytics(tables, paths["analytics"])
+    if "vehicle_blocks" in write:
+        with stage(report, "write_vehicle_blocks"):
+            df_blocks = vehicle_blocks.vehicle_blocks_frame(all_tuples, result.vehicle_blocks)
+            result.outputs["vehicle_blocks"] = vehicle_blocks.save_vehicle_blocks(df_blocks, paths["vehicle_blocks"])
+    return result
+
+def run_pipeline(file_path, sch_kms=None, write=OUTPUTS, output_dir=None, interactive=False,
+                 streaming=False, sheet_workers=None, cache=None, render_grid=True, progress=False,
+                 report=None, min_layover=None, max_wait=vehicle_blocks.DEFAULT_MAX_WAIT, crew_rules=None,
+                 render_workers=None, trip_format=None, infer_kms=False):
+    """Run both stages on one workbook in memory; write=() returns the frames without saving anything."""
+    all_tuples = extract_trips(file_path, streaming=streaming, sheet_workers=sheet_workers, cache=cache,
+                               progress=progress, report=report)
+    with stage(report, "sch_kms"):
+        sch_kms_dict = attach_kms(all_tuples, sch_kms, interactive=interactive, infer=infer_kms,
+                                  counts=counts_of(report))
+    return finish_pipeline(file_path, all_tuples, sch_kms_dict, write=write, output_dir=output_dir,
+                           render_grid=render_grid, progress=progress, report=report,
+                           min_layover=min_layover, max_wait=max_wait, crew_rules=crew_rules,
+                           render_workers=render_workers, trip_format=trip_format)
@@ -0,0 +1,165 @@
+"""Differences between two revisions of a timetable workbook.
+
+    python schedule_diff.py revision_7/542.xlsx revision_8/542.xlsx --cache
+    python schedule_diff.py old.xlsx new.xlsx --check        # exit status 1 when anything changed
+
+Both workbooks go through Steps 1-2 (with --cache, sheets that did not change
+since an earlier run are not extracted again). Trips are keyed by (depot,
+route, duty, trip no) and matched with one outer hash join:
+
+    added / removed     the key is only in the new / old revision
+    retimed             start or end time changed
+    changed_stops       same times, different origin or destination
+
+Per duty, trips, run time and duty hours (first departure to last arrival)
+are compared before and after. Only the duties that changed are rendered
+again as a duty grid. The outputs are <new>_diff.xlsx (Trips and Duties
+sheets) and <new>_changed_schedule.xlsx.
+"""
+import argparse
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+import excel_writer
+import pipeline
+import time_table
+from extract_cache import DEFAULT_CACHE_DIR, ExtractCache
+from trip_table import MINUTES_PER_DAY, TripTable, format_duration
+
+KEY_COLS = ["Depot", "Route Number", "Duty", "Trip No"]
+
+# -------------------- Frames --------------------
+
+def trip_frame(all_tuples):
+    """Key and trip columns; times as service-day minutes (trips past midnight on the next day)."""
+    trips = TripTable.from_tuples(all_tuples)
+    valid = trips.valid
+    return pd.DataFrame({
+        "Depot": trips.depot, "Route Number": trips.route, "Duty": trips.duty, "Trip No": trips.trip_no,
+        "Origin": trips.origin, "Destination": trips.dest,
+        "Start Time": pd.array(np.where(valid, trips.dep, None), dtype="Int32"),
+        "End Time": pd.array(np.where(valid, trips.arr, None), dtype="Int32"),
+        "Run Time": pd.array(np.where(valid, trips.arr - trips.dep, None), dtype="Int32"),
+    })
+
+def duty_frame(trips):
+    """Trips, run time and duty hours (first departure to last arrival, in trip order) per duty, in minutes."""
+    grouped = trips.sort_values("Trip No", kind="stable").groupby(KEY_COLS[:3], sort=False)
+    duties = grouped.agg(**{"Trips": ("Trip No", "size"), "Run Time": ("Run Time", "sum"),
+                            "First Departure": ("Start Time", "first"), "Last Arrival": ("End Time", "last")})
+    duties["Duty Hours"] = duties["Last Arrival"] - duties["First Departure"]
+    return duties.drop(columns=["First Departure", "Last Arrival"])
+
+# -------------------- Diff --------------------
+
+def diff_trips(old_tuples, new_tuples):
+    """(trip changes, duty changes) DataFrames for two lists of trip tuples."""
+    old, new = trip_frame(old_tuples), trip_frame(new_tuples)
+    # Repeated keys (a duty read twice) are told apart by their order
+    for frame in (old, new):
+        frame["Seq"] = frame.groupby(KEY_COLS, sort=False).cumcount()
+    joined = old.merge(new, on=KEY_COLS + ["Seq"], how="outer", suffixes=(" (old)", " (new)"), indicator=True)
+
+    def changed(col):
+        before, after = joined[f"{col} (old)"], joined[f"{col} (new)"]
+        return ~((before == after).fillna(False) | (before.isna() & after.isna()))
+
+    both = joined["_merge"] == "both"
+    retimed = both & (changed("Start Time") | changed("End Time"))
+    moved = both & ~retimed & (changed("Origin") | changed("Destination"))
+    change = np.select([joined["_merge"] == "left_only", joined["_merge"] == "right_only", retimed, moved],
+                       ["removed", "added", "retimed", "changed_stops"], default="")
+    joined.insert(0, "Change", change)
+    trips = joined[joined["Change"] != ""].drop(columns=["_merge", "Seq"])
+    # Both sheets give times, durations and deltas as HH:MM, like the rest of the workbook
+    delta = trips["Run Time (new)"].fillna(0) - trips["Run Time (old)"].fillna(0)
+    trips["Run Time Delta"] = [_signed(m) for m in delta.tolist()]
+    for side in ("old", "new"):
+        for col in ("Start Time", "End Time"):
+            trips[f"{col} ({side})"] = [_clock(m) for m in trips[f"{col} ({side})"].tolist()]
+        trips[f"Run Time ({side})"] = [_hours(m) for m in trips[f"Run Time ({side})"].tolist()]
+
+    duties = duty_frame(old).join(duty_frame(new), how="outer", lsuffix=" (old)", rsuffix=" (new)")
+    touched = pd.MultiIndex.from_frame(trips[KEY_COLS[:3]]).unique()
+    duties = duties[duties.index.isin(touched)].reset_index()
+    duties.insert(0, "Change", np.select([duties["Trips (old)"].isna(), duties["Trips (new)"].isna()],
+                                         ["added", "removed"], default="changed"))
+    for col in ("Run Time", "Duty Hours"):
+        delta = duties[f"{col} (new)"].fillna(0) - duties[f"{col} (old)"].fillna(0)
+        duties[f"{col} Delta"] = [_signed(m) for m in delta.tolist()]
+        for side in ("old", "new"):
+            duties[f"{col} ({side})"] = [_hours(m) for m in duties[f"{col} ({side})"].tolist()]
+    return trips.reset_index(drop=True), duties
+
+def _clock(minutes):
+    return "" if pd.isna(minutes) else format_duration(int(minutes) % MINUTES_PER_DAY)
+
+def _hours(minutes):
+    return "" if pd.isna(minutes) else format_duration(int(minutes))
+
+def _signed(minutes):
+    minutes = int(minutes)
+    return ("-" if minutes < 0 else "+") + format_duration(abs(minutes))
+
+def changed_duty_tuples(new_tuples, duties):
+    """New-revision trips of the duties that changed (removed duties have none)."""
+    keys = set(zip(duties["Depot"], duties["Route Number"], duties["Duty"]))
+    return [t for t in new_tuples if (t[5], t[7], t[6]) in keys]
+
+# -------------------- Whole Diff --------------------
+
+def diff_path(file_path):
+    return os.path.splitext(file_path)[0] + "_diff.xlsx"
+
+def changed_schedule_path(file_path):
+    return os.path.splitext(file_path)[0] + "_changed_schedule.xlsx"
+
+def diff_workbooks(old_path, new_path, output_dir=None, cache=None, sheet_workers=None, render=True):
+    """Extract both workbooks, diff them and save the outputs; returns (trips, duties, paths)."""
+    old_tuples = pipeline.extract_trips(old_path, cache=cache, sheet_workers=sheet_workers)
+    new_tuples = pipeline.extract_trips(new_path, cache=cache, sheet_workers=sheet_workers)
+    trips, duties = diff_trips(old_tuples, new_tuples)
+
+    base = os.path.join(output_dir, os.path.basename(new_path)) if output_dir else new_path
+    paths = {"diff": excel_writer.write_tables({"Trips": trips, "Duties": duties}, diff_path(base))}
+    changed = changed_duty_tuples(new_tuples, duties)
+    if render and changed:
+        grids = time_table.build_duty_schedules(changed)
+        paths["changed_schedule"] = time_table.save_duty_schedules(grids, changed_schedule_path(base))
+    return trips, duties, paths
+
+# -------------------- Entry Point --------------------
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare two revisions of a timetable workbook.")
+    parser.add_argument("old", help="earlier revision")
+    parser.add_argument("new", help="later revision")
+    parser.add_argument("--output-dir", default=None, help="save outputs here instead of next to the new workbook")
+    parser.add_argument("--cache", action="store_true", help="reuse per-sheet extraction results for unchanged sheets")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR,
+                        help=f"extraction cache directory (default: {DEFAULT_CACHE_DIR})")
+    parser.add_argument("--sheet-workers", type=int, default=None,
+                        help="shard the sheets of each workbook across this many processes")
+    parser.add_argument("--no-render", action="store_true", help="do not render grids for the changed duties")
+    parser.add_argument("--check", action="store_true", help="exit with status 1 when anything changed")
+    args = parser.parse_args(argv)
+
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+    cache = ExtractCache(args.cache_dir) if args.cache else None
+    trips, duties, paths = diff_workbooks(args.old, args.new, output_dir=args.output_dir, cache=cache,
+                                          sheet_workers=args.sheet_workers, render=not args.no_render)
+
+    counts = trips["Change"].value_counts()
+    print(f"\n {len(duties)} duty(ies) changed: " +
+          ", ".join(f"{counts.get(kind, 0)} {kind}" for kind in ("added", "removed", "retimed", "changed_stops")))
+    for path in paths.values():
+        print(f"  -> {path}")
+    return 1 if args.check and len(trips) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
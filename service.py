@@ -0,0 +1,281 @@
+"""Local HTTP job service around both pipeline stages.
+
+    python service.py --port 8080 --workers 4 --kms-db depot_kms.db --jobs-dir jobs/
+
+    POST /jobs?name=depot_7.xlsx     workbook bytes as the request body → {"id", "status", "cached"}
+    GET  /jobs                       every job's status
+    GET  /jobs/<id>                  status, queue/run times and the per-stage run report
+    GET  /jobs/<id>/<output>         final_schedule, duty_grid or violations (.xlsx)
+    GET  /                           upload page for a browser
+
+A job id is the SHA-256 of the uploaded workbook, so an identical upload
+returns the job (and files) already there, also across restarts. Jobs run
+on a bounded process pool, one workbook per process; uploads beyond
+--max-queue waiting jobs are refused with 503. Sch kms come from the
+distance store only, with unknown pairs inferred from stored segments: a
+workbook with OD pairs that have no path fails with those pairs listed and
+can be resubmitted once they are added.
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pipeline
+from distance_store import DEFAULT_DB, DistanceStore
+from instrumentation import RunReport
+
+DEFAULT_JOBS_DIR = "jobs"
+MAX_UPLOAD_BYTES = 64 * 2**20
+RESULT_FILE = "result.json"
+
+# -------------------- Worker --------------------
+
+def run_job(upload_path, job_dir, kms_db):
+    """Both stages for one uploaded workbook (in a worker process); returns the job result dict."""
+    report = RunReport(os.path.basename(upload_path))
+    try:
+        with DistanceStore(kms_db) as store:
+            result = pipeline.run_pipeline(upload_path, sch_kms=store, output_dir=job_dir, report=report,
+                                           render_grid=False, infer_kms=True)
+        outputs = {name: os.path.basename(path) for name, path in result.outputs.items()}
+        return {"status": "done", "outputs": outputs, "report": report.to_dict()}
+    except Exception as e:
+        report.error = f"{type(e).__name__}: {e}"
+        return {"status": "failed", "error": report.error, "report": report.to_dict()}
+
+# -------------------- Jobs --------------------
+
+class JobQueue:
+    """Content-addressed jobs on a bounded process pool; finished results are kept in jobs_dir/<id>/."""
+
+    def __init__(self, jobs_dir=DEFAULT_JOBS_DIR, workers=None, max_queue=32, kms_db=DEFAULT_DB):
+        self.jobs_dir = jobs_dir
+        self.kms_db = kms_db
+        self.max_queue = max_queue
+        self.pool = ProcessPoolExecutor(max_workers=workers or os.cpu_count() or 1)
+        self.jobs = {}
+        self.lock = threading.Lock()
+        os.makedirs(jobs_dir, exist_ok=True)
+
+    def _load(self, job_id):
+        path = os.path.join(self.jobs_dir, job_id, RESULT_FILE)
+        if not os.path.exists(path):
+            return None
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+
+    def submit(self, name, data):
+        """Queue a workbook; returns (job, cached). Raises OverflowError when the queue is full."""
+        job_id = hashlib.sha256(data).hexdigest()
+        with self.lock:
+            job = self.jobs.get(job_id) or self._load(job_id)
+            if job is not None and job["status"] != "failed":
+                self.jobs[job_id] = job
+                return job, True
+            waiting = sum(j["status"] in ("queued", "running") for j in self.jobs.values())
+            if waiting >= self.max_queue:
+                raise OverflowError(f"{waiting} jobs waiting; try again later")
+
+            job_dir = os.path.join(self.jobs_dir, job_id)
+            os.makedirs(job_dir, exist_ok=True)
+            upload_path = os.path.join(job_dir, safe_name(name))
+            with open(upload_path, "wb") as f:
+                f.write(data)
+            job = {"id": job_id, "name": os.path.basename(upload_path), "status": "queued",
+                   "submitted": time.time(), "started": None, "finished": None}
+            self.jobs[job_id] = job
+
+        future = self.pool.submit(run_job, upload_path, job_dir, self.kms_db)
+        # A process pool cannot tell when a job leaves the queue; a running future is close enough
+        threading.Thread(target=self._watch, args=(job, future), daemon=True).start()
+        return job, False
+
+    def _watch(self, job, future):
+        # Handlers read jobs under the lock, so every write here takes it too
+        while not future.done():
+            if job["started"] is None and future.running():
+                with self.lock:
+                    job["started"] = time.time()
+                    job["status"] = "running"
+            time.sleep(0.05)
+        outcome = future.result() if future.exception() is None else {
+            "status": "failed", "error": f"{type(future.exception()).__name__}: {future.exception()}"}
+        with self.lock:
+            job.update(outcome)
+            job["finished"] = time.time()
+            job["started"] = job["started"] or job["finished"]
+            with open(os.path.join(self.jobs_dir, job["id"], RESULT_FILE), "w", encoding="utf-8") as f:
+                json.dump(job, f, indent=2)
+
+    def get(self, job_id):
+        with self.lock:
+            job = self.jobs.get(job_id) or self._load(job_id)
+            if job is not None:
+                self.jobs[job_id] = job
+            return job
+
+    def status(self, job):
+        """Job as served: queue and run seconds added to the stored fields."""
+        with self.lock:
+            job = dict(job)
+        now = time.time()
+        started, finished = job.get("started"), job.get("finished")
+        timings = {"queued_seconds": round((started or now) - job["submitted"], 3),
+                   "run_seconds": round((finished or now) - started, 3) if started else None}
+        return {**job, **timings}
+
+    def output_path(self, job, output):
+        with self.lock:
+            name = (job.get("outputs") or {}).get(output)
+        return os.path.join(self.jobs_dir, job["id"], name) if name else None
+
+    def shutdown(self):
+        self.pool.shutdown(cancel_futures=True)
+
+
+def safe_name(name):
+    name = re.sub(r"[^\w.-]+", "_", os.path.basename(name or "")) or "upload.xlsx"
+    return name if name.lower().endswith((".xlsx", ".xls")) else name + ".xlsx"
+
+# -------------------- HTTP --------------------
+
+UPLOAD_PAGE = b"""<!doctype html>
+<title>Transit Schedule Automation</title>
+<h3>Upload a timetable workbook</h3>
+<input type="file" id="file" accept=".xlsx,.xls"> <button onclick="send()">Submit</button>
+<pre id="out"></pre>
+<script>
+async function send() {
+  const file = document.getElementById("file").files[0];
+  if (!file) return;
+  let job = await (await fetch("/jobs?name=" + encodeURIComponent(file.name), {method: "POST", body: file})).json();
+  const out = document.getElementById("out");
+  while (job.status === "queued" || job.status === "running") {
+    out.textContent = job.status + "...";
+    await new Promise(r => setTimeout(r, 1000));
+    job = await (await fetch("/jobs/" + job.id)).json();
+  }
+  // Error text and file names come from the upload: set them as text, never as HTML
+  out.textContent = job.status === "done" ? "" : job.error;
+  for (const o of Object.keys(job.outputs || {})) {
+    const link = document.createElement("a");
+    link.href = "/jobs/" + job.id + "/" + encodeURIComponent(o);
+    link.textContent = job.outputs[o];
+    out.append(link, document.createElement("br"));
+  }
+}
+</script>
+"""
+
+
+class JobHandler(BaseHTTPRequestHandler):
+    queue = None  # set by make_server
+
+    def _json(self, payload, status=HTTPStatus.OK):
+        body = json.dumps(payload, indent=2).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _error(self, status, message):
+        self._json({"error": message}, status)
+
+    def do_GET(self):
+        parts = [p for p in urlparse(self.path).path.split("/") if p]
+        if not parts:
+            self.send_response(HTTPStatus.OK)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(UPLOAD_PAGE)))
+            self.end_headers()
+            self.wfile.write(UPLOAD_PAGE)
+        elif parts == ["jobs"]:
+            with self.queue.lock:
+                jobs = list(self.queue.jobs.values())
+            self._json([self.queue.status(job) for job in jobs])
+        elif parts[0] == "jobs" and len(parts) in (2, 3):
+            job = self.queue.get(parts[1]) if re.fullmatch(r"[0-9a-f]{64}", parts[1]) else None
+            if job is None:
+                return self._error(HTTPStatus.NOT_FOUND, "no such job")
+            if len(parts) == 2:
+                return self._json(self.queue.status(job))
+            path = self.queue.output_path(job, parts[2])
+            if path is None or not os.path.exists(path):
+                return self._error(HTTPStatus.NOT_FOUND, f"no {parts[2]} output for this job")
+            self._send_file(path)
+        else:
+            self._error(HTTPStatus.NOT_FOUND, "not found")
+
+    def _send_file(self, path):
+        self.send_response(HTTPStatus.OK)
+        self.send_header("Content-Type", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+        self.send_header("Content-Disposition", f'attachment; filename="{os.path.basename(path)}"')
+        self.send_header("Content-Length", str(os.path.getsize(path)))
+        self.end_headers()
+        with open(path, "rb") as f:
+            while chunk := f.read(2**16):
+                self.wfile.write(chunk)
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path.rstrip("/") != "/jobs":
+            return self._error(HTTPStatus.NOT_FOUND, "not found")
+        length = int(self.headers.get("Content-Length") or 0)
+        if not length:
+            return self._error(HTTPStatus.BAD_REQUEST, "empty upload")
+        if length > MAX_UPLOAD_BYTES:
+            return self._error(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, f"uploads are limited to {MAX_UPLOAD_BYTES} bytes")
+        data = self.rfile.read(length)
+        name = parse_qs(url.query).get("name", [""])[0]
+        try:
+            job, cached = self.queue.submit(name, data)
+        except OverflowError as e:
+            return self._error(HTTPStatus.SERVICE_UNAVAILABLE, str(e))
+        self._json({**self.queue.status(job), "cached": cached},
+                   HTTPStatus.OK if cached else HTTPStatus.ACCEPTED)
+
+
+def make_server(queue, host="127.0.0.1", port=8080):
+    handler = type("BoundJobHandler", (JobHandler,), {"queue": queue})
+    return ThreadingHTTPServer((host, port), handler)
+
+# -------------------- Entry Point --------------------
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve both pipeline stages over HTTP.")
+    parser.add_argument("--host", default="127.0.0.1", help="address to listen on (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8080, help="port to listen on (default: 8080)")
+    parser.add_argument("-j", "--workers", type=int, default=os.cpu_count() or 1,
+                        help="worker processes running jobs (default: CPU count)")
+    parser.add_argument("--max-queue", type=int, default=32,
+                        help="refuse uploads while this many jobs are waiting or running (default: 32)")
+    parser.add_argument("--kms-db", default=DEFAULT_DB, help=f"Sch kms distance store (default: {DEFAULT_DB})")
+    parser.add_argument("--jobs-dir", default=DEFAULT_JOBS_DIR,
+                        help=f"uploads and results, one directory per job (default: {DEFAULT_JOBS_DIR})")
+    args = parser.parse_args(argv)
+
+    queue = JobQueue(args.jobs_dir, workers=args.workers, max_queue=args.max_queue, kms_db=args.kms_db)
+    server = make_server(queue, args.host, args.port)
+    print(f"\n Serving on http://{args.host}:{args.port} with {args.workers} worker(s)...")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        queue.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,64 @@
+from analytics import schedule_analytics
+
+
+def _trip(origin, dest, dep, arr, trip_no, duty, route="100C", depot="DEPOT 1"):
+    return (origin, dest, dep, arr, trip_no, depot, duty, route)
+
+TRIPS = [
+    _trip("A", "B", "06:00", "06:40", 1, "1"),
+    _trip("B", "A", "06:50", "07:30", 2, "1"),
+    _trip("A", "B", "06:10", "06:50", 1, "2"),
+    _trip("A", "B", "19:00", "19:40", 1, "1A"),
+    _trip("B", "A", "23:40", "00:20", 2, "1A"),
+    _trip("A", "B", "00:30", "01:10", 3, "1A"),
+]
+
+def test_bus_past_midnight_is_not_in_service_all_day():
+    tables = schedule_analytics(TRIPS)
+    fleet = tables["Fleet"].iloc[0]
+    assert fleet["Buses"] == 2
+    assert fleet["Peak In Service"] == 2
+    # Bus 1 works 06:00 to 01:10 the next night, bus 2 06:10 to 06:50
+    assert fleet["Bus Hours"] == "19:50"
+
+    per_hour = dict(zip(tables["Vehicles per Hour"]["Hour"], tables["Vehicles per Hour"]["DEPOT 1"]))
+    assert list(per_hour)[0] == "06:00"
+    assert per_hour["06:00"] == 2
+    assert per_hour["07:00"] == 1
+    assert per_hour["12:00"] == 0   # bus 1 is back between its duties
+    assert per_hour["00:00 (+1)"] == 1
+    assert list(per_hour)[-1] == "01:00 (+1)"
+
+def test_layovers_are_not_in_service():
+    tables = schedule_analytics([_trip("A", "B", "06:00", "06:30", 1, "1"), _trip("B", "A", "07:30", "08:00", 2, "1"),
+                                 _trip("A", "B", "06:40", "07:20", 1, "2")])
+    fleet = tables["Fleet"].iloc[0]
+    assert (fleet["Buses"], fleet["Peak In Service"]) == (2, 1)
+    assert fleet["Bus Hours"] == "02:40"
+    per_hour = tables["Vehicles per Hour"]
+    assert per_hour["DEPOT 1"].tolist() == [2, 2, 0]   # 06:00, 07:00 and 08:00, when the last trip ends
+
+def test_buses_from_blocks_are_per_depot():
+    tables = schedule_analytics(TRIPS[:3], bus_ids=["1", "1", "2"])
+    assert tables["Fleet"]["Buses"].tolist() == [2]
+    assert tables["Fleet"]["Peak At"].tolist() == ["06:10"]
+
+def test_headways():
+    headways = schedule_analytics(TRIPS)["Headways"]
+    row = headways[(headways["Stop"] == "A") & (headways["Towards"] == "B")].iloc[0]
+    assert row["Departures"] == 4
+    assert (row["First"], row["Last"]) == ("06:00", "00:30")
+    assert (row["Min Headway"], row["Max Headway"]) == (10, 770)
+
+def test_duty_kms():
+    table = schedule_analytics(TRIPS, {("A", "B"): 12.5})["Duty kms"]
+    row = table[table["Duty Name"] == "100C/1A"].iloc[0]
+    assert (row["Trips"], row["Sch kms"], row["Trips Without kms"]) == (3, 25.0, 1)
+    unknown = schedule_analytics(TRIPS, {("X", "Y"): 1.0})["Duty kms"]
+    assert unknown["Sch kms"].isna().all()
+    assert unknown.columns.tolist() == table.columns.tolist()
+
+def test_empty():
+    tables = schedule_analytics([])
+    assert tables["Fleet"].empty
+    assert tables["Vehicles per Hour"].empty
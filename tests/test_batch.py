@@ -0,0 +1,39 @@
+from zipfile import BadZipFile
+
+import pytest
+
+import batch
+from crew_duties import CrewRules
+
+
+def _trip(origin, dest, dep, arr, trip_no, duty="1"):
+    return (origin, dest, dep, arr, trip_no, "DEPOT 1", duty, "101K")
+
+def test_trips_left_out_of_crew_duties_fail_the_workbook(tmp_path):
+    tuples = [_trip("A", "B", "07:00", "07:30", 1), _trip("B", "A", "7 am", "08:10", 2)]
+    job = (str(tmp_path / "depot.xlsx"), tuples, {}, (), str(tmp_path), None,
+           {"min_layover": 5, "crew_rules": CrewRules()}, False)
+    _, outputs, error, _ = batch._finish(job)
+    assert outputs is None
+    assert error.startswith("1 trip(s) without valid times left out of the crew duties")
+
+
+def test_bad_workbook_fails_alone(tmp_path, capsys):
+    bad = tmp_path / "bad.xlsx"
+    bad.write_bytes(b"not a workbook")
+    assert batch.main(["schedule", str(bad), "-j", "1", "--skip-kms"]) == 1
+    assert "FAILED" in capsys.readouterr().out
+
+def test_strict_stops_at_a_bad_workbook(tmp_path):
+    bad = tmp_path / "bad.xlsx"
+    bad.write_bytes(b"not a workbook")
+    with pytest.raises(BadZipFile):
+        batch.main(["schedule", str(bad), "-j", "1", "--skip-kms", "--strict"])
+
+def test_bug_is_not_reported_as_a_failed_input(tmp_path, monkeypatch):
+    def broken(*args, **kwargs):
+        raise TypeError("bug")
+
+    monkeypatch.setattr(batch.final_schedule_maker, "extract_trip_tuples", broken)
+    with pytest.raises(TypeError):
+        batch._extract(str(tmp_path / "depot.xlsx"))
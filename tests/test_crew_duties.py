@@ -0,0 +1,58 @@
+from crew_duties import CrewRules, build_crew_duties, crew_duty_tuples
+from validation import validate_trips
+from vehicle_blocks import assign_vehicle_blocks
+
+
+def _trip(origin, dest, dep, arr, route, duty="1", depot="DEPOT 1"):
+    return (origin, dest, dep, arr, 1, depot, duty, route)
+
+def test_duty_stays_on_its_route_when_the_bus_interlines():
+    tuples = [
+        _trip("A", "B", "06:00", "06:30", "101K"),
+        _trip("B", "A", "06:40", "07:10", "101K"),
+        _trip("A", "C", "07:20", "07:50", "102M", duty="4"),
+        _trip("C", "A", "08:00", "08:30", "102M", duty="4"),
+    ]
+    blocks = assign_vehicle_blocks(tuples)
+    assert blocks.stats["buses"] == 1
+    duties = build_crew_duties(tuples, blocks)
+    assert duties.stats["duties"] == 2
+    schedule, order = crew_duty_tuples(tuples, duties)
+    assert [(t[7], t[6], t[4]) for t in schedule] == [("101K", "1", 1), ("101K", "1", 2),
+                                                      ("102M", "1", 1), ("102M", "1", 2)]
+    assert order == [0, 1, 2, 3]
+
+def test_pieces_chain_into_one_duty_within_spread():
+    tuples = [
+        _trip("A", "B", "06:00", "08:00", "101K"),
+        _trip("B", "A", "08:10", "10:00", "101K"),
+        _trip("A", "B", "10:40", "12:00", "101K"),
+    ]
+    blocks = assign_vehicle_blocks(tuples)
+    duties = build_crew_duties(tuples, blocks, CrewRules(max_continuous=240), relief={"DEPOT 1": {"A", "B"}})
+    assert duties.duty_names == ["1", "1", "1"]
+    assert duties.stats["duties_with_break"] == 1
+
+def test_spread_limit_starts_a_new_duty():
+    tuples = [
+        _trip("A", "B", "06:00", "08:00", "101K"),
+        _trip("B", "A", "08:10", "10:00", "101K"),
+        _trip("A", "B", "10:40", "12:00", "101K"),
+    ]
+    blocks = assign_vehicle_blocks(tuples)
+    duties = build_crew_duties(tuples, blocks, CrewRules(max_spread=300), relief={"DEPOT 1": {"A", "B"}})
+    assert duties.duty_names[0] != duties.duty_names[2]
+    assert duties.stats["max_spread_minutes"] <= 300
+
+def test_deadhead_link_ends_the_piece():
+    tuples = [
+        _trip("A", "B", "06:00", "06:30", "101K"),
+        _trip("C", "A", "07:40", "08:10", "101K"),   # the bus runs empty from B to C
+        _trip("A", "C", "08:20", "08:50", "101K"),
+    ]
+    blocks = assign_vehicle_blocks(tuples)
+    assert blocks.stats["buses"] == 1 and blocks.stats["deadhead_links"] == 1
+    duties = build_crew_duties(tuples, blocks)
+    assert duties.duty_names[0] != duties.duty_names[1] == duties.duty_names[2]
+    schedule, _ = crew_duty_tuples(tuples, duties)
+    assert validate_trips(schedule)["Check"].tolist() == []
@@ -0,0 +1,47 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from final_schedule_maker import iter_duty_blocks, segment_duty_blocks
+
+
+def _flags(n_rows, starts=(), ends=(), evening=()):
+    flags = [np.zeros(n_rows, dtype=bool) for _ in range(3)]
+    for flag, rows in zip(flags, (starts, ends, evening)):
+        flag[list(rows)] = True
+    return flags
+
+def test_blocks_end_at_terminator():
+    assert list(iter_duty_blocks(*_flags(8, starts=[1, 4], ends=[3, 6]))) == [(1, 3, False), (4, 6, False)]
+
+def test_block_without_terminator_runs_to_last_row():
+    assert list(iter_duty_blocks(*_flags(6, starts=[2]))) == [(2, 5, False)]
+
+def test_duty_start_inside_block_is_skipped():
+    assert list(iter_duty_blocks(*_flags(8, starts=[1, 2, 5], ends=[3]))) == [(1, 3, False), (5, 7, False)]
+
+def test_evening_marker_between_blocks():
+    blocks = list(iter_duty_blocks(*_flags(9, starts=[1, 5], ends=[3, 7], evening=[4])))
+    assert blocks == [(1, 3, False), (5, 7, True)]
+
+def test_evening_marker_inside_block_is_ignored():
+    blocks = list(iter_duty_blocks(*_flags(9, starts=[1, 5], ends=[3, 7], evening=[2])))
+    assert blocks == [(1, 3, False), (5, 7, False)]
+
+def test_evening_seen_stays_on():
+    blocks = list(iter_duty_blocks(*_flags(10, starts=[1, 3, 6], ends=[2, 4, 8], evening=[0])))
+    assert [seen for _, _, seen in blocks] == [True, True, True]
+
+@pytest.mark.parametrize("n_rows", [0, 1])
+def test_tiny_tables(n_rows):
+    assert list(iter_duty_blocks(*_flags(n_rows))) == []
+
+def test_segment_duty_blocks_on_frame():
+    table = pd.DataFrame([
+        ["12", None, None, None, "06:10"],
+        [None, None, None, None, "06:40"],
+        [None, "08:00", "07:45", "07:30", None],
+        ["Evening Duties", None, None, None, None],
+        ["13", None, None, None, "16:10"],
+    ], columns=[f"Col_{j + 1}" for j in range(5)])
+    assert list(segment_duty_blocks(table)) == [(0, 2, False), (4, 4, True)]
@@ -0,0 +1,21 @@
+import os
+
+from extract_cache import ExtractCache
+
+
+def test_round_trip(tmp_path):
+    cache = ExtractCache(str(tmp_path))
+    cache.put("k", [1, 2])
+    assert cache.get("k") == [1, 2]
+    assert cache.get("missing") is None
+
+def test_entry_evicted_after_load_is_a_miss(tmp_path, monkeypatch):
+    cache = ExtractCache(str(tmp_path))
+    cache.put("k", [1, 2])
+
+    def utime(path):
+        os.remove(path)  # another worker evicts between load and touch
+        raise FileNotFoundError(path)
+
+    monkeypatch.setattr(os, "utime", utime)
+    assert cache.get("k") is None
@@ -0,0 +1,46 @@
+from schedule_diff import changed_duty_tuples, diff_trips
+
+
+def _trip(origin, dest, dep, arr, trip_no, duty="20A", route="106K", depot="DEPOT 1"):
+    return (origin, dest, dep, arr, trip_no, depot, duty, route)
+
+OLD = [
+    _trip("A", "B", "18:30", "19:10", 1),
+    _trip("B", "A", "23:40", "00:10", 2),
+    _trip("A", "B", "00:20", "00:50", 3),
+    _trip("A", "B", "07:00", "07:40", 1, duty="3"),
+    _trip("B", "A", "07:50", "08:30", 2, duty="3"),
+]
+
+def test_unchanged():
+    trips, duties = diff_trips(OLD, OLD)
+    assert trips.empty and duties.empty
+
+def test_changes_are_classified():
+    new = [OLD[0], OLD[1], _trip("A", "B", "00:25", "00:55", 3),
+           OLD[3], _trip("B", "C", "07:50", "08:30", 2, duty="3"), _trip("C", "A", "08:40", "09:10", 3, duty="3")]
+    trips, _ = diff_trips(OLD, new)
+    assert sorted(zip(trips["Duty"], trips["Trip No"], trips["Change"])) == [
+        ("20A", 3, "retimed"), ("3", 2, "changed_stops"), ("3", 3, "added")]
+
+def test_duty_hours_past_midnight():
+    new = OLD[:2] + [_trip("A", "B", "00:25", "00:55", 3)] + OLD[3:]
+    trips, duties = diff_trips(OLD, new)
+    row = duties.set_index("Duty").loc["20A"]
+    assert row["Change"] == "changed"
+    assert (row["Duty Hours (old)"], row["Duty Hours (new)"]) == ("06:20", "06:25")
+    assert row["Duty Hours Delta"] == "+00:05"
+    assert row["Run Time Delta"] == "+00:00"
+    assert trips["Start Time (new)"].tolist() == ["00:25"]
+    assert (trips["Run Time (old)"].tolist(), trips["Run Time Delta"].tolist()) == (["00:30"], ["+00:00"])
+    # The unchanged day duty is gone with it
+    assert "3" not in duties["Duty"].tolist()
+    assert [t[4] for t in changed_duty_tuples(new, duties)] == [1, 2, 3]
+
+def test_removed_duty():
+    trips, duties = diff_trips(OLD, OLD[:3])
+    row = duties.set_index("Duty").loc["3"]
+    assert row["Change"] == "removed"
+    assert row["Duty Hours Delta"] == "-01:30"
+    assert trips["Run Time (new)"].tolist() == ["", ""]
+    assert trips["Run Time Delta"].tolist() == ["-00:40", "-00:40"]
@@ -0,0 +1,44 @@
+from trip_store import TripStore
+
+
+def _trip(origin, dest, dep, arr, trip_no, duty, route="100C", depot="DEPOT 1"):
+    return (origin, dest, dep, arr, trip_no, depot, duty, route)
+
+TRIPS = [
+    _trip("A", "B", "19:00", "19:40", 1, "16A"),
+    _trip("B", "A", "23:35", "00:05", 2, "16A"),
+    _trip("A", "B", "00:10", "00:50", 3, "16A"),
+    _trip("A", "B", "07:00", "07:40", 1, "2"),
+    _trip("B", "A", "07:50", "08:30", 2, "2"),
+    _trip("A", "C", "07:20", "08:00", 1, "5", route="101D"),
+]
+
+def test_next_departures():
+    store = TripStore.from_tuples(TRIPS)
+    assert [t[2] for t in store.next_departures("A", "07:00")] == ["07:00", "07:20", "19:00", "00:10"]
+    assert [t[2] for t in store.next_departures("A", "07:01", limit=1)] == ["07:20"]
+    assert store.next_departures("Z", "07:00") == []
+
+def test_next_departures_run_past_midnight():
+    store = TripStore.from_tuples(TRIPS)
+    assert [t[2] for t in store.next_departures("A", "23:50")] == ["00:10"]
+    assert [t[2] for t in store.next_departures("A", "00:05")] == ["00:10"]
+
+def test_trips_between():
+    store = TripStore.from_tuples(TRIPS)
+    assert [t[2] for t in store.trips_between("100C", "07:00", "07:50")] == ["07:00", "07:50"]
+    assert [t[2] for t in store.trips_between("100C", "23:00", "01:00")] == ["23:35", "00:10"]
+
+def test_duty_at():
+    store = TripStore.from_tuples(TRIPS)
+    assert store.duty_at("100C/2", "07:45") == ("DEPOT 1", "100C", "2")
+    assert store.duty_at("100C/2", "08:31") is None
+    assert store.duty_at("100C/2", "06:59") is None
+    assert store.duty_at("100C/16", "00:20") == ("DEPOT 1", "100C", "16A")
+
+def test_snapshot_round_trip(tmp_path):
+    path = TripStore.from_tuples(TRIPS).save(str(tmp_path / "trips.npz"))
+    store = TripStore.load(path)
+    assert len(store) == len(TRIPS)
+    assert store.next_departures("A", "23:50") == [TRIPS[2]]
+    assert store.duty_at("101D/5", "07:30") == ("DEPOT 1", "101D", "5")
@@ -0,0 +1,56 @@
+import numpy as np
+
+from trip_table import INVALID, MINUTES_PER_DAY, TripTable, format_hhmm, service_minutes
+
+
+def _trip(dep, arr, trip_no=1, duty="16A"):
+    return ("A", "B", dep, arr, trip_no, "DEPOT 1", duty, "100C")
+
+def test_evening_duty_runs_on_past_midnight():
+    trips = TripTable.from_tuples([_trip("19:00", "19:40", 1), _trip("23:30", "00:05", 2), _trip("00:11", "00:51", 3)])
+    assert trips.dep.tolist() == [19 * 60, 23 * 60 + 30, MINUTES_PER_DAY + 11]
+    assert trips.arr.tolist() == [19 * 60 + 40, MINUTES_PER_DAY + 5, MINUTES_PER_DAY + 51]
+    assert np.all(np.diff(trips.dep) > 0)
+    assert trips.run_time().tolist() == [40, 35, 40]
+
+def test_trip_across_service_day_start():
+    trips = TripTable.from_tuples([_trip("02:50", "03:10")])
+    assert trips.dep.tolist() == [MINUTES_PER_DAY + 170]
+    assert trips.run_time().tolist() == [20]
+
+def test_end_before_start_is_next_day():
+    trips = TripTable.from_tuples([_trip("10:00", "09:00")])
+    assert trips.run_time().tolist() == [MINUTES_PER_DAY - 60]
+
+def test_configurable_day_start():
+    trips = TripTable.from_tuples([_trip("04:30", "05:00")], day_start=5 * 60)
+    assert trips.dep.tolist() == [MINUTES_PER_DAY + 270]
+    assert trips.arr.tolist() == [MINUTES_PER_DAY + 300]
+    assert TripTable.from_tuples([_trip("04:30", "05:00")], day_start=0).dep.tolist() == [270]
+
+def test_invalid_times_stay_invalid():
+    trips = TripTable.from_tuples([_trip("x", "00:30")])
+    assert not trips.valid[0]
+    assert trips.dep.tolist() == [INVALID]
+
+def test_service_minutes():
+    assert service_minutes(30) == MINUTES_PER_DAY + 30
+    assert service_minutes(MINUTES_PER_DAY + 30) == MINUTES_PER_DAY + 30
+    assert service_minutes(np.array([INVALID, 30, 600])).tolist() == [INVALID, MINUTES_PER_DAY + 30, 600]
+
+def test_output_times_are_clock_times():
+    trips = TripTable.from_tuples([_trip("23:50", "00:20")])
+    assert trips.to_tuples()[0][2:4] == ("23:50", "00:20")
+    assert format_hhmm(trips.arr[0]) == "00:20"
+
+def test_duty_running_past_day_start():
+    trips = TripTable.from_tuples([_trip("22:40", "23:50", 1), _trip("02:30", "02:55", 2),
+                                   _trip("03:05", "03:40", 3), _trip("05:00", "05:30", 1, duty="1")])
+    assert trips.dep.tolist() == [22 * 60 + 40, MINUTES_PER_DAY + 150, MINUTES_PER_DAY + 185, 300]
+    assert trips.arr.tolist()[2] == MINUTES_PER_DAY + 220
+
+def test_unwrapping_restarts_per_duty():
+    trips = TripTable.from_tuples([_trip("20:00", "20:30", 1, duty="16A"), _trip("03:30", "04:00", 2, duty="16A"),
+                                   _trip("04:10", "04:40", 1, duty="2"), _trip("x", "05:00", 2, duty="2"),
+                                   _trip("05:10", "05:40", 3, duty="2")])
+    assert trips.dep.tolist() == [1200, MINUTES_PER_DAY + 210, 250, INVALID, 310]
@@ -0,0 +1,78 @@
+from validation import validate_trips
+
+
+def _trip(origin, dest, dep, arr, trip_no, duty="1", route="101K", depot="DEPOT 1"):
+    return (origin, dest, dep, arr, trip_no, depot, duty, route)
+
+def _checks(tuples, **limits):
+    return validate_trips(tuples, **limits)["Check"].tolist()
+
+def test_clean_duty():
+    assert _checks([
+        _trip("A", "B", "07:00", "07:30", 1),
+        _trip("B", "A", "07:40", "08:10", 2),
+        _trip("A", "B", "08:20", "08:50", 3),
+    ]) == []
+
+def test_invalid_time():
+    assert _checks([_trip("A", "B", "7 am", "07:30", 1)]) == ["invalid_time"]
+
+def test_arrival_before_departure():
+    df = validate_trips([_trip("A", "B", "10:00", "09:00", 1)])
+    assert df["Check"].iloc[0] == "arrival_before_departure"
+    assert df["Detail"].iloc[0] == "end time before start time (01:00 earlier)"
+
+def test_overnight_trip_is_not_reversed():
+    assert _checks([_trip("A", "B", "23:50", "00:20", 1)]) == []
+
+def test_overlap():
+    df = validate_trips([_trip("A", "B", "07:00", "07:30", 1), _trip("B", "A", "07:20", "07:50", 2)])
+    assert df["Check"].tolist() == ["overlap"]
+    assert df["Trip No"].tolist() == [2]
+
+def test_stop_mismatch():
+    df = validate_trips([_trip("A", "B", "07:00", "07:30", 1), _trip("C", "A", "07:40", "08:10", 2)])
+    assert df["Check"].tolist() == ["stop_mismatch"]
+    assert df["Detail"].iloc[0] == "previous trip 1 ended at B"
+
+def test_duties_are_checked_apart():
+    assert _checks([
+        _trip("A", "B", "07:00", "07:30", 1, duty="1"),
+        _trip("C", "A", "07:10", "07:40", 1, duty="2"),
+        _trip("A", "B", "07:00", "07:30", 1, duty="1", route="102K"),
+    ]) == []
+
+def test_spread_over_limit():
+    tuples = [_trip("A", "B", "06:00", "06:30", 1), _trip("B", "A", "15:40", "16:10", 2)]
+    df = validate_trips(tuples, max_spread=600)
+    assert df["Check"].tolist() == ["spread_over_limit"]
+    assert df["Detail"].iloc[0] == "duty spread 10:30 over 10:00"
+    assert _checks(tuples, max_spread=660) == []
+
+def test_evening_duty_past_midnight():
+    assert _checks([
+        _trip("DEPOT 1", "A", "18:50", "19:00", 1, duty="16A"),
+        _trip("A", "B", "19:05", "19:45", 2, duty="16A"),
+        _trip("B", "A", "23:30", "00:05", 3, duty="16A"),
+        _trip("A", "B", "00:11", "00:51", 4, duty="16A"),
+    ]) == []
+
+def test_spread_over_limit_past_midnight():
+    df = validate_trips([
+        _trip("A", "B", "16:00", "16:40", 1, duty="16A"),
+        _trip("B", "A", "00:11", "02:20", 2, duty="16A"),
+    ], max_spread=600)
+    assert df["Check"].tolist() == ["spread_over_limit"]
+    assert df["Start Time"].tolist() == ["16:00"]  # the duty's first trip, not the 00:11 one
+    assert df["Detail"].iloc[0] == "duty spread 10:40 over 10:00"
+
+def test_stop_mismatch_past_midnight():
+    df = validate_trips([
+        _trip("A", "B", "23:30", "23:55", 1, duty="16A"),
+        _trip("C", "A", "00:10", "00:40", 2, duty="16A"),
+    ])
+    assert df["Check"].tolist() == ["stop_mismatch"]
+    assert df["Trip No"].tolist() == [2]
+
+def test_long_night_trip_is_not_reversed():
+    assert _checks([_trip("A", "B", "01:00", "05:00", 1)]) == []
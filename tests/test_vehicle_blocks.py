@@ -0,0 +1,100 @@
+import random
+
+import numpy as np
+import pytest
+
+from trip_table import TripTable, format_hhmm
+from vehicle_blocks import assign_vehicle_blocks, candidate_links, deadhead_matrix
+
+
+def _trip(origin, dest, dep, arr, depot="DEPOT 1", duty="1", route="101K", trip_no=1):
+    return (origin, dest, dep, arr, trip_no, depot, duty, route)
+
+def _max_matching(n, ptr, succ):
+    """Maximum bipartite matching size by plain augmenting paths (Kuhn), as a reference."""
+    match_r = [-1] * n
+
+    def augment(i, seen):
+        for j in succ[ptr[i]:ptr[i + 1]].tolist():
+            if j in seen:
+                continue
+            seen.add(j)
+            if match_r[j] == -1 or augment(match_r[j], seen):
+                match_r[j] = i
+                return True
+        return False
+
+    return sum(augment(i, set()) for i in range(n))
+
+def _random_trips(rnd, n, stops=4):
+    tuples = []
+    for _ in range(n):
+        a, b = rnd.sample(range(stops), 2)
+        dep = rnd.randint(5 * 60, 21 * 60)
+        tuples.append(_trip(f"S{a}", f"S{b}", format_hhmm(dep), format_hhmm(dep + rnd.randint(10, 60))))
+    return tuples
+
+def test_turnaround_shares_a_bus():
+    blocks = assign_vehicle_blocks([
+        _trip("A", "B", "07:00", "07:30"),
+        _trip("B", "A", "07:40", "08:10"),
+        _trip("A", "B", "07:45", "08:15"),
+    ])
+    assert blocks.stats["buses"] == 2
+    assert blocks.bus_ids[0] == blocks.bus_ids[1] != blocks.bus_ids[2]
+    assert blocks.block_trip_no[:2] == [1, 2]
+
+def test_min_layover_is_respected():
+    tuples = [_trip("A", "B", "07:00", "07:30"), _trip("B", "A", "07:33", "08:00")]
+    assert assign_vehicle_blocks(tuples, min_layover=5).stats["buses"] == 2
+    assert assign_vehicle_blocks(tuples, min_layover=3).stats["buses"] == 1
+
+def test_depots_are_solved_apart():
+    blocks = assign_vehicle_blocks([
+        _trip("A", "B", "07:00", "07:30", depot="DEPOT 1"),
+        _trip("B", "A", "07:40", "08:10", depot="DEPOT 2"),
+    ])
+    assert blocks.stats["buses"] == 2
+    assert blocks.bus_ids == ["1", "1"]
+
+def test_fleet_size_is_minimal():
+    rnd = random.Random(3)
+    for _ in range(20):
+        tuples = _random_trips(rnd, rnd.randint(5, 60))
+        blocks = assign_vehicle_blocks(tuples)
+
+        trips = TripTable.from_tuples(tuples)
+        stops, codes = np.unique(np.concatenate([trips.origin, trips.dest]).astype(str), return_inverse=True)
+        origin, dest = codes[:len(trips)], codes[len(trips):]
+        dep, arr = trips.dep.astype(np.int64), trips.arr.astype(np.int64)
+        times = deadhead_matrix(origin, dest, arr - dep, len(stops))
+        ptr, succ, _ = candidate_links(dep, arr, origin, dest, times, 5, 240)
+        assert blocks.stats["buses"] == len(trips) - _max_matching(len(trips), ptr, succ)
+        assert len(set(blocks.bus_ids)) == blocks.stats["buses"]
+
+def test_link_across_midnight():
+    blocks = assign_vehicle_blocks([_trip("A", "B", "23:20", "23:50"), _trip("B", "A", "00:10", "00:40")])
+    assert blocks.stats["buses"] == 1
+    assert blocks.block_trip_no == [1, 2]
+
+def test_deadhead_is_least_among_fewest_buses():
+    linear_sum_assignment = pytest.importorskip("scipy.optimize").linear_sum_assignment
+    rnd = random.Random(5)
+    for _ in range(20):
+        tuples = _random_trips(rnd, rnd.randint(5, 40), stops=6)
+        blocks = assign_vehicle_blocks(tuples)
+
+        trips = TripTable.from_tuples(tuples)
+        n = len(trips)
+        stops, codes = np.unique(np.concatenate([trips.origin, trips.dest]).astype(str), return_inverse=True)
+        origin, dest = codes[:n], codes[n:]
+        dep, arr = trips.dep.astype(np.int64), trips.arr.astype(np.int64)
+        times = deadhead_matrix(origin, dest, arr - dep, len(stops))
+        ptr, succ, cost = candidate_links(dep, arr, origin, dest, times, 5, 240)
+        # Each link is worth far more than any deadhead, so the assignment maximises links first
+        weights = np.zeros((n, n))
+        weights[np.repeat(np.arange(n), np.diff(ptr)), succ] = 10_000 - cost
+        rows, cols = linear_sum_assignment(weights, maximize=True)
+        used = weights[rows, cols] > 0
+        assert blocks.stats["buses"] == n - int(used.sum())
+        assert blocks.stats["deadhead_minutes"] == int((10_000 - weights[rows, cols][used]).sum())
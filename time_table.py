@@ -1,292 +1,313 @@
-import pandas as pd
-import tkinter as tk
-from tkinter import filedialog
-import os
-import pickle
-from collections import defaultdict
-from datetime import datetime, timedelta
-import openpyxl
-from openpyxl.utils import get_column_letter
-from openpyxl.styles import Alignment
-
-def parse_time(t):
-    return datetime.strptime(t, "%H:%M")
-
-def format_time(dt):
-    return dt.strftime("%H:%M")
-
-def time_diff_str(t1, t2):
-    """Return HH:MM string for difference between t1 and t2, handles overnight spans."""
-    if t2 < t1:
-        t2 += timedelta(days=1)
-    delta = t2 - t1
-    total_minutes = int(delta.total_seconds() // 60)
-    hours = total_minutes // 60
-    minutes = total_minutes % 60
-    return f"{hours:02}:{minutes:02}"
-
-
-
-def group_by_duty_name(tuple_list):
-    grouped = defaultdict(list)
-    for t in tuple_list:
-        grouped[t[6]].append(t)
-    return list(grouped.values())
-
-def ensure_row_exists(df, row_idx):
-    """Adds empty rows to df if row_idx is out of bounds."""
-    while len(df) <= row_idx:
-        df.loc[len(df)] = [None] * df.shape[1]
-
-
-# -------------------- File Picker --------------------
-root = tk.Tk()
-root.withdraw()
-file_path = filedialog.askopenfilename(title="Select Final Excel File", filetypes=[("Excel files", "*.xlsx *.xls")])
-if not file_path:
-    print("No file selected. Exiting.")
-    exit()
-
-# -------------------- Load and Fix Excel --------------------
-df = pd.read_excel(file_path)
-
-# Fill down merged cells (especially Duty Name)
-df["Duty Name"] = df["Duty Name"].ffill()
-
-required_cols = [
-    "Origin", "Destination", "Start Time", "End Time", "Trip No",
-    "Depot", "Duty Name", "Route Number"
-]
-
-missing = [col for col in required_cols if col not in df.columns]
-if missing:
-    print(f"Missing columns in the file: {missing}")
-    exit()
-
-# -------------------- Extract Tuples --------------------
-tuples = []
-
-for _, row in df.iterrows():
-    origin = str(row["Origin"]).strip()
-    dest = str(row["Destination"]).strip()
-    dep_time = str(row["Start Time"]).strip().split(":")[0:2]
-    arr_time = str(row["End Time"]).strip().split(":")[0:2]
-    dep_time = ":".join(dep_time)
-    arr_time = ":".join(arr_time)
-    trip_no = int(row["Trip No"])
-    depot = str(row["Depot"]).strip()
-    duty_full = str(row["Duty Name"]).strip()
-    route = str(row["Route Number"]).strip()
-
-    # Remove route from Duty Name (e.g., 542/7A → 7A)
-    if "/" in duty_full:
-        _, duty = duty_full.split("/", 1)
-    else:
-        duty = duty_full
-
-    tuples.append((origin, dest, dep_time, arr_time, trip_no, depot, duty, route))
-
-# -------------------- Extract Stop Names --------------------
-
-stops_set = {t[0] for t in tuples}
-t1 = tuples[0]
-depot = t1[5]
-
-# Assume: origin_set is a set of strings, depot is a string
-stops_set = {origin for origin in stops_set if depot not in origin}
-
-# -------------------- Grouping Tuples --------------------
-
-# Split tuples by presence of 'A' in duty_name
-tuples_with_A = [t for t in tuples if 'A' in str(t[6])]
-tuples_without_A = [t for t in tuples if 'A' not in str(t[6])]
-
-# Apply grouping
-grouped_without_A = group_by_duty_name(tuples_without_A)
-grouped_with_A = group_by_duty_name(tuples_with_A)
-
-# Final nested structure
-nested_grouped_tuples = [grouped_without_A, grouped_with_A]
-
-# -------------------- Creating Dataframe --------------------
-
-# Step 1: Compute number of dynamic columns
-static_cols = ["Duty Number", "Duty Hours", "Crew Sign In/Out Time", "Out/in Shedding"]
-dynamic_cols = []
-
-for origin in sorted(stops_set):
-    dynamic_cols.append("Arrival")
-    dynamic_cols.append("Departure")
-
-# Step 2: Create full column list
-all_columns = static_cols + dynamic_cols
-
-# Step 3: Create empty DataFrame
-df_custom = pd.DataFrame(columns=all_columns)
-
-# -------------------- Filling Times in DF --------------------
-
-all_duties = []
-
-for duty_type in nested_grouped_tuples:  # [duties_without_A, duties_with_A]
-    duties = []
-
-    for duty_name_group in duty_type:  # Each duty_name_group is a list of tuples
-        df = df_custom.copy()
-        duty_name = duty_name_group[0][6]  # All tuples in group share same duty name
-
-        col_idx = 4  # Start from first dynamic column
-        row_idx = 0
-
-        for i, tup in enumerate(duty_name_group):
-            dep_time = tup[2]
-            arr_time = tup[3]
-
-            # First tuple: set sign-in and first arrival
-            if i == 0:
-                ensure_row_exists(df, row_idx)
-                df.at[row_idx, "Out/in Shedding"] = dep_time
-                df.iat[row_idx, col_idx] = arr_time
-                col_idx += 1
-
-            # Last tuple: next row, departure and sign-out
-            elif i == len(duty_name_group) - 1:
-                ensure_row_exists(df, row_idx)
-                df.iat[row_idx, col_idx] = dep_time
-                col_idx += 1
-                if col_idx >= df.shape[1]:
-                    row_idx += 1
-                    col_idx = 4
-                    ensure_row_exists(df, row_idx)
-                df.at[row_idx, "Out/in Shedding"] = arr_time
-
-
-            # Middle tuples: arrival/departure in sequence
-            else:
-                ensure_row_exists(df, row_idx)
-                df.iat[row_idx, col_idx] = dep_time
-                col_idx += 1
-
-                if col_idx >= df.shape[1]:
-                    row_idx += 1
-                    col_idx = 4
-                    ensure_row_exists(df, row_idx)
-
-                df.iat[row_idx, col_idx] = arr_time
-                col_idx += 1
-
-                if col_idx >= df.shape[1]:
-                    row_idx += 1
-                    col_idx = 4
-                    ensure_row_exists(df, row_idx)
-
-        # Post-process each duty DataFrame
-        first_row_idx = df.first_valid_index()
-        last_row_idx = df.last_valid_index()
-
-        if first_row_idx is not None and last_row_idx is not None:
-            # 1. Insert Duty Name (tup[6]) in col 0 of first row
-            df.iat[first_row_idx, 0] = duty_name_group[0][6]
-
-            # 2. Set Crew Sign In time in first row (10 mins before col[3])
-            raw_time = df.at[first_row_idx, "Out/in Shedding"]
-            if pd.notna(raw_time):
-                t = parse_time(raw_time)
-                df.iat[first_row_idx, 2] = format_time(t - timedelta(minutes=10))
-
-            # 3. Set Crew Sign Out time in last row (10 mins after col[3])
-            raw_time = df.at[last_row_idx, "Out/in Shedding"]
-            if pd.notna(raw_time):
-                t = parse_time(raw_time)
-                df.iat[last_row_idx, 2] = format_time(t + timedelta(minutes=10))
-
-            # 4. Calculate Duty Hours = diff between first and last Out/in Shedding
-            t_start = parse_time(df.at[first_row_idx, "Out/in Shedding"])
-            t_end = parse_time(df.at[last_row_idx, "Out/in Shedding"])
-            df.iat[last_row_idx, 1] = time_diff_str(t_start, t_end)
-
-        duties.append(df)
-
-    all_duties.append(duties)
-
-# -------------------- Merging Dataframes --------------------
-
-# Step 1: Merge DataFrames in each duty type group
-merged_blocks = []
-for duty_list in all_duties:
-    block_df = pd.concat(duty_list, ignore_index=True)
-    merged_blocks.append(block_df)
-
-# Step 2: Create the separating row
-separator = pd.DataFrame([[None] * merged_blocks[0].shape[1]], columns=merged_blocks[0].columns)
-separator.iloc[0, 0] = "Evening Shifts"  # Set first column
-
-# Step 3: Final concatenation
-df_final_schedule = pd.concat([merged_blocks[0], separator, merged_blocks[1]], ignore_index=True)
-
-# -------------------- Adding New Headings --------------------
-
-# Step 1: Save current column names as first row of data
-df_final_schedule.loc[-1] = df_final_schedule.columns  # insert old headers as first row
-df_final_schedule.index = df_final_schedule.index + 1  # shift index
-df_final_schedule = df_final_schedule.sort_index()     # reorder rows
-
-# Step 2: Build new column names
-new_columns = []
-arrival_counter = 0
-sorted_stops = sorted(stops_set)
-
-for col in df_final_schedule.columns:
-    if col == df_final_schedule.columns[0]:  # first column
-        new_columns.append(depot)
-    elif "Arrival" in col:
-        new_columns.append(sorted_stops[arrival_counter])
-        arrival_counter += 1
-    else:
-        new_columns.append("")
-
-# Step 3: Replace the column headers
-df_final_schedule.columns = new_columns
-
-
-import openpyxl
-from openpyxl.utils import get_column_letter
-from openpyxl.styles import Alignment
-
-# --- 1. Define multi-level header ---
-# Build first and second rows
-first_row = []
-second_row = []
-
-static_cols = ["Depot", "", "", ""]  # e.g. "Duty Number", "Duty Hours", etc.
-first_row.extend(static_cols)
-second_row.extend(["Duty Number", "Duty Hours", "Crew Sign In/Out Time", "Out/in Shedding"])
-
-for stop in sorted(stops_set):
-    first_row.extend([stop, stop])
-    second_row.extend(["Arrival", "Departure"])
-
-# Convert DataFrame to use second_row as columns
-df_final_schedule.columns = second_row
-df_final_schedule.loc[-1] = first_row  # insert first header row as data row
-df_final_schedule.index = df_final_schedule.index + 1
-df_final_schedule = df_final_schedule.sort_index()
-
-# --- 2. Write to Excel ---
-output_excel = os.path.splitext(file_path)[0] + "_schedule.xlsx"
-with pd.ExcelWriter(output_excel, engine='openpyxl') as writer:
-    df_final_schedule.to_excel(writer, index=False, header=False, startrow=1)
-    ws = writer.sheets['Sheet1']
-
-    # --- 3. Merge header cells ---
-    col = 1
-    for group, count in zip(first_row, [1 if val == "" else 2 for val in second_row]):
-        if group != "":
-            merge_end = col + count - 1
-            if merge_end > col:
-                ws.merge_cells(start_row=1, start_column=col, end_row=1, end_column=merge_end)
-                ws.cell(row=1, column=col).alignment = Alignment(horizontal="center", vertical="center")
-        col += 1
-
-print(f"\n Final Excel saved to: {output_excel}")
-
+import numpy as np
+import pandas as pd
+import os
+import re
+import sys
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+import excel_writer
+import trip_files
+from instrumentation import counts_of, stage
+from trip_table import CREW_OFFSET, INVALID, MINUTES_PER_DAY, TripTable, format_duration, format_hhmm
+from validation import report_violations, violations_path
+
+
+EVENING_DUTY_RE = re.compile(r"\d+A")
+
+
+def is_evening_duty(duty_name):
+    """Evening duties are numbered "7A", "12A" (as map_shift in final_schedule_maker.py reads them)."""
+    return EVENING_DUTY_RE.fullmatch(str(duty_name).strip()) is not None
+
+def group_by_duty_name(tuple_list):
+    grouped = defaultdict(list)
+    for t in tuple_list:
+        grouped[t[6]].append(t)
+    return list(grouped.values())
+
+# -------------------- Layout Engine --------------------
+
+# A duty fills the Arrival/Departure cells row by row: the first trip's
+# arrival, then departure/arrival of each middle trip, then the last trip's
+# departure. Shed-out is the first trip's departure (row 0) and shed-in the
+# last trip's arrival, on the row of the cell after the last departure.
+
+def duty_row_counts(sizes, width):
+    """Grid rows used by duties of `sizes` trips with `width` Arrival/Departure cells per row."""
+    return np.where(sizes > 1, (2 * sizes - 2) // width + 1, 1)
+
+def fill_duty_grid(grid, groups, sizes, row_start, rows_per_duty, width, counts=None):
+    """Write every duty of `groups` into the preallocated object grid in one pass."""
+    if not len(sizes):
+        return
+    tuples = [t for group in groups for t in group]
+    dep = np.array([t[2] for t in tuples], dtype=object)
+    arr = np.array([t[3] for t in tuples], dtype=object)
+
+    duty_idx = np.repeat(np.arange(len(sizes)), sizes)
+    k = np.arange(len(tuples)) - np.repeat(np.cumsum(sizes) - sizes, sizes)  # trip position in its duty
+    n = sizes[duty_idx]
+    base = row_start[duty_idx]
+    first_trip = k == 0
+    last_trip = (k == n - 1) & (n > 1)
+
+    # Departures after the first trip and arrivals before the last go to the time cells
+    dep_cell = 2 * k - 1
+    arr_cell = 2 * k
+    m = ~first_trip
+    grid[base[m] + dep_cell[m] // width, 4 + dep_cell[m] % width] = dep[m]
+    m = ~last_trip
+    grid[base[m] + arr_cell[m] // width, 4 + arr_cell[m] % width] = arr[m]
+
+    # Shed-out, then shed-in (which overwrites shed-out when it lands on row 0)
+    grid[base[first_trip], 3] = dep[first_trip]
+    grid[base[last_trip] + arr_cell[last_trip] // width, 3] = arr[last_trip]
+
+    trips = TripTable.from_tuples(tuples)
+    first = np.cumsum(sizes) - sizes
+    last = first + sizes - 1
+    shed_out = trips.dep[first]
+    shed_in = np.where(sizes > 1, trips.arr[last], shed_out)
+    same_row = (sizes > 1) & ((2 * sizes - 2) // width == 0)
+    shed_out = np.where(same_row, shed_in, shed_out)
+    ok = (shed_out != INVALID) & (shed_in != INVALID)
+    if counts is not None:
+        counts["duties_without_hours"] += int(np.count_nonzero(~ok))
+
+    sign_in = [format_hhmm(t - CREW_OFFSET) if t != INVALID else None for t in shed_out.tolist()]
+    sign_out = [format_hhmm(t + CREW_OFFSET) if t != INVALID else None for t in shed_in.tolist()]
+    duty_hours = [format_duration(t) if valid else None
+                  for t, valid in zip(((shed_in - shed_out) % MINUTES_PER_DAY).tolist(), ok.tolist())]
+
+    last_row = row_start + rows_per_duty - 1
+    grid[row_start, 0] = [group[0][6] for group in groups]
+    grid[row_start, 2] = sign_in
+    grid[last_row, 2] = sign_out  # same cell as sign-in for single-row duties
+    grid[last_row, 1] = duty_hours
+
+
+# -------------------- Load and Fix Excel --------------------
+
+required_cols = [
+    "Origin", "Destination", "Start Time", "End Time", "Trip No",
+    "Depot", "Duty Name", "Route Number"
+]
+
+def load_trip_tuples(file_path, counts=None):
+    """Trip tuples from a `_final_schedule` workbook, or straight from a typed trip file."""
+    if trip_files.trip_format(file_path):
+        return trip_tuples_from_frame(trip_files.load_trip_file(file_path), counts)
+
+    df = pd.read_excel(file_path)
+
+    # Fill down merged cells (especially Duty Name)
+    df["Duty Name"] = df["Duty Name"].ffill()
+
+    return trip_tuples_from_frame(df, counts)
+
+# -------------------- Extract Tuples --------------------
+
+def trip_tuples_from_frame(df, counts=None):
+    """Trip tuples from a flat final schedule frame (as read from file, or straight from stage 1)."""
+    missing = [col for col in required_cols if col not in df.columns]
+    if missing:
+        raise ValueError(f"Missing columns in the file: {missing}")
+
+    def text(col):
+        return df[col].astype(str).str.strip()
+
+    def hhmm(col):
+        if pd.api.types.is_numeric_dtype(df[col]):
+            # Minutes since 00:00 from a typed trip file
+            return [format_hhmm(m) if pd.notna(m) else "" for m in df[col].tolist()]
+        # "05:04:00" -> "05:04"
+        return text(col).str.split(":").str[:2].str.join(":")
+
+    # Remove route from Duty Name (e.g., 542/7A → 7A)
+    duty = text("Duty Name").str.split("/", n=1).str[-1]
+
+    tuples = list(zip(text("Origin"), text("Destination"), hhmm("Start Time"), hhmm("End Time"),
+                      df["Trip No"].astype(int).tolist(), text("Depot"), duty, text("Route Number")))
+
+    if counts is not None:
+        counts["rows_loaded"] += len(tuples)
+    return tuples
+
+# -------------------- Build Duty Schedule --------------------
+
+def build_duty_schedule(tuples, counts=None):
+    """Lay trip tuples out as the duty grid; returns (df_final_schedule, first_row, second_row)."""
+
+    # -------------------- Extract Stop Names --------------------
+
+    stops_set = {t[0] for t in tuples}
+    t1 = tuples[0]
+    depot = t1[5]
+
+    # Assume: origin_set is a set of strings, depot is a string
+    stops_set = {origin for origin in stops_set if depot not in origin}
+
+    # -------------------- Grouping Tuples --------------------
+
+    # Split tuples into day and evening duties
+    tuples_with_A = [t for t in tuples if is_evening_duty(t[6])]
+    tuples_without_A = [t for t in tuples if not is_evening_duty(t[6])]
+
+    # Apply grouping
+    grouped_without_A = group_by_duty_name(tuples_without_A)
+    grouped_with_A = group_by_duty_name(tuples_with_A)
+
+    # Final nested structure
+    nested_grouped_tuples = [grouped_without_A, grouped_with_A]
+
+    # -------------------- Grid Layout --------------------
+
+    static_cols = ["Duty Number", "Duty Hours", "Crew Sign In/Out Time", "Out/in Shedding"]
+    sorted_stops = sorted(stops_set)
+    width = 2 * len(sorted_stops)  # Arrival/Departure cells per grid row
+
+    # Duties in output order; the "Evening Shifts" separator row sits between the two blocks
+    groups = [group for duty_type in nested_grouped_tuples for group in duty_type]
+    sizes = np.array([len(group) for group in groups], dtype=np.int64)
+    rows_per_duty = duty_row_counts(sizes, width)
+    row_start = np.cumsum(rows_per_duty) - rows_per_duty
+    row_start[len(grouped_without_A):] += 1
+    separator_row = int(rows_per_duty[:len(grouped_without_A)].sum())
+    total_rows = int(rows_per_duty.sum()) + 1
+
+    grid = np.full((total_rows, len(static_cols) + width), None, dtype=object)
+    grid[separator_row, 0] = "Evening Shifts"
+    fill_duty_grid(grid, groups, sizes, row_start, rows_per_duty, width, counts)
+    if counts is not None:
+        counts["duties"] += len(grouped_without_A)
+        counts["evening_duties"] += len(grouped_with_A)
+        counts["stops"] += len(sorted_stops)
+        counts["grid_rows"] += total_rows
+
+    # -------------------- Adding New Headings --------------------
+
+    first_row = ["Depot", "", "", ""]
+    second_row = list(static_cols)
+
+    for stop in sorted_stops:
+        first_row.extend([stop, stop])
+        second_row.extend(["Arrival", "Departure"])
+
+    df_final_schedule = pd.DataFrame(np.vstack([np.array([first_row, second_row], dtype=object), grid]),
+                                     columns=second_row)
+
+    return df_final_schedule, first_row, second_row
+
+# -------------------- Partitions --------------------
+
+SHEET_TITLE_RE = re.compile(r"[\[\]:*?/\\]")
+
+def partition_trips(tuples):
+    """Trips per (depot, route), in order of first appearance."""
+    partitions = {}
+    for t in tuples:
+        partitions.setdefault((t[5], t[7]), []).append(t)
+    return partitions
+
+def sheet_titles(keys):
+    """Unique Excel sheet titles for (depot, route) keys; a single partition keeps "Sheet1"."""
+    if len(keys) == 1:
+        return ["Sheet1"]
+    titles = []
+    for depot, route in keys:
+        base = SHEET_TITLE_RE.sub("_", f"{depot} {route}".strip())[:31] or "Sheet"
+        title, n = base, 1
+        while title in titles:
+            n += 1
+            title = f"{base[:31 - len(str(n)) - 1]}~{n}"
+        titles.append(title)
+    return titles
+
+def _render_partition(tuples):
+    counts = Counter()
+    return build_duty_schedule(tuples, counts), counts
+
+def build_duty_schedules(tuples, counts=None, workers=None):
+    """
+    One duty grid per (depot, route): {sheet title: (df, first_row, second_row)}.
+
+    Each partition gets its own stop columns, so a grid is only as wide as
+    its route. With `workers`, partitions are rendered in worker processes.
+    """
+    partitions = partition_trips(tuples)
+    titles = sheet_titles(list(partitions))
+    workers = max(1, min(workers or 1, len(partitions)))
+    if workers == 1:
+        rendered = [_render_partition(part) for part in partitions.values()]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            rendered = list(pool.map(_render_partition, partitions.values()))
+
+    grids = {}
+    for title, (grid, part_counts) in zip(titles, rendered):
+        grids[title] = grid
+        if counts is not None:
+            counts.update(part_counts)
+    if counts is not None:
+        counts["partitions"] += len(grids)
+    return grids
+
+# -------------------- Write to Excel --------------------
+
+def duty_schedule_path(file_path):
+    return os.path.splitext(file_path)[0] + "_schedule.xlsx"
+
+def save_duty_schedules(grids, output_excel):
+    """Write the grids of build_duty_schedules, one sheet each."""
+    return excel_writer.write_duty_grids({title: (df, first_row) for title, (df, first_row, _) in grids.items()},
+                                         output_excel)
+
+def make_time_table(file_path, output_excel=None, report=None, violations_file=None, workers=None):
+    """
+    Read a `_final_schedule.xlsx` file and write its duty grids next to it,
+    one sheet per depot and route (rendered on `workers` processes).
+    Schedule violations, if any, are saved to `violations_file` first.
+    """
+    with stage(report, "load"):
+        tuples = load_trip_tuples(file_path, counts_of(report))
+    with stage(report, "validate"):
+        violations, saved = report_violations(tuples, violations_file or violations_path(file_path), counts_of(report))
+    if saved and report is None:
+        print(f"\n {len(violations)} schedule violation(s) saved at: {saved}")
+    with stage(report, "render"):
+        grids = build_duty_schedules(tuples, counts_of(report), workers=workers)
+    with stage(report, "write_duty_grid"):
+        return save_duty_schedules(grids, output_excel or duty_schedule_path(file_path))
+
+# -------------------- File Picker --------------------
+
+def pick_file():
+    import tkinter as tk
+    from tkinter import filedialog
+
+    root = tk.Tk()
+    root.withdraw()
+    return filedialog.askopenfilename(title="Select Final Excel File", filetypes=[("Excel files", "*.xlsx *.xls")])
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv:
+        import batch
+        return batch.main(["timetable"] + list(argv))
+
+    file_path = pick_file()
+    if not file_path:
+        print("No file selected. Exiting.")
+        exit()
+
+    try:
+        output_excel = make_time_table(file_path)
+    except ValueError as e:
+        print(e)
+        exit()
+
+    print(f"\n Final Excel saved to: {output_excel}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,86 @@
+"""Typed columnar copies of the flat schedule (Parquet, Feather or CSV).
+
+The `_final_schedule.xlsx` hand-off turns times into "HH:MM:00" strings and
+merges Duty Name cells. These files hold the same REQUIRED_COLS with real
+types instead: Start Time / End Time as int16 minutes since 00:00, Trip No,
+S.No and Run Time as integers, Sch kms as float, everything else as text,
+with every row filled in. Feather and Parquet are read memory-mapped, so
+time_table.py and pipeline.py load them without parsing cells.
+
+    save_trip_file(df_final, "depot_7_final_schedule.parquet")
+    df = load_trip_file("depot_7_final_schedule.parquet")
+
+Parquet and Feather need pyarrow; CSV only needs pandas.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+from trip_table import INVALID, parse_hhmm
+
+TRIP_FORMATS = {"parquet": ".parquet", "feather": ".feather", "csv": ".csv"}
+TIME_COLS = ["Start Time", "End Time"]
+INT_COLS = ["S.No", "Trip No"]
+
+# -------------------- Types --------------------
+
+def typed_frame(df_final):
+    """Flat schedule frame with typed columns (see module docstring)."""
+    df = df_final.copy()
+    for col in TIME_COLS:
+        minutes = np.fromiter((parse_hhmm(v) for v in df[col].tolist()), dtype=np.int16, count=len(df))
+        df[col] = pd.array(np.where(minutes == INVALID, None, minutes), dtype="Int16")
+    text = [col for col in df.columns if col not in TIME_COLS + INT_COLS + ["Run Time", "Sch kms"]]
+    df[text] = df[text].astype(str)
+    return _restore_types(df)
+
+def _restore_types(df):
+    """Column types as typed_frame sets them; CSV columns arrive as text."""
+    for col in TIME_COLS:
+        df[col] = pd.to_numeric(df[col], errors="coerce").astype("Int16")
+    for col in INT_COLS:
+        df[col] = pd.to_numeric(df[col]).astype(np.int32)
+    df["Run Time"] = pd.to_numeric(df["Run Time"], errors="coerce").astype("Int32")
+    df["Sch kms"] = pd.to_numeric(df["Sch kms"], errors="coerce").astype(np.float64)
+    return df
+
+# -------------------- Files --------------------
+
+def trip_format(path):
+    """Format name for a trip file path, or None for anything else (such as .xlsx)."""
+    ext = os.path.splitext(path)[1].lower()
+    return next((name for name, suffix in TRIP_FORMATS.items() if suffix == ext), None)
+
+def trip_file_path(file_path, fmt):
+    if fmt not in TRIP_FORMATS:
+        raise ValueError(f"Unknown trip file format: {fmt!r} (expected one of {list(TRIP_FORMATS)})")
+    return os.path.splitext(file_path)[0] + "_final_schedule" + TRIP_FORMATS[fmt]
+
+def save_trip_file(df_final, output_file):
+    """Write the flat schedule frame in the format given by the file extension."""
+    fmt = trip_format(output_file)
+    df = typed_frame(df_final)
+    if fmt == "parquet":
+        df.to_parquet(output_file, index=False)
+    elif fmt == "feather":
+        df.to_feather(output_file)
+    elif fmt == "csv":
+        df.to_csv(output_file, index=False)
+    else:
+        raise ValueError(f"Not a trip file: {output_file} (expected {', '.join(TRIP_FORMATS.values())})")
+    return output_file
+
+def load_trip_file(file_path):
+    """Typed flat schedule frame from a trip file; Feather and Parquet are memory-mapped."""
+    fmt = trip_format(file_path)
+    if fmt == "parquet":
+        df = pd.read_parquet(file_path, memory_map=True)
+    elif fmt == "feather":
+        from pyarrow import feather
+        df = feather.read_table(file_path, memory_map=True).to_pandas()
+    elif fmt == "csv":
+        df = pd.read_csv(file_path, dtype=str, keep_default_na=False)
+    else:
+        raise ValueError(f"Not a trip file: {file_path} (expected {', '.join(TRIP_FORMATS.values())})")
+    return _restore_types(df)
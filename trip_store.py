@@ -0,0 +1,192 @@
+"""Indexed in-memory trip store for stop, bus, duty and route queries.
+
+Trips are held as TripTable columns. For each index (stop, bus, duty, route)
+one lexsort orders the trips by (key, departure); a key then maps to a slice
+of that order, and a query is a dict lookup plus a searchsorted on the
+slice, so latency stays flat however many routes are loaded.
+
+    store = TripStore.from_tuples(all_tuples)
+    store.next_departures("Bus Stand", "07:40")
+    store.duty_at("12", "14:00")                 # (depot, route, duty) or None
+    store.trips_between("542", "06:00", "09:00")
+    store.save("depot_7.trips.npz"); TripStore.load("depot_7.trips.npz")
+
+    python trip_store.py build depot_7.xlsx depot_7.trips.npz
+    python trip_store.py next depot_7.trips.npz "Bus Stand" 07:40
+
+Buses are the Bus Id of each trip when given (e.g. from vehicle_blocks),
+otherwise "<route>/<bus>" with the bus taken from the duty number as
+map_bus_id does. Times are "HH:MM" or clock minutes; like the trips, times
+before the service day start (03:00) are read as the night after, so
+next_departures("Bus Stand", "23:50") runs on into the 00:10 trips.
+"""
+import argparse
+import sys
+
+import numpy as np
+
+from final_schedule_maker import map_bus_id
+from trip_table import INVALID, TripTable, format_hhmm, parse_hhmm, service_minutes
+
+INDEXES = ("stop", "bus", "duty", "route")
+
+
+def _minutes(value):
+    minutes = int(value) if isinstance(value, (int, np.integer)) else parse_hhmm(value)
+    if minutes == INVALID:
+        raise ValueError(f"Not a time of day: {value!r}")
+    return service_minutes(minutes)
+
+
+class _SortedIndex:
+    """Trips ordered by (key, departure); `slices` maps a key to its [start, end) in `order`."""
+
+    def __init__(self, keys, dep):
+        codes, uniques = _factorize(keys)
+        self.order = np.lexsort((dep, codes))
+        self.dep = dep[self.order]
+        bounds = np.searchsorted(codes[self.order], np.arange(len(uniques) + 1))
+        self.slices = {key: (int(bounds[k]), int(bounds[k + 1])) for k, key in enumerate(uniques)}
+
+    def range(self, key, start=None, end=None):
+        """Trip indexes for `key` departing in [start, end], in departure order."""
+        lo, hi = self.slices.get(key, (0, 0))
+        deps = self.dep[lo:hi]
+        first = lo + (np.searchsorted(deps, start, side="left") if start is not None else 0)
+        last = lo + (np.searchsorted(deps, end, side="right") if end is not None else hi - lo)
+        return self.order[first:last]
+
+
+def _factorize(keys):
+    """Integer codes for hashable keys, in order of first appearance."""
+    lookup = {}
+    codes = np.fromiter((lookup.setdefault(key, len(lookup)) for key in keys), dtype=np.int64, count=len(keys))
+    return codes, list(lookup)
+
+
+class TripStore:
+    def __init__(self, trips, bus_ids):
+        self.trips = trips
+        self.bus_ids = np.asarray(bus_ids, dtype=object)
+        ok = trips.valid
+        self._valid = np.flatnonzero(ok)
+        dep = trips.dep[ok]
+        keys = {
+            "stop": trips.origin[ok].tolist(),
+            "bus": self.bus_ids[ok].tolist(),
+            "duty": list(zip(trips.depot[ok].tolist(), trips.route[ok].tolist(), trips.duty[ok].tolist())),
+            "route": trips.route[ok].tolist(),
+        }
+        self.indexes = {name: _SortedIndex(keys[name], dep) for name in INDEXES}
+
+    @classmethod
+    def from_tuples(cls, all_tuples, bus_ids=None):
+        if bus_ids is None:
+            bus_ids = [f"{t[7]}/{map_bus_id(t[6])}" for t in all_tuples]
+        return cls(TripTable.from_tuples(all_tuples), bus_ids)
+
+    def __len__(self):
+        return len(self.trips)
+
+    def _tuples(self, positions):
+        """Trip tuples for positions in the valid-trip index arrays."""
+        idx = self._valid[positions]
+        t = self.trips
+        return [(t.origin[i], t.dest[i], format_hhmm(t.dep[i]), format_hhmm(t.arr[i]), int(t.trip_no[i]),
+                 t.depot[i], t.duty[i], t.route[i]) for i in idx.tolist()]
+
+    # -------------------- Queries --------------------
+
+    def next_departures(self, stop, after, limit=10):
+        """The next `limit` trips leaving `stop` at or after `after`."""
+        return self._tuples(self.indexes["stop"].range(stop, start=_minutes(after))[:limit])
+
+    def trips_between(self, route, start, end):
+        """Trips of `route` departing between `start` and `end` (inclusive)."""
+        return self._tuples(self.indexes["route"].range(route, start=_minutes(start), end=_minutes(end)))
+
+    def duty_trips(self, depot, route, duty):
+        return self._tuples(self.indexes["duty"].range((depot, route, duty)))
+
+    def duty_at(self, bus, at):
+        """
+        (depot, route, duty) working `bus` at `at`: the duty of its last trip
+        departing by then, while that trip runs or the bus has trips left.
+        """
+        index = self.indexes["bus"]
+        minute = _minutes(at)
+        lo, hi = index.slices.get(bus, (0, 0))
+        k = lo + int(np.searchsorted(index.dep[lo:hi], minute, side="right")) - 1
+        if k < lo:
+            return None
+        i = self._valid[index.order[k]]
+        if self.trips.arr[i] < minute and k == hi - 1:
+            return None
+        return self.trips.depot[i], self.trips.route[i], self.trips.duty[i]
+
+    # -------------------- Snapshot --------------------
+
+    def save(self, path):
+        """Columns only (times as int16 minutes, keys as strings); indexes are rebuilt on load."""
+        t = self.trips
+        np.savez_compressed(
+            path, origin=t.origin.astype(str), dest=t.dest.astype(str),
+            dep=np.where(t.valid, t.dep, INVALID).astype(np.int16),
+            arr=np.where(t.valid, t.arr, INVALID).astype(np.int16),
+            trip_no=t.trip_no, depot=t.depot.astype(str), duty=t.duty.astype(str), route=t.route.astype(str),
+            bus=self.bus_ids.astype(str))
+        return path
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            columns = {name: data[name] for name in data.files}
+        trips = TripTable(*(columns[name].astype(object) for name in ("origin", "dest")),
+                          columns["dep"], columns["arr"], columns["trip_no"],
+                          *(columns[name].astype(object) for name in ("depot", "duty", "route")))
+        return cls(trips, columns["bus"].astype(object))
+
+# -------------------- Entry Point --------------------
+
+def _print(tuples):
+    for origin, dest, dep, arr, trip_no, depot, duty, route in tuples:
+        print(f"  {dep} {origin} → {arr} {dest}   {route}/{duty} trip {trip_no} ({depot})")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build and query trip store snapshots.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("build", help="extract workbooks (or load trip files) into one snapshot")
+    build.add_argument("inputs", nargs="+", help="timetable workbooks or *_final_schedule trip files")
+    build.add_argument("snapshot")
+    nxt = sub.add_parser("next", help="next departures from a stop")
+    nxt.add_argument("snapshot"); nxt.add_argument("stop"); nxt.add_argument("after")
+    nxt.add_argument("-n", "--limit", type=int, default=10)
+    bus = sub.add_parser("bus", help="duty working a bus at a time")
+    bus.add_argument("snapshot"); bus.add_argument("bus"); bus.add_argument("at")
+    route = sub.add_parser("route", help="trips on a route between two times")
+    route.add_argument("snapshot"); route.add_argument("route"); route.add_argument("start"); route.add_argument("end")
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        import pipeline
+        import trip_files
+        all_tuples = []
+        for path in args.inputs:
+            all_tuples.extend(pipeline.load_trips(path) if trip_files.trip_format(path)
+                              else pipeline.extract_trips(path))
+        print(f"Saved {len(all_tuples)} trip(s) to {TripStore.from_tuples(all_tuples).save(args.snapshot)}")
+        return 0
+
+    store = TripStore.load(args.snapshot)
+    if args.command == "next":
+        _print(store.next_departures(args.stop, args.after, args.limit))
+    elif args.command == "bus":
+        duty = store.duty_at(args.bus, args.at)
+        print(f"  {duty[1]}/{duty[2]} ({duty[0]})" if duty else "  not in service")
+    else:
+        _print(store.trips_between(args.route, args.start, args.end))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
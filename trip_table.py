@@ -0,0 +1,139 @@
+"""Compact trip representation shared by both stages.
+
+Times are integer minutes since 00:00 of the service day. The service day
+starts at SERVICE_DAY_START: clock times before it belong to the night after,
+so an evening duty's 00:11 trip is stored as 24:11 (1451) and sorts after its
+19:00 trips. A duty still running after SERVICE_DAY_START keeps counting on
+from its earlier trips (a 03:10 trip after a 02:50 one is 27:10), and an
+arrival earlier than its departure is stored one day later, so every valid
+trip has arr >= dep and run times, duty spreads and bus spans are plain
+subtractions. "HH:MM" strings (wrapped back to the clock)
+are only produced again at the output boundary.
+"""
+import re
+
+import numpy as np
+
+MINUTES_PER_DAY = 24 * 60
+INVALID = -1
+CREW_OFFSET = 10  # minutes between sign-in/out and shedding out/in
+SERVICE_DAY_START = 3 * 60  # clock times before 03:00 run on from the previous day
+
+_TIME_RE = re.compile(r"\s*(\d{1,2}):(\d{1,2})(?::\d{1,2}(?:\.\d+)?)?\s*")
+
+# -------------------- Parsing and Formatting --------------------
+
+def parse_hhmm(value):
+    """'HH:MM' or 'HH:MM:SS' -> minutes since midnight; INVALID if it is not a time of day."""
+    if hasattr(value, "hour") and hasattr(value, "minute"):
+        return value.hour * 60 + value.minute
+    match = _TIME_RE.fullmatch(str(value))
+    if not match:
+        return INVALID
+    hours, minutes = int(match.group(1)), int(match.group(2))
+    if hours > 23 or minutes > 59:
+        return INVALID
+    return hours * 60 + minutes
+
+def parse_hhmm_array(values):
+    return np.fromiter((parse_hhmm(v) for v in values), dtype=np.int32, count=len(values))
+
+def service_minutes(minutes, day_start=SERVICE_DAY_START):
+    """Clock minutes (scalar or array) -> service-day minutes; INVALID stays INVALID."""
+    minutes = np.asarray(minutes)
+    shifted = np.where((minutes != INVALID) & (minutes < day_start), minutes + MINUTES_PER_DAY, minutes)
+    return shifted.astype(minutes.dtype) if shifted.ndim else int(shifted)
+
+def format_hhmm(minutes):
+    """Minutes (any day) -> 'HH:MM' clock time."""
+    minutes = int(minutes) % MINUTES_PER_DAY
+    return f"{minutes // 60:02}:{minutes % 60:02}"
+
+def format_hhmm_array(minutes):
+    return [format_hhmm(m) for m in np.asarray(minutes).tolist()]
+
+def format_duration(minutes):
+    """Minutes -> 'HH:MM' duration (hours are not wrapped)."""
+    minutes = int(minutes)
+    return f"{minutes // 60:02}:{minutes % 60:02}"
+
+# -------------------- Trip Table --------------------
+
+class TripTable:
+    """
+    Column arrays for a list of trip tuples
+    (origin, dest, dep, arr, trip_no, depot, duty, route).
+
+    dep/arr are int32 service-day minutes: clock times before `day_start` are
+    moved to the next day, and so are the later trips of a duty that runs on
+    past `day_start` (trips are taken in their given order per duty). For
+    every valid trip 0 <= arr - dep < 1440. `valid` is False where either time
+    could not be parsed.
+    """
+    __slots__ = ("origin", "dest", "dep", "arr", "trip_no", "depot", "duty", "route", "valid")
+
+    def __init__(self, origin, dest, dep, arr, trip_no, depot, duty, route, day_start=SERVICE_DAY_START):
+        self.origin = np.asarray(origin, dtype=object)
+        self.dest = np.asarray(dest, dtype=object)
+        self.trip_no = np.asarray(trip_no, dtype=np.int32)
+        self.depot = np.asarray(depot, dtype=object)
+        self.duty = np.asarray(duty, dtype=object)
+        self.route = np.asarray(route, dtype=object)
+
+        dep = np.asarray(dep, dtype=np.int32)
+        arr = np.asarray(arr, dtype=np.int32)
+        self.valid = (dep != INVALID) & (arr != INVALID)
+        service_dep = service_minutes(dep, day_start)
+        self.dep = (service_dep + self._day_offsets(service_dep)).astype(np.int32)
+        # Arrival before departure on the clock: the trip runs into the next day
+        self.arr = np.where(self.valid, self.dep + (arr - dep) % MINUTES_PER_DAY, arr).astype(np.int32)
+
+    @classmethod
+    def from_tuples(cls, tuples, day_start=SERVICE_DAY_START):
+        if not tuples:
+            return cls([], [], [], [], [], [], [], [], day_start)
+        origin, dest, dep, arr, trip_no, depot, duty, route = zip(*tuples)
+        return cls(origin, dest, parse_hhmm_array(dep), parse_hhmm_array(arr), trip_no, depot, duty, route,
+                   day_start)
+
+    def _day_offsets(self, dep):
+        """
+        Minutes to add so that departures run on in trip order within each duty:
+        a departure more than half a day before the previous one of its duty is
+        on the next day (a duty still running past the service day start).
+        """
+        offsets = np.zeros(len(dep), dtype=np.int32)
+        idx = np.flatnonzero(self.valid)
+        if len(idx) < 2:
+            return offsets
+        same_duty = np.ones(len(idx) - 1, dtype=bool)
+        for column in (self.depot, self.route, self.duty):
+            same_duty &= column[idx[1:]] == column[idx[:-1]]
+        wraps = np.concatenate([[0], np.cumsum(same_duty & (np.diff(dep[idx]) < -MINUTES_PER_DAY // 2))])
+        # Count wraps from the start of each duty only
+        first = np.maximum.accumulate(np.where(np.concatenate([[True], ~same_duty]), np.arange(len(idx)), 0))
+        offsets[idx] = (wraps - wraps[first]) * MINUTES_PER_DAY
+        return offsets
+
+    def __len__(self):
+        return len(self.dep)
+
+    def to_tuples(self):
+        return list(zip(self.origin.tolist(), self.dest.tolist(),
+                        format_hhmm_array(self.dep), format_hhmm_array(self.arr),
+                        self.trip_no.tolist(), self.depot.tolist(), self.duty.tolist(), self.route.tolist()))
+
+    def run_time(self):
+        """Minutes per trip; INVALID where a time could not be parsed."""
+        return np.where(self.valid, self.arr - self.dep, INVALID)
+
+    def group_starts(self, keys=("depot", "route", "duty")):
+        """Indexes where a run of consecutive trips with the same key columns begins."""
+        if not len(self):
+            return np.zeros(0, dtype=np.int64)
+        change = np.zeros(len(self), dtype=bool)
+        change[0] = True
+        for key in keys:
+            column = getattr(self, key)
+            change[1:] |= column[1:] != column[:-1]
+        return np.flatnonzero(change)
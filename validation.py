@@ -0,0 +1,121 @@
+"""Schedule checks over trip tuples, run by both stages before anything is written.
+
+Trips are sorted once by (depot, route, duty, departure); departures are
+service-day minutes (see trip_table.py), so an evening duty's trips after
+midnight stay at its end. Every check is then an array comparison between
+neighbouring trips or a reduction per duty, so the whole pass is O(n log n):
+
+    invalid_time              a start or end time is not a time of day
+    arrival_before_departure  end time earlier than start time by more than an
+                              overnight trip could explain (run > max_run)
+    overlap                   a trip departs before the previous trip of its duty arrived
+    stop_mismatch             a trip starts at a different stop than the previous one ended
+    spread_over_limit         sign-in to sign-out of the duty is longer than max_spread
+
+    violations = validate_trips(all_tuples, max_spread=600)
+    save_violations(violations, violations_path("depot_7.xlsx"))
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+import excel_writer
+from trip_table import CREW_OFFSET, MINUTES_PER_DAY, TripTable, format_duration, format_hhmm
+
+DEFAULT_MAX_SPREAD = 600   # minutes from sign-in to sign-out
+DEFAULT_MAX_RUN = 180      # longest trip an end time before the start time is read as overnight
+
+CHECKS = ["invalid_time", "arrival_before_departure", "overlap", "stop_mismatch", "spread_over_limit"]
+
+VIOLATION_COLS = ["Check", "Depot", "Route Number", "Duty Name", "Trip No", "Origin", "Destination",
+                  "Start Time", "End Time", "Detail"]
+
+# -------------------- Checks --------------------
+
+def duty_order(trips):
+    """Trip indexes sorted by depot, route, duty and departure."""
+    keys = [pd.factorize(getattr(trips, key).astype(str), sort=True)[0] for key in ("route", "duty", "depot")]
+    return np.lexsort((trips.dep, *keys))
+
+def find_violations(trips, max_spread=DEFAULT_MAX_SPREAD, max_run=DEFAULT_MAX_RUN):
+    """{check: (trip indexes, detail strings)} for a TripTable."""
+    found = {}
+    valid = trips.valid
+    run = trips.arr - trips.dep
+
+    bad = np.flatnonzero(~valid)
+    found["invalid_time"] = (bad, ["start or end time is not HH:MM"] * len(bad))
+
+    # An end time before the start time on the clock, too long a gap to be an overnight trip
+    earlier = trips.dep % MINUTES_PER_DAY - trips.arr % MINUTES_PER_DAY
+    bad = np.flatnonzero(valid & (earlier > 0) & (run > max_run))
+    found["arrival_before_departure"] = (bad, [f"end time before start time ({format_duration(earlier[i])} earlier)"
+                                               for i in bad.tolist()])
+
+    order = duty_order(trips)
+    order = order[valid[order]]
+    if len(order) > 1:
+        prev, curr = order[:-1], order[1:]
+        same_duty = ((trips.depot[prev] == trips.depot[curr]) & (trips.route[prev] == trips.route[curr])
+                     & (trips.duty[prev] == trips.duty[curr]))
+
+        overlap = same_duty & (trips.dep[curr] < trips.arr[prev])
+        found["overlap"] = (curr[overlap], [f"departs {format_duration(trips.arr[p] - trips.dep[c])} before trip "
+                                            f"{trips.trip_no[p]} arrives ({format_hhmm(trips.arr[p])})"
+                                            for p, c in zip(prev[overlap].tolist(), curr[overlap].tolist())])
+
+        mismatch = same_duty & (trips.origin[curr] != trips.dest[prev])
+        found["stop_mismatch"] = (curr[mismatch], [f"previous trip {trips.trip_no[p]} ended at {trips.dest[p]}"
+                                                   for p in prev[mismatch].tolist()])
+
+        starts = np.flatnonzero(np.concatenate([[True], ~same_duty]))
+    else:
+        found["overlap"] = found["stop_mismatch"] = (np.zeros(0, dtype=np.int64), [])
+        starts = np.zeros(len(order), dtype=np.int64)
+
+    if len(order):
+        first_dep = np.minimum.reduceat(trips.dep[order], starts)
+        last_arr = np.maximum.reduceat(trips.arr[order], starts)
+        spread = last_arr - first_dep + 2 * CREW_OFFSET
+        over = np.flatnonzero(spread > max_spread)
+        found["spread_over_limit"] = (order[starts[over]], [f"duty spread {format_duration(spread[k])} over "
+                                                            f"{format_duration(max_spread)}" for k in over.tolist()])
+    else:
+        found["spread_over_limit"] = (np.zeros(0, dtype=np.int64), [])
+    return found
+
+def validate_trips(tuples, max_spread=DEFAULT_MAX_SPREAD, max_run=DEFAULT_MAX_RUN, counts=None):
+    """
+    Violations report for trip tuples: one row per offending trip (for
+    spread_over_limit, the duty's first trip). Per-check totals are added to
+    `counts` as violations_<check>.
+    """
+    trips = TripTable.from_tuples(tuples)
+    found = find_violations(trips, max_spread=max_spread, max_run=max_run)
+
+    rows = []
+    for check in CHECKS:
+        idx, details = found[check]
+        if counts is not None:
+            counts[f"violations_{check}"] += len(idx)
+        for i, detail in zip(np.asarray(idx).tolist(), details):
+            origin, dest, dep, arr, trip_num, depot, duty_name, route = tuples[i]
+            rows.append([check, depot, route, f"{route}/{duty_name}", trip_num, origin, dest,
+                         dep, arr, detail])
+    return pd.DataFrame(rows, columns=VIOLATION_COLS)
+
+# -------------------- Output --------------------
+
+def violations_path(file_path):
+    return os.path.splitext(file_path)[0] + "_violations.xlsx"
+
+def save_violations(df_violations, output_file):
+    return excel_writer.write_final_schedule(df_violations, output_file, merge_column="Check")
+
+def report_violations(tuples, output_file, counts=None, **limits):
+    """Validate and, when anything is found, save the report; returns (violations, path or None)."""
+    df_violations = validate_trips(tuples, counts=counts, **limits)
+    if df_violations.empty:
+        return df_violations, None
+    return df_violations, save_violations(df_violations, output_file)
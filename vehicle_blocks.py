@@ -0,0 +1,324 @@
+"""Vehicle blocks: chain trips into bus workings with the fewest buses.
+
+Each depot is solved on its own as an assignment problem: trip i may be
+followed by trip j on the same bus when
+
+    arr_i + deadhead(dest_i → origin_j) + min_layover <= dep_j <= arr_i + max_wait
+
+A maximum matching over these links uses the fewest buses (buses = trips −
+links); among maximum matchings, the one with the least deadhead time is
+taken. It is found as a min-cost flow with the primal-dual method: Dijkstra
+on reduced costs, then as many shortest augmenting paths as fit in one phase.
+Links at the same stop cost nothing, so a first-in first-out matching per
+stop is a valid warm start and only the remaining links are searched.
+
+Deadhead times come from the trips themselves: the fastest observed run
+between two stops (either way), extended through intermediate stops. Links
+further apart than max_wait are not considered, which keeps the link graph
+sparse; a bus idle for longer starts a new block.
+
+    blocks = assign_vehicle_blocks(all_tuples, min_layover=5)
+    blocks.bus_ids      # Bus Id per trip, in all_tuples order
+    save_vehicle_blocks(vehicle_blocks_frame(all_tuples, blocks), "depot_7_vehicle_blocks.xlsx")
+"""
+import heapq
+import os
+from collections import deque
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+
+import excel_writer
+from trip_table import TripTable
+
+DEFAULT_MIN_LAYOVER = 5   # minutes at a terminal between two trips of a bus
+DEFAULT_MAX_WAIT = 240    # longest idle gap a bus is kept for
+
+
+@dataclass
+class VehicleBlocks:
+    bus_ids: list                  # Bus Id per trip ("" for trips without valid times)
+    block_trip_no: list            # position of the trip on its bus, from 1
+    deadhead_before: list          # deadhead minutes before the trip (0 at the start of a block)
+    stats: dict = field(default_factory=dict)
+
+# -------------------- Deadhead Times --------------------
+
+def deadhead_matrix(origin, dest, run_time, n_stops, deadhead=None, stop_index=None):
+    """
+    Shortest deadhead minutes between stop codes: fastest observed run either
+    way, then shortest paths through other stops. `deadhead` adds known
+    {(stop, stop): minutes} entries (by name, resolved with stop_index).
+    """
+    times = np.full((n_stops, n_stops), np.inf)
+    np.minimum.at(times, (origin, dest), run_time)
+    times = np.minimum(times, times.T)
+    for (a, b), minutes in (deadhead or {}).items():
+        if a in stop_index and b in stop_index:
+            times[stop_index[a], stop_index[b]] = min(times[stop_index[a], stop_index[b]], minutes)
+    np.fill_diagonal(times, 0)
+    for k in range(n_stops):
+        times = np.minimum(times, times[:, k:k + 1] + times[k:k + 1, :])
+    return times
+
+# -------------------- Link Graph --------------------
+
+def candidate_links(dep, arr, origin, dest, times, min_layover, max_wait):
+    """
+    Feasible (i → j) links as CSR arrays (ptr, succ, cost); cost is the
+    deadhead minutes. Trips are windowed by departure time with searchsorted,
+    so only pairs within max_wait are ever materialised.
+    """
+    n = len(dep)
+    order = np.argsort(dep, kind="stable")
+    dep_sorted = dep[order]
+    lo = np.searchsorted(dep_sorted, arr + min_layover, side="left")
+    hi = np.searchsorted(dep_sorted, arr + max_wait, side="right")
+    width = np.maximum(hi - lo, 0)
+
+    src = np.repeat(np.arange(n), width)
+    offsets = np.arange(width.sum()) - np.repeat(np.cumsum(width) - width, width)
+    succ = order[np.repeat(lo, width) + offsets]
+
+    cost = times[dest[src], origin[succ]]
+    ok = np.isfinite(cost) & (arr[src] + cost + min_layover <= dep[succ]) & (src != succ)
+    src, succ, cost = src[ok], succ[ok], cost[ok].astype(np.int64)
+
+    ptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(src, minlength=n), out=ptr[1:])
+    return ptr, succ, cost
+
+def same_stop_matching(dep, arr, origin, dest, min_layover, max_wait):
+    """First-in first-out matching of arrivals to departures at each stop (zero-deadhead links only)."""
+    n = len(dep)
+    match_l = np.full(n, -1, dtype=np.int64)
+    match_r = np.full(n, -1, dtype=np.int64)
+    arrivals = {}
+    for i in np.argsort(arr, kind="stable").tolist():
+        arrivals.setdefault(dest[i], []).append(i)
+
+    waiting = {stop: deque() for stop in arrivals}
+    next_arrival = {stop: 0 for stop in arrivals}
+    for j in np.argsort(dep, kind="stable").tolist():
+        stop = origin[j]
+        if stop not in arrivals:
+            continue
+        queue, ready = waiting[stop], arrivals[stop]
+        k = next_arrival[stop]
+        while k < len(ready) and arr[ready[k]] + min_layover <= dep[j]:
+            queue.append(ready[k])
+            k += 1
+        next_arrival[stop] = k
+        while queue and dep[j] > arr[queue[0]] + max_wait:
+            queue.popleft()
+        if queue:
+            i = queue.popleft()
+            match_l[i], match_r[j] = j, i
+    return match_l, match_r
+
+# -------------------- Min-Cost Maximum Matching --------------------
+
+def min_cost_max_matching(n, ptr, succ, cost, match_l, match_r):
+    """
+    Extend a zero-cost matching to a maximum matching of least total cost.
+
+    Primal-dual successive shortest paths: each phase runs Dijkstra on reduced
+    costs from every unmatched trip, raises the potentials, and augments along
+    vertex-disjoint zero-reduced-cost paths (current-arc DFS, as in Dinic)
+    until none is left. The links of a trip are relaxed with numpy in one
+    go, and the DFS only walks the links that are tight in this phase.
+    """
+    src = np.repeat(np.arange(n), np.diff(ptr))
+    bounds = ptr.tolist()
+    match_l, match_r = match_l.tolist(), match_r.tolist()
+    match_cost = [0] * n            # cost of the link into each matched successor
+    pot_l = np.zeros(n, dtype=np.int64)
+    pot_r = np.zeros(n, dtype=np.int64)
+    INF = np.iinfo(np.int64).max // 4
+
+    while True:
+        # Dijkstra: node i >= 0 is L_i (trip as predecessor), -1 - j is R_j (trip as successor)
+        dist_l = np.full(n, INF, dtype=np.int64)
+        dist_r = np.full(n, INF, dtype=np.int64)
+        heap = [(0, i) for i in range(n) if match_l[i] == -1]
+        for _, i in heap:
+            dist_l[i] = 0
+        done_l, done_r = [False] * n, [False] * n
+        shortest = INF
+        while heap:
+            d, u = heapq.heappop(heap)
+            if u >= 0:
+                if done_l[u] or d > dist_l[u]:
+                    continue
+                done_l[u] = True
+                lo, hi = bounds[u], bounds[u + 1]
+                js = succ[lo:hi]
+                nd = cost[lo:hi] + (d + pot_l[u]) - pot_r[js]
+                better = (nd < dist_r[js]) & (js != match_l[u])
+                js, nd = js[better], nd[better]
+                dist_r[js] = nd
+                for j, v in zip(js.tolist(), nd.tolist()):
+                    heapq.heappush(heap, (v, -1 - j))
+            else:
+                j = -1 - u
+                if done_r[j] or d > dist_r[j]:
+                    continue
+                done_r[j] = True
+                i = match_r[j]
+                if i == -1:
+                    shortest = d
+                    break
+                nd = d - match_cost[j] + int(pot_r[j] - pot_l[i])
+                if nd < dist_l[i]:
+                    dist_l[i] = nd
+                    heapq.heappush(heap, (nd, i))
+        if shortest == INF:
+            break
+
+        pot_l += np.minimum(dist_l, shortest)
+        pot_r += np.minimum(dist_r, shortest)
+
+        # Tight links out of the trips reached this phase, as CSR lists
+        reached = dist_l <= shortest
+        tight = np.flatnonzero(reached[src] & (cost + pot_l[src] - pot_r[succ] == 0))
+        tight_ptr = [0] + np.cumsum(np.bincount(src[tight], minlength=n)).tolist()
+        tight_succ, tight_cost = succ[tight].tolist(), cost[tight].tolist()
+
+        # Augment along vertex-disjoint tight paths, pass after pass
+        roots = [i for i in np.flatnonzero(reached).tolist() if match_l[i] == -1]
+        while roots:
+            current = tight_ptr[:-1]
+            seen_r = [False] * n
+            for root in roots:
+                stack, links = [root], []
+                while stack:
+                    i = stack[-1]
+                    for k in range(current[i], tight_ptr[i + 1]):
+                        j = tight_succ[k]
+                        if seen_r[j] or match_l[i] == j:
+                            continue
+                        current[i] = k + 1
+                        seen_r[j] = True
+                        links.append(k)
+                        if match_r[j] == -1:
+                            for level, link in enumerate(links):
+                                left, right = stack[level], tight_succ[link]
+                                match_l[left], match_r[right], match_cost[right] = right, left, tight_cost[link]
+                            stack = []
+                        else:
+                            stack.append(match_r[j])
+                        break
+                    else:
+                        current[i] = tight_ptr[i + 1]
+                        stack.pop()
+                        if links:
+                            links.pop()
+            unmatched = [i for i in roots if match_l[i] == -1]
+            if len(unmatched) == len(roots):
+                break
+            roots = unmatched
+
+    return np.array(match_l, dtype=np.int64), np.array(match_r, dtype=np.int64)
+
+# -------------------- Blocks --------------------
+
+def _solve_depot(trips, idx, min_layover, max_wait, deadhead):
+    """Match the trips `idx` of one depot; returns (match_l, match_r, link cost per successor, stats)."""
+    stops, codes = np.unique(np.concatenate([trips.origin[idx], trips.dest[idx]]).astype(str), return_inverse=True)
+    origin, dest = codes[:len(idx)], codes[len(idx):]
+    dep, arr = trips.dep[idx].astype(np.int64), trips.arr[idx].astype(np.int64)
+
+    stop_index = {stop: k for k, stop in enumerate(stops.tolist())}
+    times = deadhead_matrix(origin, dest, arr - dep, len(stops), deadhead, stop_index)
+    ptr, succ, cost = candidate_links(dep, arr, origin, dest, times, min_layover, max_wait)
+    match_l, match_r = same_stop_matching(dep, arr, origin, dest, min_layover, max_wait)
+    greedy_links = int(np.count_nonzero(match_l != -1))
+    match_l, match_r = min_cost_max_matching(len(idx), ptr, succ, cost, match_l, match_r)
+
+    link_cost = np.zeros(len(idx), dtype=np.int64)
+    matched = np.flatnonzero(match_r != -1)
+    link_cost[matched] = times[dest[match_r[matched]], origin[matched]].astype(np.int64)
+    stats = {"links_considered": len(succ), "same_stop_buses": len(idx) - greedy_links}
+    return match_l, match_r, link_cost, stats
+
+def assign_vehicle_blocks(all_tuples, min_layover=DEFAULT_MIN_LAYOVER, max_wait=DEFAULT_MAX_WAIT, deadhead=None):
+    """
+    Bus per trip for trip tuples (origin, dest, dep, arr, trip_no, depot, duty, route).
+
+    Buses are numbered per depot in order of their first departure. `deadhead`
+    optionally adds known {(from_stop, to_stop): minutes} repositioning times.
+    """
+    trips = TripTable.from_tuples(all_tuples)
+    n = len(trips)
+    bus_ids = [""] * n
+    block_trip_no = [None] * n
+    deadhead_before = [None] * n
+    stats = {"trips": n, "buses": 0, "links": 0, "deadhead_links": 0, "deadhead_minutes": 0,
+             "same_stop_buses": 0, "links_considered": 0, "duty_buses": 0, "trips_invalid_time": 0}
+
+    valid = trips.valid
+    stats["trips_invalid_time"] = int(np.count_nonzero(~valid))
+    for depot in dict.fromkeys(trips.depot.tolist()):
+        idx = np.flatnonzero((trips.depot == depot) & valid)
+        if not len(idx):
+            continue
+        match_l, match_r, link_cost, depot_stats = _solve_depot(trips, idx, min_layover, max_wait, deadhead)
+        for key, value in depot_stats.items():
+            stats[key] += value
+
+        starts = np.flatnonzero(match_r == -1)
+        starts = starts[np.argsort(trips.dep[idx][starts], kind="stable")]
+        for bus, start in enumerate(starts.tolist(), start=1):
+            position, k = 1, start
+            while k != -1:
+                trip = int(idx[k])
+                bus_ids[trip] = str(bus)
+                block_trip_no[trip] = position
+                deadhead_before[trip] = int(link_cost[k]) if position > 1 else 0
+                position += 1
+                k = int(match_l[k])
+        stats["buses"] += len(starts)
+        stats["links"] += int(np.count_nonzero(match_l != -1))
+        stats["deadhead_links"] += int(np.count_nonzero(link_cost > 0))
+        stats["deadhead_minutes"] += int(link_cost.sum())
+        # Buses as the sheet assigns them: one per duty number (7 and 7A share a bus)
+        duties = {(trips.route[t], str(trips.duty[t]).rstrip("A")) for t in idx.tolist()}
+        stats["duty_buses"] += len(duties)
+
+    return VehicleBlocks(bus_ids, block_trip_no, deadhead_before, stats)
+
+# -------------------- Output --------------------
+
+BLOCK_COLS = ["Depot", "Bus Id", "Trip No", "Route Number", "Duty Name", "Origin", "Destination",
+              "Start Time", "End Time", "Deadhead Before"]
+
+def vehicle_blocks_frame(all_tuples, blocks):
+    """One row per trip, grouped by depot and bus and in running order on each bus."""
+    rows = []
+    for t, bus, position, deadhead in zip(all_tuples, blocks.bus_ids, blocks.block_trip_no,
+                                          blocks.deadhead_before):
+        start_stop, end_stop, dep_time, arr_time, _, depot, duty_name, route = t
+        rows.append({
+            "Depot": depot,
+            "Bus Id": bus,
+            "Trip No": position,
+            "Route Number": route,
+            "Duty Name": f"{route}/{duty_name}",
+            "Origin": start_stop,
+            "Destination": end_stop,
+            "Start Time": f"{dep_time}:00",
+            "End Time": f"{arr_time}:00",
+            "Deadhead Before": deadhead,
+        })
+    df = pd.DataFrame(rows, columns=BLOCK_COLS)
+    bus_number = pd.to_numeric(df["Bus Id"], errors="coerce")
+    order = np.lexsort((df["Trip No"].fillna(0).to_numpy(), bus_number.fillna(np.inf).to_numpy(),
+                        pd.factorize(df["Depot"])[0]))
+    return df.iloc[order].reset_index(drop=True)
+
+def vehicle_blocks_path(file_path):
+    return os.path.splitext(file_path)[0] + "_vehicle_blocks.xlsx"
+
+def save_vehicle_blocks(df_blocks, output_file):
+    return excel_writer.write_final_schedule(df_blocks, output_file, merge_column="Bus Id")